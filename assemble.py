@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+from src.assembler import assemble
+
+
+def address(text):
+    return int(text, 16)
+
+
+parser = argparse.ArgumentParser(description="Assemble 6502 source into a raw binary")
+parser.add_argument("infile", help="Assembler source file")
+parser.add_argument("-o", "--output", help="Binary file (default infile with .bin)")
+parser.add_argument(
+    "--org", type=address, default=0, help="Start address in hex (default 0)"
+)
+parser.add_argument("--symbols", help="Write the symbols as NAME = $ADDR lines")
+args = parser.parse_args()
+
+try:
+    with open(args.infile) as f:
+        program = assemble(f.read(), args.org)
+except (OSError, ValueError) as e:
+    print(f"Error: {args.infile}: {e}")
+    sys.exit(1)
+
+output = args.output or os.path.splitext(args.infile)[0] + ".bin"
+with open(output, "wb") as f:
+    f.write(program.image())
+if args.symbols:
+    with open(args.symbols, "w") as f:
+        for name, value in sorted(program.symbols.items(), key=lambda item: item[1]):
+            f.write(f"{name} = ${value:04X}\n")
+print(f"{output}: {len(program.image())} bytes at ${program.start:04X}")
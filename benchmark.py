@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import sys
+from src.benchmark import engines, run, workloads
+
+
+parser = argparse.ArgumentParser(description="Benchmark the emulator with guest programs")
+parser.add_argument(
+    "-w", "--workload", action="append", choices=list(workloads),
+    help="Workload to run, can be repeated (default: all)",
+)
+parser.add_argument(
+    "-e", "--engine", action="append", choices=list(engines),
+    help="Execution engine, can be repeated (default: dispatch)",
+)
+parser.add_argument("-s", "--scale", type=int, default=16, help="Workload size (1-255)")
+parser.add_argument("--json", metavar="FILE", help="Write results as JSON, '-' for stdout")
+args = parser.parse_args()
+
+if not 1 <= args.scale <= 255:
+    parser.error("scale must be between 1 and 255")
+
+results = []
+for name in args.workload or workloads:
+    for engine in args.engine or ["dispatch"]:
+        result = run(name, engine, args.scale)
+        results.append(result)
+        if args.json != "-":
+            print(
+                f"{result.workload:<15} {result.engine:<10} "
+                f"{result.instructions:>10} instr {result.cycles:>11} cycles "
+                f"{result.wall_time:8.3f} s {result.instructions_per_sec / 1e6:7.3f} MIPS "
+                f"{result.cycles_per_sec / 1e6:7.3f} MHz {result.peak_rss_kb:>8} KB"
+            )
+
+if args.json:
+    report = [result._asdict() for result in results]
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -1,76 +1,52 @@
 #!/usr/bin/env python
 import argparse
 import logging
-from src.instructions import decode_standard, AddressingMode
-
-instruction_length = {
-    AddressingMode.A: 1,
-    AddressingMode.ABS: 3,
-    AddressingMode.ABS_X: 3,
-    AddressingMode.ABS_Y: 3,
-    AddressingMode.IMM: 2,
-    AddressingMode.IMPL: 1,
-    AddressingMode.IMPL: 1,
-    AddressingMode.IND: 3,
-    AddressingMode.IND_X: 2,
-    AddressingMode.IND_Y: 2,
-    AddressingMode.REL: 2,
-    AddressingMode.ZPG: 2,
-    AddressingMode.ZPG_X: 2,
-    AddressingMode.ZPG_Y: 2,
-}
-
-
-def asInt(s: str):
-    return int(s, 16)
-
-
-def print_unknown(code: str):
-    print(f"{code:#04X},".ljust(20), end="")
-    print("# ???")
-
-
-def disasm(data):
-    opcodes = data.read().strip().split(",")
-    data_length = len(opcodes)
-    i = 0
-
-    while i < data_length:
-        opcode = asInt(opcodes[i])
-
-        try:
-            inst, mode = decode_standard(opcode)
-        except NotImplementedError:
-            print_unknown(opcode)
-            i += 1
-            continue
-
-        operands_length = instruction_length[mode]
-
-        if i + operands_length > data_length:
-            # Not enough data for the operand, consider as unknown
-            print_unknown(opcode)
-            i += 1
-            continue
-
-        bin_repr = f"{opcode:#04X},"
-        for j in range(1, operands_length):
-            bin_repr += f" {asInt(opcodes[i + j]):#04X}, "
+import sys
+from src.disassembler import (
+    disassemble,
+    disassemble_code,
+    follow,
+    input_files,
+    loaded_mask,
+    open_chunks,
+    vectors,
+)
+from src.loader import MEMORY_SIZE
 
-        print(bin_repr.ljust(20), end="")
-        print(f"# {inst.name}, {mode.name}")
-        i += operands_length
 
-    print(f"{data_length} bytes")
+def address(text):
+    return int(text, 16)
 
 
 parser = argparse.ArgumentParser(description="Disassembler for 6502")
 
 parser.add_argument(
-    "infile", type=argparse.FileType("r"), help="Binary file to disassemble"
+    "infile", nargs="+", help="Files or directories to disassemble, - for stdin"
+)
+parser.add_argument(
+    "-f",
+    "--format",
+    choices=["auto", "bin", "hex", "ca65"],
+    default="auto",
+    help="Input format: raw binary, comma separated hex or ca65 listing (default auto)",
+)
+parser.add_argument(
+    "--org", type=address, default=0, help="Address of the first byte in hex (default 0)"
+)
+parser.add_argument(
+    "--python", action="store_true", help="Print commented byte lists for Python code"
+)
+parser.add_argument(
+    "--follow",
+    action="store_true",
+    help="Follow the control flow from the vectors and show the rest as data",
+)
+parser.add_argument(
+    "--entry",
+    type=address,
+    action="append",
+    help="Entry point in hex for --follow instead of the vectors, can be repeated",
 )
-parser.parse_args(["-"])
-
 parser.add_argument(
     "--log",
     default="WARNING",
@@ -81,5 +57,45 @@ logging.basicConfig(
     filename="disasm.log", level=args.log.upper(), format="%(levelname)s: %(message)s"
 )
 logger = logging.getLogger()
-
-disasm(args.infile)
+if args.python and (args.follow or args.entry):
+    parser.error("--python only works with the linear sweep")
+
+
+def follow_image(chunks):
+    # The whole image in memory at --org, disassembled along its control flow
+    image = b"".join(chunks)
+    start = args.org
+    end = start + len(image)
+    if end > MEMORY_SIZE:
+        raise ValueError(f"{len(image)} bytes do not fit in memory at {start:#06x}")
+    memory = bytearray(MEMORY_SIZE)
+    memory[start:end] = image
+    entries = args.entry
+    if entries is None:
+        # The vectors if the image holds them, its start otherwise
+        entries = vectors(memory) if end == MEMORY_SIZE else [start]
+    code_map = follow(memory, entries, loaded_mask([(start, end)]))
+    return disassemble_code(memory, code_map, start, end)
+
+
+def lines(f, name=""):
+    chunks = open_chunks(f, name, args.format)
+    if args.follow or args.entry:
+        return follow_image(chunks)
+    return disassemble(chunks, args.org, args.python)
+
+
+paths = list(input_files(args.infile))
+out = sys.stdout
+for path in paths:
+    if len(paths) > 1:
+        out.write(f"; {path}\n")
+    try:
+        if path == "-":
+            out.writelines(lines(sys.stdin.buffer))
+        else:
+            with open(path, "rb") as f:
+                out.writelines(lines(f, path))
+    except (OSError, ValueError) as e:
+        print(f"Error: {path}: {e}", file=sys.stderr)
+        sys.exit(1)
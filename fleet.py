@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import sys
+import time
+from src.fleet import Job, run_fleet
+
+
+def address(text):
+    return int(text, 16)
+
+
+parser = argparse.ArgumentParser(description="Run many 6502 binaries in parallel")
+parser.add_argument("filenames", nargs="+", help="Binary files, one job each")
+parser.add_argument("--load", type=address, default=0, help="Load address in hex (default 0)")
+parser.add_argument("--entry", type=address, help="Entry point in hex (default load address)")
+parser.add_argument("--pc", type=address, help="Stop when PC reaches this hex address")
+parser.add_argument("--cycles", type=int, help="Cycle budget per job")
+parser.add_argument("--instructions", type=int, help="Instruction budget per job")
+parser.add_argument("--rom", help="ROM image shared by every job")
+parser.add_argument("--rom-address", type=address, default=0, help="ROM address in hex")
+parser.add_argument("-j", "--workers", type=int, help="Worker processes (default CPU count)")
+parser.add_argument("--json", action="store_true", help="Print one JSON object per result")
+args = parser.parse_args()
+
+if args.pc is None and args.cycles is None and args.instructions is None:
+    parser.error("give at least one of --pc, --cycles or --instructions")
+
+try:
+    rom = open(args.rom, "rb").read() if args.rom else None
+    jobs = [
+        Job(
+            filename,
+            open(filename, "rb").read(),
+            args.load,
+            args.entry,
+            args.pc,
+            args.cycles,
+            args.instructions,
+        )
+        for filename in args.filenames
+    ]
+except Exception as e:
+    print(f"Error: {e}")
+    sys.exit(1)
+
+start = time.perf_counter()
+total = 0
+for result in run_fleet(jobs, rom, args.rom_address, args.workers):
+    total += result.instructions or 0
+    if args.json:
+        print(json.dumps(result._asdict()), flush=True)
+        continue
+    a, x, y, s, p, pc = result.registers
+    status = result.error or result.reason
+    counts = "" if result.error else f"{result.instructions} instr {result.cycles} cycles "
+    print(
+        f"{result.name}: {status} {counts}"
+        f"{result.wall_time:.3f} s A={a:02x} X={x:02x} Y={y:02x} S={s:02x} P={p:02x} "
+        f"PC={pc:04x} {result.digest[:16]}",
+        flush=True,
+    )
+
+if not args.json:
+    elapsed = time.perf_counter() - start
+    print(f"{len(jobs)} jobs, {total} instructions in {elapsed:.3f} s")
@@ -1,12 +1,13 @@
 #!/usr/bin/env python
 
 import argparse
-from src.instructions import standard
+from src.instructions import opcodes
 
 parser = argparse.ArgumentParser(description="List implemented 6502 instructions")
 parser.add_argument("-i", "--instruction", help="Search for a specific instruction (e.g. LDA)")
 parser.add_argument("-c", "--code", help="Search for a specific op code (e.g. a5)")
 parser.add_argument("-m", "--mode", help="Search for a specific addressing mode (e.g. abs)")
+parser.add_argument("-d", "--details", action="store_true", help="Show length, cycles, memory access and flags")
 args = parser.parse_args()
 
 def accept(code, instruction, mode):
@@ -16,12 +17,13 @@ def accept(code, instruction, mode):
         (args.mode is None or mode.value.lower() == args.mode.lower())
     )
 
-entries = [
-    (f'{i:x}{j:x}', entry[0], entry[1])
-    for i, row in enumerate(standard)
-    for j, entry in enumerate(row) if entry
-]
-
-for code, instruction, mode in entries:
-    if accept(code, instruction, mode):
-        print(f'{code} {instruction.value} {mode.value}')
+for entry in opcodes:
+    if entry is None:
+        continue
+    code = f'{entry.opcode:02x}'
+    if accept(code, entry.instruction, entry.mode):
+        if args.details:
+            cycles = f'{entry.cycles}+' if entry.page_penalty else f'{entry.cycles}'
+            print(f'{code} {entry.instruction.value} {entry.mode.value:<6} {entry.length} {cycles:<3} {entry.access.value:<5} {entry.flags}')
+        else:
+            print(f'{code} {entry.instruction.value} {entry.mode.value}')
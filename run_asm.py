@@ -1,26 +1,135 @@
 #!/usr/bin/env python
 
+import argparse
 import sys
-from src.model import CPU, Bus, Memory
+from src.debugger import Debugger, format_hit, parse_breakpoint, parse_range
+from src.disassembler import follow, loaded_mask
+from src.loader import leaves, load_image, parse_segment, program_range
+from src.model import CPU, Bus, FileTrace, FlightRecorder, RAM, TracedRAM
+from src.profiler import Profiler, load_symbols
 
 
-filename = len(sys.argv) > 1 and sys.argv[1] or None
-if not filename:
-    print("Error: Missing filename")
-    sys.exit(1)
-print(f"Using file {filename}")
+def address(text):
+    return int(text, 16)
+
+
+parser = argparse.ArgumentParser(description="Run a raw 6502 binary")
+parser.add_argument("filename", help="Binary file to run")
+parser.add_argument(
+    "--load", type=address, default=0, help="Load address in hex (default 0)"
+)
+parser.add_argument(
+    "--segment",
+    action="append",
+    type=parse_segment,
+    metavar="ADDR[:OFFSET[:SIZE]]",
+    help="Load part of the file at an address, all in hex. Can be repeated",
+)
+parser.add_argument(
+    "--entry", type=address, help="Start address in hex (default first segment)"
+)
+parser.add_argument(
+    "--dump", action="store_true", help="Dump the loaded memory before and after the run"
+)
+parser.add_argument(
+    "--trace", action="store_true", help="Print every memory read and write"
+)
+parser.add_argument(
+    "--profile", type=int, metavar="N", help="Sample the PC every N instructions"
+)
+parser.add_argument(
+    "--symbols",
+    help="Symbol file for the profile (ld65 -Ln labels, default subroutines found in the code)",
+)
+parser.add_argument("--folded", help="Write the sampled stacks in folded format")
+parser.add_argument(
+    "--record", type=int, metavar="N", help="Print the last N instructions on a crash"
+)
+parser.add_argument(
+    "--break",
+    dest="breakpoints",
+    action="append",
+    type=parse_breakpoint,
+    metavar="ADDR[:CONDITION]",
+    help="Show the registers when the PC reaches ADDR in hex and CONDITION holds, "
+    'e.g. "0203:X == 0 and mem[0x10] > 3". Can be repeated',
+)
+parser.add_argument(
+    "--watch",
+    action="append",
+    type=parse_range,
+    metavar="START[-END]",
+    help="Show the registers after a write to the addresses in hex. Can be repeated",
+)
+parser.add_argument(
+    "--watch-read",
+    action="append",
+    type=parse_range,
+    metavar="START[-END]",
+    help="Same as --watch for reads, instruction fetches included",
+)
+args = parser.parse_args()
+debugging = args.breakpoints or args.watch or args.watch_read
+if args.profile and debugging:
+    parser.error("--profile does not work with breakpoints or watchpoints")
+print(f"Using file {args.filename}")
 
 try:
-    data = bytearray(open(filename, "rb").read())
+    data, ranges = load_image(args.filename, args.load, args.segment)
 except Exception as e:
     print(f"Error: {e}")
     sys.exit(1)
 
-memory = Memory(bytearray(data))
-memory.dump()
+# The program ends when the PC leaves the segment it starts in
+entry = ranges[0][0] if args.entry is None else args.entry
+finished = leaves(*program_range(ranges, entry))
+
+trace = FileTrace(sys.stdout, buffer_size=1) if args.trace else None
+memory = TracedRAM(data, trace) if trace else RAM(data)
+if args.dump:
+    for start, stop in ranges:
+        memory.dump(start, stop)
 bus = Bus(memory)
 cpu = CPU(bus)
+cpu.PC = entry
+if args.record:
+    cpu.recorder = FlightRecorder(args.record)
 print(cpu)
-cpu.run()
+if args.profile:
+    if args.symbols:
+        symbols = load_symbols(args.symbols)
+    else:
+        symbols = follow(data, [entry], loaded_mask(ranges)).symbols()
+    profiler = Profiler(cpu, args.profile, symbols)
+    profiler.run(predicate=finished)
+elif debugging:
+    debugger = Debugger(cpu)
+    try:
+        for breakpoint, condition in args.breakpoints or []:
+            debugger.break_at(breakpoint, condition)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    for start, stop in args.watch or []:
+        debugger.watch(start, stop, write=True)
+    for start, stop in args.watch_read or []:
+        debugger.watch(start, stop, read=True, write=False)
+    # Report every hit and carry on until the program ends
+    while debugger.run_until(predicate=finished).hit is not None:
+        print(format_hit(debugger.hit))
+        print(cpu)
+        if finished(cpu):
+            break
+else:
+    cpu.run_until(predicate=finished)
+print("End of program")
 print(cpu)
-memory.dump()
+if args.dump:
+    for start, stop in ranges:
+        memory.dump(start, stop)
+
+if args.profile:
+    print(profiler.report(), end="")
+    if args.folded:
+        with open(args.folded, "w") as f:
+            f.write(profiler.folded())
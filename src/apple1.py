@@ -0,0 +1,257 @@
+import base64
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import List, NamedTuple, Optional, Tuple
+
+from src.idle import polled_register
+from src.model import CPU, Bus, Device, RAM
+from src.scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+# References:
+# https://zserge.com/posts/6502/
+# https://www.sbprojects.net/projects/apple1/wozmon.php
+
+WOZMON = base64.b64decode(
+    "2Figf4wS0KmnjRHQjRPQyd/wE8mb8APIEA+p3CDv/6mNIO//oAGIMPatEdAQ+60Q0JkAAiDv/8mN0NSg/6kAqgqFK8i5AALJjfDUya6Q9PDwybrw68nS8DuGKIYphCq5AAJJsMkKkAZpiMn6kBEKCgoKogQKJigmKcrQ+MjQ4MQq8JckK1AQpSiBJuYm0LXmJ0xE/2wkADArogK1J5UllSPK0PfQFKmNIO//pSUg3P+lJCDc/6m6IO//qaAg7/+hJCDc/4YrpSTFKKUl5SmwweYk0ALmJaUkKQcQyEhKSkpKIOX/aCkPCbDJupACaQYsEtAw+40S0GAAAAAPAP8AAA=="
+)
+
+# Labels of the Woz Monitor listing
+WOZMON_SYMBOLS = {
+    "RESET": 0xFF00,
+    "NOTCR": 0xFF0F,
+    "ESCAPE": 0xFF1A,
+    "GETLINE": 0xFF1F,
+    "BACKSPACE": 0xFF26,
+    "NEXTCHAR": 0xFF29,
+    "SETSTOR": 0xFF40,
+    "SETMODE": 0xFF41,
+    "BLSKIP": 0xFF43,
+    "NEXTITEM": 0xFF44,
+    "NEXTHEX": 0xFF5F,
+    "DIG": 0xFF6E,
+    "HEXSHIFT": 0xFF74,
+    "NOTHEX": 0xFF7F,
+    "TONEXTITEM": 0xFF91,
+    "RUN": 0xFF94,
+    "NOTSTOR": 0xFF97,
+    "SETADR": 0xFF9B,
+    "NXTPRNT": 0xFFA4,
+    "PRDATA": 0xFFBA,
+    "XAMNEXT": 0xFFC4,
+    "MOD8CHK": 0xFFD6,
+    "PRBYTE": 0xFFDC,
+    "PRHEX": 0xFFE5,
+    "ECHO": 0xFFEF,
+}
+
+KBD = 0xD010  # keyboard data
+KBDCR = 0xD011  # keyboard control
+DSP = 0xD012  # display data
+
+# Cycles between checks for input, about 2 ms at the 1 MHz Apple I clock
+BATCH_CYCLES = 2000
+
+CLOCK_HZ = 1_000_000
+
+# Longest sleep on the input before checking whether it has ended
+IDLE_TIMEOUT = 0.1
+
+
+def print_output(text):
+    print(text, end="", flush=True)
+
+
+class PIA(Device):
+    # Keyboard and display of the Apple I at $D010-$D013
+    def __init__(self, output=print_output):
+        super().__init__()
+        self.keys: deque[int] = deque()
+        self.output = output
+
+    def read(self, address):
+        if address == KBD:
+            return self.keys.popleft() | 0x80 if self.keys else 0x80
+        elif address == KBDCR:
+            return 0x80 if self.keys else 0
+        return self.ram[address]
+
+    def write(self, address, value):
+        if address == DSP:
+            if value & 0x7F == 0x0D:  # '\r'
+                self.output("\n")
+            elif value & 0x7F == 0x5F:  # '_'
+                # '_' works as backspace
+                self.output("\b")
+            else:
+                self.output(chr(value & 0x7F))
+        else:
+            self.ram[address] = value
+
+    def send_key(self, c):
+        self.keys.append(c)
+
+    @staticmethod
+    def keys_of(text):
+        # Newlines become carriage returns
+        text = text.replace("\r\n", "\n")
+        return [13 if c == "\n" else ord(c) for c in text]
+
+    def paste(self, text):
+        # Queue a whole text at once
+        self.keys.extend(self.keys_of(text))
+
+
+class WozHex(NamedTuple):
+    segments: List[Tuple[int, bytes]]  # (address, data) in file order
+    run: Optional[int]  # address of the last "ADDR R" line
+
+
+def parse_woz_hex(text) -> WozHex:
+    # Monitor input as it would be typed: "0300: A9 00 20 EF FF" stores bytes,
+    # ": 4C 00 03" continues at the next address and "0300 R" runs. Lines that
+    # only examine memory are skipped.
+    segments: List[Tuple[int, bytearray]] = []
+    address = None
+    run = None
+    for number, line in enumerate(text.splitlines(), 1):
+        try:
+            if ":" in line:
+                start, data = line.split(":", 1)
+                if start.split():
+                    address = int(start.split()[-1], 16) & 0xFFFF
+                if address is None:
+                    raise ValueError("no address to store at")
+                values = bytes(int(value, 16) & 0xFF for value in data.split())
+                if segments and segments[-1][0] + len(segments[-1][1]) == address:
+                    segments[-1][1].extend(values)
+                else:
+                    segments.append((address, bytearray(values)))
+                address = (address + len(values)) & 0xFFFF
+            else:
+                words = line.upper().split()
+                if len(words) == 2 and words[1] == "R":
+                    run = int(words[0], 16) & 0xFFFF
+        except ValueError as e:
+            raise ValueError(f"Line {number}: {e}") from None
+    return WozHex([(address, bytes(data)) for address, data in segments], run)
+
+
+class AppleI:
+    # 64K of RAM, the PIA and the Woz Monitor ROM at $FF00
+    def __init__(self, output=print_output):
+        self.memory = RAM(bytearray(0x10000))
+        self.bus = Bus(self.memory)
+        self.pia = PIA(output)
+        self.bus.map_device(KBD, DSP + 1, self.pia)
+        self.bus.map_rom(0xFF00, WOZMON)
+        self.cpu = CPU(self.bus)
+        self.cpu.reset()
+        self.scheduler = Scheduler(self.cpu)
+        self.recorder = None  # SessionRecorder of the keys and clock jumps
+
+    def send_key(self, key):
+        if self.recorder is not None:
+            self.recorder.key(key)
+        self.pia.send_key(key)
+
+    def paste(self, text):
+        # Type text into the monitor, it echoes and parses every character
+        if self.recorder is not None:
+            for key in self.pia.keys_of(text):
+                self.recorder.key(key)
+        self.pia.paste(text)
+
+    def load(self, text):
+        # Store Woz hex input directly in memory, skipping the monitor.
+        # Returns the address of its run command, if any.
+        program = parse_woz_hex(text)
+        write = self.bus.write
+        for address, data in program.segments:
+            for offset, value in enumerate(data):
+                write((address + offset) & 0xFFFF, value)
+        return program.run
+
+    def idle(self):
+        # Polling the keyboard, e.g. in the NEXTCHAR loop, with no keys left
+        return not self.pia.keys and polled_register(self.cpu) == KBDCR
+
+    def sleep(self, reader):
+        # Only a key can end the polling loop, so block on the input instead
+        # of running it and move the clock on by the time slept
+        start = time.perf_counter()
+        while reader.keys.empty() and not reader.finished():
+            reader.wait(IDLE_TIMEOUT)
+        cycles = int((time.perf_counter() - start) * CLOCK_HZ)
+        self.cpu.cycles += cycles
+        if self.recorder is not None:
+            self.recorder.jump(cycles)
+
+    def run(self, reader, batch=BATCH_CYCLES, quit="q"):
+        # Run with an event every batch cycles that feeds the characters the
+        # reader has queued to the keyboard. Returns the quit character, or
+        # None once the input has ended and the monitor has consumed it.
+        scheduler = self.scheduler
+        pia = self.pia
+        keys = reader.keys
+        stopped_by = []
+
+        def poll():
+            if keys.empty() and not reader.finished() and self.idle():
+                self.sleep(reader)
+            finished = reader.finished()
+            while not keys.empty():
+                c = keys.get_nowait()
+                if c == quit:
+                    stopped_by.append(c)
+                    scheduler.stop()
+                    return
+                key = 13 if c == "\n" else ord(c)
+                logger.debug(f"SEND KEY {key} {chr(key)}")
+                self.send_key(key)
+            if finished and keys.empty() and self.idle():
+                scheduler.stop()
+
+        event = scheduler.every(batch, poll)
+        try:
+            scheduler.run_until()
+        finally:
+            scheduler.cancel(event)
+        return stopped_by[0] if stopped_by else None
+
+
+class InputReader:
+    # Reads characters from a file on a daemon thread into a queue, so the
+    # emulator only blocks on input when it chooses to. Any file object with
+    # read(1) works: stdin, a pipe or socket.makefile().
+    def __init__(self, file):
+        self.file = file
+        self.keys: queue.Queue = queue.Queue()
+        self.ready = threading.Event()  # set on every character and at the end
+        self.thread = threading.Thread(target=self.read, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def finished(self):
+        # Every character of the file has been queued
+        return not self.thread.is_alive()
+
+    def wait(self, timeout=None):
+        # Block until a character is queued or the input ends
+        self.ready.wait(timeout)
+        self.ready.clear()
+
+    def read(self):
+        while True:
+            c = self.file.read(1)
+            if not c:
+                break
+            self.keys.put(c)
+            self.ready.set()
+        self.ready.set()
@@ -0,0 +1,273 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, NamedTuple, Optional
+
+from src.apple1 import AppleI
+from src.assembler import assemble
+from src.model import CPU, Bus, RAM
+from src.translate import Translator
+
+# Benchmark workloads. Each one assembles its guest program into a fresh
+# machine for a given scale and runs headless until the guest reaches its done
+# address or stop condition.
+
+START = 0x0200
+
+
+class Workload(NamedTuple):
+    cpu: CPU
+    done: Optional[int]  # PC the guest ends at
+    stop: Optional[Callable[[CPU], bool]]  # or a stop condition
+    check: Callable[[], bool]  # verifies the guest result
+
+
+class Result(NamedTuple):
+    workload: str
+    engine: str
+    scale: int
+    instructions: int
+    cycles: int
+    wall_time: float
+    instructions_per_sec: float
+    cycles_per_sec: float
+    peak_rss_kb: int
+
+
+def _machine(source, data=None):
+    ram = bytearray(0x10000)
+    program = assemble(source, START)
+    program.load(ram)
+    if data:
+        for address, values in data.items():
+            ram[address : address + len(values)] = values
+    cpu = CPU(Bus(RAM(ram)))
+    cpu.PC = START
+    return cpu, program.symbols["done"]
+
+
+def tight_loop(scale):
+    cpu, done = _machine(
+        f"""
+        LDY #{scale}
+outer:  LDX #$00
+inner:  DEX
+        BNE inner
+        DEY
+        BNE outer
+done:   JMP done
+"""
+    )
+    return Workload(cpu, done, None, lambda: cpu.X == 0 and cpu.Y == 0)
+
+
+def memory_copy(scale):
+    # Copy scale pages from $1000 to $8000
+    pages = min(scale, 0x70)
+    source = bytes(x & 0xFF for x in range(pages * 0x100))
+    cpu, done = _machine(
+        f"""
+        LDA #$00
+        STA $00
+        STA $02
+        LDA #$10
+        STA $01
+        LDA #$80
+        STA $03
+        LDX #{pages}
+        LDY #$00
+copy:   LDA ($00),Y
+        STA ($02),Y
+        INY
+        BNE copy
+        INC $01
+        INC $03
+        DEX
+        BNE copy
+done:   JMP done
+""",
+        {0x1000: source},
+    )
+    ram = cpu.bus.ram
+    return Workload(
+        cpu, done, None, lambda: ram[0x8000 : 0x8000 + len(source)] == source
+    )
+
+
+def bcd_arithmetic(scale):
+    # Count a three byte BCD number at $10-$12 up to 256 * scale
+    cpu, done = _machine(
+        f"""
+        SED
+        LDA #$00
+        STA $10
+        STA $11
+        STA $12
+        LDY #{scale}
+outer:  LDX #$00
+inner:  CLC
+        LDA $10
+        ADC #$01
+        STA $10
+        LDA $11
+        ADC #$00
+        STA $11
+        LDA $12
+        ADC #$00
+        STA $12
+        DEX
+        BNE inner
+        DEY
+        BNE outer
+done:   JMP done
+"""
+    )
+    expected = int(f"{256 * (scale or 256):06d}", 16).to_bytes(3, "little")
+    return Workload(cpu, done, None, lambda: cpu.bus.ram[0x10:0x13] == expected)
+
+
+def subroutines(scale):
+    # Two levels of JSR/RTS, 256 * scale times
+    cpu, done = _machine(
+        f"""
+        LDY #{scale}
+outer:  LDX #$00
+inner:  JSR first
+        DEX
+        BNE inner
+        DEY
+        BNE outer
+done:   JMP done
+first:  JSR second
+        RTS
+second: INC $20
+        RTS
+"""
+    )
+    return Workload(cpu, done, None, lambda: cpu.S == 0xFF and cpu.bus.ram[0x20] == 0)
+
+
+def wozmon(scale):
+    # Boot the Woz Monitor and BLOCK XAM its own ROM scale times
+    output = []
+    machine = AppleI(output.append)
+    for _ in range(scale):
+        for c in "FF00.FFFF\r":
+            machine.pia.send_key(ord(c))
+
+    def stop(cpu):
+        # Back in the keyboard polling loop with no keys left
+        return cpu.PC == 0xFF29 and not machine.pia.keys
+
+    def check():
+        return "".join(output).count("FFF8: 00 00 00 0F 00 FF 00 00") == scale
+
+    return Workload(machine.cpu, None, stop, check)
+
+
+workloads = {
+    "tight_loop": tight_loop,
+    "memory_copy": memory_copy,
+    "bcd_arithmetic": bcd_arithmetic,
+    "subroutines": subroutines,
+    "wozmon": wozmon,
+}
+
+
+# Engines run a workload to completion and return the instruction count
+
+
+def run_step(workload):
+    cpu = workload.cpu
+    count = 0
+    if workload.done is not None:
+        while cpu.PC != workload.done:
+            cpu.step()
+            count += 1
+    else:
+        while True:
+            cpu.step()
+            count += 1
+            if workload.stop(cpu):
+                break
+    return count
+
+
+def run_dispatch(workload):
+    if workload.done is not None:
+        return workload.cpu.run_until(pc=workload.done).instructions
+    return workload.cpu.run_until(predicate=workload.stop).instructions
+
+
+def run_translate(workload):
+    cpu = workload.cpu
+    translator = Translator(cpu)
+    count = 0
+    if workload.done is not None:
+        while cpu.PC != workload.done:
+            count += translator.step()
+    else:
+        while True:
+            count += translator.step()
+            if workload.stop(cpu):
+                break
+    return count
+
+
+engines = {
+    "step": run_step,
+    "dispatch": run_dispatch,
+    "translate": run_translate,
+}
+
+
+def measure(name, engine, scale):
+    # Run a workload in this process, peak_rss_kb is filled in by run()
+    workload = workloads[name](scale)
+    start = time.perf_counter()
+    instructions = engines[engine](workload)
+    wall_time = time.perf_counter() - start
+    if not workload.check():
+        raise RuntimeError(f"{name} produced a wrong result with the {engine} engine")
+    cycles = workload.cpu.cycles
+    return Result(
+        name,
+        engine,
+        scale,
+        instructions,
+        cycles,
+        wall_time,
+        instructions / wall_time,
+        cycles / wall_time,
+        0,
+    )
+
+
+CHILD = (
+    "import json, sys\n"
+    "from src.benchmark import measure\n"
+    "json.dump(measure(*sys.argv[1:3], int(sys.argv[3])), sys.stdout)\n"
+)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(name, engine, scale):
+    # Each workload runs in a fresh interpreter so its peak RSS is its own and
+    # not the largest of everything run before it. wait4() returns the usage of
+    # that one child, the same numbers RUSAGE_CHILDREN adds up over all of them.
+    process = subprocess.Popen(
+        [sys.executable, "-c", CHILD, name, engine, str(scale)],
+        stdout=subprocess.PIPE,
+        cwd=ROOT,
+    )
+    output = process.stdout.read()
+    process.stdout.close()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"{name} failed with the {engine} engine")
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    peak = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return Result(*json.loads(output)[:-1], peak)
@@ -0,0 +1,259 @@
+from typing import Dict, Optional, Tuple
+
+from src.dispatch import dispatch_table
+from src.instructions import cycles_standard
+from src.model import Access, Device, Hit, RunResult, StopReason
+
+# Breakpoints and watchpoints. Each kind has a 64K-bit bitmap, one bit per
+# address, tested inline with a shift and a mask. Execute breakpoints are
+# checked by the run loop of the debugger before every instruction, read and
+# write watchpoints by a Watch device the debugger puts in front of the bus
+# pages they cover. With nothing set, run_until() is CPU.run_until() and no
+# page is touched, so there is no cost at all.
+
+BITMAP_SIZE = 0x10000 >> 3
+
+# Names a breakpoint condition can use besides the registers and flags
+CONDITION_BUILTINS = {"abs": abs, "min": min, "max": max, "len": len}
+
+
+def parse_breakpoint(text) -> Tuple[int, Optional[str]]:
+    # "ADDR[:CONDITION]" with the address in hex, e.g. "0203:X == 0"
+    address, _, condition = text.partition(":")
+    return int(address, 16), condition.strip() or None
+
+
+def parse_range(text) -> Tuple[int, int]:
+    # "START[-END]" in hex, e.g. "0010" or "0200-02ff"
+    start, _, end = text.partition("-")
+    return int(start, 16), int(end or start, 16)
+
+
+def format_hit(hit: Hit):
+    if hit.access == Access.EXECUTE:
+        return f"Breakpoint at ${hit.address:04X}"
+    return (
+        f"{hit.access.value.capitalize()} of ${hit.value:02X} at ${hit.address:04X}"
+        f" by the instruction at ${hit.pc:04X}"
+    )
+
+
+def set_bits(bitmap, start, end, value):
+    for address in range(start, end + 1):
+        if value:
+            bitmap[address >> 3] |= 1 << (address & 7)
+        else:
+            bitmap[address >> 3] &= ~(1 << (address & 7))
+
+
+def bit_set(bitmap, address):
+    return bitmap[address >> 3] >> (address & 7) & 1
+
+
+class Watch(Device):
+    # Put in front of a page with watchpoints. Passes every access on to what
+    # was mapped there before and reports the watched ones to the debugger.
+    def __init__(self, debugger, reader, writer):
+        super().__init__()
+        self.debugger = debugger
+        self.reader = reader  # previous read_pages entry, None for RAM
+        self.writer = writer  # previous write_pages entry
+
+    def read(self, address):
+        reader = self.reader
+        value = self.ram[address] if reader is None else reader.read(address)
+        if self.debugger.reads[address >> 3] >> (address & 7) & 1:
+            self.debugger.watched(Access.READ, address, value)
+        return value
+
+    def write(self, address, value):
+        writer = self.writer
+        if writer is None:
+            self.ram[address] = value
+        else:
+            writer.write(address, value)
+        if self.debugger.writes[address >> 3] >> (address & 7) & 1:
+            self.debugger.watched(Access.WRITE, address, value)
+
+
+class Debugger:
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.breakpoints = bytearray(BITMAP_SIZE)
+        self.reads = bytearray(BITMAP_SIZE)
+        self.writes = bytearray(BITMAP_SIZE)
+        self.conditions: Dict[int, object] = {}  # address -> compiled condition
+        self.watches: Dict[int, Watch] = {}  # page -> installed Watch
+        self.breakpoint_count = 0
+        self.hit: Optional[Hit] = None
+        self.instruction_pc = 0  # start of the instruction being run
+
+    def break_at(self, address, condition=None):
+        # Stop before the instruction at address runs. condition is a Python
+        # expression over A, X, Y, S, PC, P, the flags n v d i z c, cycles
+        # and mem, e.g. "X == 0 and mem[0x10] > 3".
+        address &= 0xFFFF
+        if condition is not None:
+            try:
+                self.conditions[address] = compile(condition, "<breakpoint>", "eval")
+            except SyntaxError as e:
+                raise ValueError(f"Invalid condition {condition!r}: {e.msg}") from None
+        else:
+            self.conditions.pop(address, None)
+        if not bit_set(self.breakpoints, address):
+            self.breakpoint_count += 1
+            set_bits(self.breakpoints, address, address, True)
+
+    def clear(self, address):
+        address &= 0xFFFF
+        self.conditions.pop(address, None)
+        if bit_set(self.breakpoints, address):
+            self.breakpoint_count -= 1
+            set_bits(self.breakpoints, address, address, False)
+
+    def watch(self, start, end=None, read=False, write=True):
+        # Stop after an instruction reads or writes any address from start to
+        # end inclusive. Reads include instruction fetches.
+        end = start if end is None else end
+        if not 0 <= start <= end <= 0xFFFF:
+            raise ValueError(f"Invalid range {start:#06x}-{end:#06x}")
+        if read:
+            set_bits(self.reads, start, end, True)
+        if write:
+            set_bits(self.writes, start, end, True)
+        self.update_pages(start, end)
+
+    def unwatch(self, start, end=None, read=True, write=True):
+        end = start if end is None else end
+        if read:
+            set_bits(self.reads, start, end, False)
+        if write:
+            set_bits(self.writes, start, end, False)
+        self.update_pages(start, end)
+
+    def update_pages(self, start, end):
+        # Pages with a watched address go through a Watch, the others get
+        # back what was mapped before
+        bus = self.cpu.bus
+        for page in range(start >> 8, (end >> 8) + 1):
+            chunk = slice(page << 5, (page + 1) << 5)
+            reads = any(self.reads[chunk])
+            writes = any(self.writes[chunk])
+            watch = self.watches.get(page)
+            if watch is None and (reads or writes):
+                watch = Watch(self, bus.read_pages[page], bus.write_pages[page])
+                watch.attach(bus)
+                self.watches[page] = watch
+            if watch is None:
+                continue
+            bus.read_pages[page] = watch if reads else watch.reader
+            bus.write_pages[page] = watch if writes else watch.writer
+            if not reads and not writes:
+                del self.watches[page]
+
+    def watched(self, access, address, value):
+        # Called by Watch. The first access of an instruction is reported.
+        if self.hit is None:
+            self.hit = Hit(access, address, value, self.instruction_pc)
+
+    def condition_holds(self, address):
+        condition = self.conditions.get(address)
+        if condition is None:
+            return True
+        cpu = self.cpu
+        names = {
+            "A": cpu.A,
+            "X": cpu.X,
+            "Y": cpu.Y,
+            "S": cpu.S,
+            "PC": cpu.PC,
+            "P": cpu.P,
+            "n": cpu.n,
+            "v": cpu.v,
+            "d": cpu.d,
+            "i": cpu.i,
+            "z": cpu.z,
+            "c": cpu.c,
+            "cycles": cpu.cycles,
+            "mem": cpu.bus.ram,
+        }
+        return bool(eval(condition, {"__builtins__": CONDITION_BUILTINS}, names))
+
+    def step(self, count=1):
+        return self.run_until(instructions=count)
+
+    def run_until(self, pc=None, cycles=None, instructions=None, predicate=None):
+        # CPU.run_until() that also stops with StopReason.BREAKPOINT before an
+        # instruction at a breakpoint whose condition holds, or with
+        # StopReason.WATCHPOINT after an instruction that made a watched
+        # access. result.hit tells which. A breakpoint at the PC the run
+        # starts from is stepped over, so runs can be resumed from a hit.
+        cpu = self.cpu
+        self.hit = None
+        if not self.breakpoint_count and not self.watches:
+            return cpu.run_until(pc, cycles, instructions, predicate)
+        if pc is None and cycles is None and instructions is None and predicate is None:
+            raise ValueError("No stop condition given")
+
+        table = dispatch_table
+        timing = cycles_standard
+        read = cpu.read
+        recorder = cpu.recorder
+        breakpoints = self.breakpoints
+        stop_pc = -1 if pc is None else pc
+        start = cpu.cycles
+        end = start + cycles if cycles is not None else float("inf")
+        limit = instructions if instructions is not None else -1
+        resume = cpu.PC
+        count = 0
+
+        if cycles is not None and cycles <= 0:
+            reason = StopReason.CYCLES
+        elif instructions is not None and instructions <= 0:
+            reason = StopReason.INSTRUCTIONS
+        else:
+            try:
+                while True:
+                    if cpu.pending:
+                        self.instruction_pc = cpu.PC
+                        cpu.interrupt()
+                        if self.hit is not None:
+                            # The interrupt pushed to a watched address
+                            reason = StopReason.WATCHPOINT
+                            break
+                    address = cpu.PC
+                    if breakpoints[address >> 3] >> (address & 7) & 1 and (
+                        count or address != resume
+                    ):
+                        if self.condition_holds(address):
+                            self.hit = Hit(Access.EXECUTE, address, None, address)
+                            reason = StopReason.BREAKPOINT
+                            break
+                    if recorder is not None:
+                        recorder.record(cpu)
+                    self.instruction_pc = address
+                    opcode = read(address)
+                    cpu.PC = (address + 1) & 0xFFFF
+                    cpu.cycles += timing[opcode]
+                    table[opcode](cpu)
+                    count += 1
+                    if self.hit is not None:
+                        reason = StopReason.WATCHPOINT
+                        break
+                    if cpu.PC == stop_pc:
+                        reason = StopReason.PC
+                        break
+                    if cpu.cycles >= end:
+                        reason = StopReason.CYCLES
+                        break
+                    if count == limit:
+                        reason = StopReason.INSTRUCTIONS
+                        break
+                    if predicate is not None and predicate(cpu):
+                        reason = StopReason.PREDICATE
+                        break
+            except Exception:
+                cpu.crashed()
+                raise
+
+        return RunResult(reason, count, cpu.cycles - start, cpu.PC, self.hit)
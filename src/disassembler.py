@@ -0,0 +1,291 @@
+import os
+import re
+from itertools import chain
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.instructions import format_instruction, i, m, opcodes
+from src.loader import MEMORY_SIZE
+
+try:
+    import numpy as np
+except ImportError:  # the pure Python sweep is used instead
+    np = None
+
+# Streaming linear sweep disassembler. Input is read in chunks and flows
+# through generators: bytes from the file, instruction boundaries from a
+# table-driven pass over each chunk, then formatted lines. Only one chunk is
+# held in memory, so files of any size can be disassembled.
+#
+# follow() traces the control flow of a memory image instead and returns a
+# CodeMap of the reachable code, which the disassembler, the translator and
+# the profiler can share.
+
+CHUNK_SIZE = 0x10000
+
+# Bytes taken by the instruction starting with each opcode, unknown opcodes
+# take one byte
+LENGTHS = bytes(entry.length if entry else 1 for entry in opcodes)
+
+HEX_TEXT = re.compile(rb"[0-9A-Fa-fXx,\s]*")
+HEX_SEPARATOR = re.compile(rb"[,\s]+")
+CA65_LINE = re.compile(r"[0-9A-Fa-f]{6}r?\s+\d+\s\s")
+
+
+# Input formats, each a generator of byte chunks
+
+
+def binary_chunks(f: BinaryIO, size=CHUNK_SIZE) -> Iterator[bytes]:
+    while chunk := f.read(size):
+        yield chunk
+
+
+def hex_chunks(lines: Iterable[bytes]) -> Iterator[bytes]:
+    # Comma separated hex bytes such as "0xA9, 0x01" or "A9,01," as printed
+    # by hexdump in asm/Makefile
+    for line in lines:
+        yield bytes(int(value, 16) for value in HEX_SEPARATOR.split(line) if value)
+
+
+def ca65_chunks(lines: Iterable[bytes]) -> Iterator[bytes]:
+    # Listings from ca65 -l: "000000r 1  A9 01     lda #$01". The bytes are
+    # the 12 columns after the address and include level, unresolved
+    # relocations ("rr") are shown as zero.
+    for line in lines:
+        text = line.decode("latin-1")
+        match = CA65_LINE.match(text)
+        if match:
+            field = text[match.end() : match.end() + 12].split()
+            yield bytes(0 if value in ("rr", "xx") else int(value, 16) for value in field)
+
+
+def open_chunks(f: BinaryIO, name="", kind="auto") -> Iterator[bytes]:
+    # kind is "bin", "hex", "ca65" or "auto", which picks ca65 for .lst files,
+    # hex for files that only hold hex digits and commas and bin otherwise
+    if kind == "auto" and name.endswith(".lst"):
+        kind = "ca65"
+    if kind == "ca65":
+        return ca65_chunks(f)
+    if kind == "hex":
+        return hex_chunks(f)
+    first = f.read(CHUNK_SIZE)
+    if kind == "auto" and first and HEX_TEXT.fullmatch(first):
+        # Lines may be split by the sniffed chunk, join it with its line end
+        return hex_chunks(chain([first + f.readline()], f))
+    return chain([first], binary_chunks(f))
+
+
+# Instruction boundaries
+
+
+def starts_python(data: bytes) -> List[int]:
+    # Offset of every instruction in a linear sweep from offset 0
+    lengths = LENGTHS
+    size = len(data)
+    starts = []
+    offset = 0
+    while offset < size:
+        starts.append(offset)
+        offset += lengths[data[offset]]
+    return starts
+
+
+def starts_numpy(data: bytes) -> List[int]:
+    # Same result by pointer doubling: jump[i] is the offset reached from i
+    # after 2**k instructions, and each round adds the offsets reached from
+    # those already found, so log2(n) rounds of array operations cover the
+    # whole sweep. The offset len(data) is the end of the data.
+    size = len(data)
+    if not size:
+        return []
+    codes = np.frombuffer(data, dtype=np.uint8)
+    jump = np.arange(size + 1)
+    jump[:size] += np.frombuffer(LENGTHS, dtype=np.uint8)[codes]
+    np.minimum(jump, size, out=jump)
+    reached = np.zeros(size + 1, dtype=bool)
+    reached[0] = True
+    while True:
+        reached[jump[reached]] = True
+        if jump[0] == size:
+            break
+        jump = jump[jump]
+    return np.flatnonzero(reached[:size]).tolist()
+
+
+starts = starts_numpy if np is not None else starts_python
+
+
+def sweep(chunks: Iterable[bytes], address=0) -> Iterator[Tuple[int, bytes]]:
+    # (address, bytes) of each instruction. An instruction cut by the end of
+    # a chunk is carried over to the next one, one cut by the end of the
+    # input is yielded as it is.
+    lengths = LENGTHS
+    pending = b""
+    for chunk in chunks:
+        data = pending + chunk
+        offsets = starts(data)
+        end = len(data)
+        if offsets and offsets[-1] + lengths[data[offsets[-1]]] > end:
+            end = offsets.pop()
+        for start, next_start in zip(offsets, offsets[1:] + [end]):
+            yield (address + start) & 0xFFFF, data[start:next_start]
+        address += end
+        pending = data[end:]
+    if pending:
+        yield address & 0xFFFF, pending
+
+
+# Output
+
+
+def format_line(address: int, code: bytes) -> str:
+    entry = opcodes[code[0]]
+    if entry is None or len(code) < entry.length:
+        text = "???"
+    else:
+        text = format_instruction(entry, code[1:], address)
+    hex_code = " ".join(f"{b:02X}" for b in code)
+    return f"{address:04X}  {hex_code:<8}  {text}\n"
+
+
+def format_python(address: int, code: bytes) -> str:
+    # Commented byte lists to paste into Python, e.g. for unit tests
+    entry = opcodes[code[0]]
+    if entry is None or len(code) < entry.length:
+        return "".join(f"{f'{b:#04X},':<20}# ???\n" for b in code)
+    text = f"{code[0]:#04X}," + "".join(f" {b:#04X}, " for b in code[1:])
+    return f"{text:<20}# {entry.instruction.name}, {entry.mode.name}\n"
+
+
+def disassemble(chunks: Iterable[bytes], address=0, python=False) -> Iterator[str]:
+    line = format_python if python else format_line
+    for start, code in sweep(chunks, address):
+        yield line(start, code)
+
+
+def input_files(paths: Iterable[str]) -> Iterator[str]:
+    # Files as given, directories are walked in sorted order
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+# Control flow
+
+NMI_VECTOR = 0xFFFA
+RESET_VECTOR = 0xFFFC
+IRQ_VECTOR = 0xFFFE
+
+# Instructions that never continue with the next one
+no_fall_through = {i.JMP, i.RTS, i.RTI, i.BRK}
+
+
+class CodeMap:
+    # Reachable code of a 64K image: where instructions start, which bytes
+    # they cover and where control flow enters
+    def __init__(self):
+        self.starts = bytearray(MEMORY_SIZE)  # 1 where an instruction starts
+        self.code = bytearray(MEMORY_SIZE)  # 1 for every byte of those
+        self.entries: List[int] = []  # where tracing started
+        self.calls = set()  # JSR targets
+        self.targets = set()  # JMP and branch targets
+        self.leaders = set()  # first instructions of the basic blocks
+
+    def __contains__(self, address):
+        return bool(self.starts[address & 0xFFFF])
+
+    def instructions(self):
+        return [address for address in range(MEMORY_SIZE) if self.starts[address]]
+
+    def blocks(self):
+        # Basic block start addresses, in address order
+        return sorted(address for address in self.leaders if self.starts[address])
+
+    def symbols(self) -> Dict[str, int]:
+        # Names for the entry points and subroutines, in the form taken by
+        # Profiler(symbols=...)
+        symbols = {f"sub_{address:04X}": address for address in self.calls}
+        symbols.update((f"entry_{address:04X}", address) for address in self.entries)
+        return symbols
+
+
+def loaded_mask(ranges: Iterable[Tuple[int, int]]) -> bytearray:
+    # 1 for every address inside one of the (start, end) ranges
+    loaded = bytearray(MEMORY_SIZE)
+    for start, end in ranges:
+        loaded[start:end] = bytes([1]) * (end - start)
+    return loaded
+
+
+def vectors(memory) -> List[int]:
+    # RESET, NMI and IRQ handler addresses
+    return [memory[v] | memory[v + 1] << 8 for v in (RESET_VECTOR, NMI_VECTOR, IRQ_VECTOR)]
+
+
+def follow(memory, entries: Iterable[int], loaded: Optional[bytes] = None) -> CodeMap:
+    # Follow JMP, JSR, branches and fall-through from the entries with a
+    # worklist. loaded marks the addresses that hold the image, control flow
+    # that leaves them or reaches an unknown opcode is not followed further.
+    # Indirect jumps, RTS and RTI have no static target and end a path.
+    code_map = CodeMap()
+    starts = code_map.starts
+    code = code_map.code
+    if loaded is None:
+        loaded = bytes([1]) * MEMORY_SIZE
+    work = []
+    for entry in entries:
+        entry &= 0xFFFF
+        if loaded[entry] and entry not in code_map.entries:
+            code_map.entries.append(entry)
+            work.append(entry)
+    while work:
+        address = work.pop()
+        code_map.leaders.add(address)
+        while loaded[address] and not starts[address]:
+            entry = opcodes[memory[address]]
+            if entry is None:
+                break
+            end = address + entry.length
+            if end > MEMORY_SIZE or not all(loaded[address:end]):
+                break
+            starts[address] = 1
+            code[address:end] = bytes([1]) * entry.length
+            instruction = entry.instruction
+            if entry.mode == m.REL:
+                offset = memory[address + 1]
+                target = (end + ((offset ^ 0x80) - 0x80)) & 0xFFFF
+                code_map.targets.add(target)
+                work.append(target)
+                code_map.leaders.add(end & 0xFFFF)
+            elif instruction in (i.JMP, i.JSR) and entry.mode == m.ABS:
+                target = memory[address + 1] | memory[address + 2] << 8
+                (code_map.calls if instruction == i.JSR else code_map.targets).add(target)
+                work.append(target)
+                if instruction == i.JSR:
+                    code_map.leaders.add(end & 0xFFFF)
+            if instruction in no_fall_through:
+                break
+            address = end & 0xFFFF
+    return code_map
+
+
+def disassemble_code(memory, code_map: CodeMap, start: int, end: int) -> Iterator[str]:
+    # Instructions where the code map has them, .byte lines of up to 8 bytes
+    # everywhere else
+    address = start
+    while address < end:
+        if code_map.starts[address]:
+            length = opcodes[memory[address]].length
+            yield format_line(address, bytes(memory[address : address + length]))
+            address += length
+            continue
+        data = address
+        while data < end and data - address < 8 and not code_map.starts[data]:
+            data += 1
+        values = ", ".join(f"${b:02X}" for b in memory[address:data])
+        yield f"{address:04X}  {'':<8}  .byte {values}\n"
+        address = data
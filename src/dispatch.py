@@ -0,0 +1,567 @@
+from typing import Callable, List
+
+from src.instructions import i, m, opcodes
+
+# Table-driven execution engine. Every opcode gets its own handler, built once
+# from an addressing mode resolver and an instruction semantic. A handler is
+# called with the opcode already fetched (PC points to the first operand byte)
+# and must leave the CPU in the same state as CPU.execute() would.
+
+Handler = Callable[[object], None]
+
+
+# Addressing modes. Each resolver consumes the operand bytes and returns the
+# effective address. Immediate and relative operands resolve to the address of
+# the operand byte itself, so reading it yields the literal value.
+
+
+def _imm(cpu):
+    pc = cpu.PC
+    cpu.PC = (pc + 1) & 0xFFFF
+    return pc
+
+
+def _zpg(cpu):
+    pc = cpu.PC
+    cpu.PC = (pc + 1) & 0xFFFF
+    return cpu.read(pc)
+
+
+def _zpg_x(cpu):
+    pc = cpu.PC
+    cpu.PC = (pc + 1) & 0xFFFF
+    return (cpu.read(pc) + cpu.X) & 0xFF
+
+
+def _zpg_y(cpu):
+    pc = cpu.PC
+    cpu.PC = (pc + 1) & 0xFFFF
+    return (cpu.read(pc) + cpu.Y) & 0xFF
+
+
+def _abs(cpu):
+    pc = cpu.PC
+    ll = cpu.read(pc)
+    hh = cpu.read((pc + 1) & 0xFFFF)
+    cpu.PC = (pc + 2) & 0xFFFF
+    return (hh << 8) | ll
+
+
+def _abs_x(cpu):
+    pc = cpu.PC
+    ll = cpu.read(pc)
+    hh = cpu.read((pc + 1) & 0xFFFF)
+    cpu.PC = (pc + 2) & 0xFFFF
+    return (((hh << 8) | ll) + cpu.X) & 0xFFFF
+
+
+def _abs_y(cpu):
+    pc = cpu.PC
+    ll = cpu.read(pc)
+    hh = cpu.read((pc + 1) & 0xFFFF)
+    cpu.PC = (pc + 2) & 0xFFFF
+    return (((hh << 8) | ll) + cpu.Y) & 0xFFFF
+
+
+def _abs_x_read(cpu):
+    pc = cpu.PC
+    ll = cpu.read(pc)
+    hh = cpu.read((pc + 1) & 0xFFFF)
+    cpu.PC = (pc + 2) & 0xFFFF
+    addr = (((hh << 8) | ll) + cpu.X) & 0xFFFF
+    if addr >> 8 != hh:
+        cpu.cycles += 1
+    return addr
+
+
+def _abs_y_read(cpu):
+    pc = cpu.PC
+    ll = cpu.read(pc)
+    hh = cpu.read((pc + 1) & 0xFFFF)
+    cpu.PC = (pc + 2) & 0xFFFF
+    addr = (((hh << 8) | ll) + cpu.Y) & 0xFFFF
+    if addr >> 8 != hh:
+        cpu.cycles += 1
+    return addr
+
+
+def _ind(cpu):
+    pc = cpu.PC
+    ll = cpu.read(pc)
+    hh = cpu.read((pc + 1) & 0xFFFF)
+    cpu.PC = (pc + 2) & 0xFFFF
+    target_ll = cpu.read((hh << 8) | ll)
+    # hh is not incremented by the CPU when the pointer crosses a page
+    target_hh = cpu.read((hh << 8) | ((ll + 1) & 0xFF))
+    return (target_hh << 8) | target_ll
+
+
+def _ind_x(cpu):
+    pc = cpu.PC
+    cpu.PC = (pc + 1) & 0xFFFF
+    zp = cpu.read(pc) + cpu.X
+    ll = cpu.read(zp & 0xFF)
+    hh = cpu.read((zp + 1) & 0xFF)
+    return (hh << 8) | ll
+
+
+def _ind_y(cpu):
+    pc = cpu.PC
+    cpu.PC = (pc + 1) & 0xFFFF
+    zp = cpu.read(pc)
+    ll = cpu.read(zp)
+    hh = cpu.read((zp + 1) & 0xFF)
+    return (((hh << 8) | ll) + cpu.Y) & 0xFFFF
+
+
+def _ind_y_read(cpu):
+    pc = cpu.PC
+    cpu.PC = (pc + 1) & 0xFFFF
+    zp = cpu.read(pc)
+    ll = cpu.read(zp)
+    hh = cpu.read((zp + 1) & 0xFF)
+    addr = (((hh << 8) | ll) + cpu.Y) & 0xFFFF
+    if addr >> 8 != hh:
+        cpu.cycles += 1
+    return addr
+
+
+modes = {
+    m.IMPL: None,
+    m.A: None,
+    m.IMM: _imm,
+    m.REL: _imm,
+    m.ZPG: _zpg,
+    m.ZPG_X: _zpg_x,
+    m.ZPG_Y: _zpg_y,
+    m.ABS: _abs,
+    m.ABS_X: _abs_x,
+    m.ABS_Y: _abs_y,
+    m.IND: _ind,
+    m.IND_X: _ind_x,
+    m.IND_Y: _ind_y,
+}
+
+# Resolvers for read instructions, which pay a cycle when crossing a page
+read_modes = {
+    m.ABS_X: _abs_x_read,
+    m.ABS_Y: _abs_y_read,
+    m.IND_Y: _ind_y_read,
+}
+
+
+# Instruction semantics. Each factory takes the resolver of the addressing
+# mode (None for implied and accumulator modes) and returns the handler.
+
+
+def _load(register):
+    def factory(addr):
+        def load(cpu):
+            value = cpu.read(addr(cpu))
+            setattr(cpu, register, value)
+            cpu.z = 0 if value else 1
+            cpu.n = value >> 7
+
+        return load
+
+    return factory
+
+
+def _lda(addr):
+    def lda(cpu):
+        cpu.A = value = cpu.read(addr(cpu))
+        cpu.z = 0 if value else 1
+        cpu.n = value >> 7
+
+    return lda
+
+
+def _store(register):
+    def factory(addr):
+        def store(cpu):
+            cpu.write(addr(cpu), getattr(cpu, register))
+
+        return store
+
+    return factory
+
+
+def _sta(addr):
+    def sta(cpu):
+        cpu.write(addr(cpu), cpu.A)
+
+    return sta
+
+
+def _transfer(source, target, flags=True):
+    def factory(addr):
+        if flags:
+
+            def transfer(cpu):
+                value = getattr(cpu, source)
+                setattr(cpu, target, value)
+                cpu.z = 0 if value else 1
+                cpu.n = value >> 7
+
+        else:
+
+            def transfer(cpu):
+                setattr(cpu, target, getattr(cpu, source))
+
+        return transfer
+
+    return factory
+
+
+def _flag(name, value):
+    def factory(addr):
+        def flag(cpu):
+            setattr(cpu, name, value)
+
+        return flag
+
+    return factory
+
+
+def _nop(addr):
+    def nop(cpu):
+        pass
+
+    return nop
+
+
+def _step_register(register, delta):
+    def factory(addr):
+        def step(cpu):
+            value = (getattr(cpu, register) + delta) & 0xFF
+            setattr(cpu, register, value)
+            cpu.z = 0 if value else 1
+            cpu.n = value >> 7
+
+        return step
+
+    return factory
+
+
+def _step_memory(delta):
+    def factory(addr):
+        def step(cpu):
+            dst = addr(cpu)
+            value = (cpu.read(dst) + delta) & 0xFF
+            cpu.z = 0 if value else 1
+            cpu.n = value >> 7
+            cpu.write(dst, value)
+
+        return step
+
+    return factory
+
+
+def _compare(register):
+    def factory(addr):
+        def compare(cpu):
+            value = cpu.read(addr(cpu))
+            reg = getattr(cpu, register)
+            result = (reg - value) & 0xFF
+            cpu.c = 1 if reg >= value else 0
+            cpu.z = 0 if result else 1
+            cpu.n = result >> 7
+
+        return compare
+
+    return factory
+
+
+def _jmp(addr):
+    def jmp(cpu):
+        cpu.PC = addr(cpu)
+
+    return jmp
+
+
+def _branch(flag, taken):
+    def factory(addr):
+        def branch(cpu):
+            pc = cpu.PC
+            offset = cpu.read(pc)
+            pc = (pc + 1) & 0xFFFF
+            if getattr(cpu, flag) == taken:
+                target = (pc + ((offset ^ 0x80) - 0x80)) & 0xFFFF
+                cpu.cycles += 2 if (pc ^ target) & 0xFF00 else 1
+                pc = target
+            cpu.PC = pc
+
+        return branch
+
+    return factory
+
+
+def _logic(operation):
+    def factory(addr):
+        def logic(cpu):
+            cpu.A = value = operation(cpu.A, cpu.read(addr(cpu)))
+            cpu.z = 0 if value else 1
+            cpu.n = value >> 7
+
+        return logic
+
+    return factory
+
+
+def _pha(addr):
+    def pha(cpu):
+        cpu.stack_push(cpu.A)
+
+    return pha
+
+
+def _pla(addr):
+    def pla(cpu):
+        cpu.A = value = cpu.stack_pop()
+        cpu.z = 0 if value else 1
+        cpu.n = value >> 7
+
+    return pla
+
+
+def _php(addr):
+    def php(cpu):
+        cpu.stack_push(cpu.P | 0x18)
+
+    return php
+
+
+def _plp(addr):
+    def plp(cpu):
+        cpu.P = cpu.stack_pop() & 0xE7
+
+    return plp
+
+
+def _jsr(addr):
+    def jsr(cpu):
+        ret = (cpu.PC + 2) & 0xFFFF
+        cpu.stack_push(ret >> 8)
+        cpu.stack_push(ret & 0xFF)
+        cpu.PC = addr(cpu)
+
+    return jsr
+
+
+def _rts(addr):
+    def rts(cpu):
+        ll = cpu.stack_pop()
+        hh = cpu.stack_pop()
+        cpu.PC = (hh << 8) | ll
+
+    return rts
+
+
+def _bit(addr):
+    def bit(cpu):
+        value = cpu.read(addr(cpu))
+        cpu.n = value >> 7
+        cpu.v = (value >> 6) & 0x01
+        cpu.z = 0 if value & cpu.A else 1
+
+    return bit
+
+
+def _shift(operation):
+    # operation(value, carry) -> (result, carry)
+    def factory(addr):
+        if addr is None:
+
+            def shift(cpu):
+                value, cpu.c = operation(cpu.A, cpu.c)
+                cpu.A = value
+                cpu.z = 0 if value else 1
+                cpu.n = value >> 7
+
+        else:
+
+            def shift(cpu):
+                dst = addr(cpu)
+                value, cpu.c = operation(cpu.read(dst), cpu.c)
+                cpu.z = 0 if value else 1
+                cpu.n = value >> 7
+                cpu.write(dst, value)
+
+        return shift
+
+    return factory
+
+
+def _asl(value, carry):
+    return (value << 1) & 0xFF, value >> 7
+
+
+def _lsr(value, carry):
+    return value >> 1, value & 0x01
+
+
+def _rol(value, carry):
+    return ((value << 1) & 0xFF) | (carry & 0x01), value >> 7
+
+
+def _ror(value, carry):
+    return ((carry & 0x01) << 7) | (value >> 1), value & 0x01
+
+
+def _adc(addr):
+    def adc(cpu):
+        M = cpu.read(addr(cpu))
+        A = cpu.A
+        if cpu.d:
+            result = (A & 0x0F) + (M & 0x0F) + cpu.c
+            if result > 0x09:
+                result += 0x06
+            result = result + (A & 0xF0) + (M & 0xF0)
+            if result > 0x99:
+                result += 0x60
+        else:
+            result = A + M + cpu.c
+        # A and M have the same sign AND the result sign is different
+        cpu.v = 1 if ~(A ^ M) & (A ^ result) & 0x80 else 0
+        cpu.c = 1 if result > 0xFF else 0
+        cpu.A = value = result & 0xFF
+        cpu.z = 0 if value else 1
+        cpu.n = value >> 7
+
+    return adc
+
+
+def _sbc(addr):
+    def sbc(cpu):
+        M = cpu.read(addr(cpu))
+        A = cpu.A
+        if cpu.d:
+            borrow = 1 - cpu.c
+            result_l = (A & 0x0F) - (M & 0x0F) - borrow
+            if result_l < 0:
+                result_l = (result_l - 0x06) & 0x0F
+                borrow = 0x10
+            else:
+                borrow = 0
+            result_h = (A & 0xF0) - (M & 0xF0) - borrow
+            if result_h < 0:
+                result_h = (result_h - 0x60) & 0xF0
+                cpu.c = 0
+            else:
+                cpu.c = 1
+            result = (result_h | result_l) & 0xFF
+        else:
+            result = A + ~M + cpu.c
+            cpu.c = 1 if result >= 0 else 0
+        # A and M have different sign AND the result sign is different
+        cpu.v = 1 if (A ^ M) & (A ^ result) & 0x80 else 0
+        cpu.A = value = result & 0xFF
+        cpu.z = 0 if value else 1
+        cpu.n = value >> 7
+
+    return sbc
+
+
+def _brk(addr):
+    def brk(cpu):
+        # PC already incremented once, store "PC + 2"
+        ret = (cpu.PC + 1) & 0xFFFF
+        cpu.stack_push(ret >> 8)
+        cpu.stack_push(ret & 0xFF)
+        cpu.stack_push(cpu.P | 0x18)
+        # Jump to IRQ vector
+        cpu.PC = (cpu.read(0xFFFF) << 8) | cpu.read(0xFFFE)
+
+    return brk
+
+
+def _rti(addr):
+    def rti(cpu):
+        cpu.P = cpu.stack_pop() & 0xE7
+        ll = cpu.stack_pop()
+        hh = cpu.stack_pop()
+        cpu.PC = (hh << 8) | ll
+
+    return rti
+
+
+operations = {
+    i.LDA: _lda,
+    i.LDX: _load("X"),
+    i.LDY: _load("Y"),
+    i.STA: _sta,
+    i.STX: _store("X"),
+    i.STY: _store("Y"),
+    i.TAX: _transfer("A", "X"),
+    i.TAY: _transfer("A", "Y"),
+    i.TSX: _transfer("S", "X"),
+    i.TXA: _transfer("X", "A"),
+    i.TXS: _transfer("X", "S", flags=False),
+    i.TYA: _transfer("Y", "A"),
+    i.NOP: _nop,
+    i.CLC: _flag("c", 0),
+    i.CLD: _flag("d", 0),
+    i.CLI: _flag("i", 0),
+    i.CLV: _flag("v", 0),
+    i.SEC: _flag("c", 1),
+    i.SED: _flag("d", 1),
+    i.SEI: _flag("i", 1),
+    i.INX: _step_register("X", 1),
+    i.INY: _step_register("Y", 1),
+    i.DEX: _step_register("X", -1),
+    i.DEY: _step_register("Y", -1),
+    i.DEC: _step_memory(-1),
+    i.INC: _step_memory(1),
+    i.CMP: _compare("A"),
+    i.CPX: _compare("X"),
+    i.CPY: _compare("Y"),
+    i.JMP: _jmp,
+    i.BEQ: _branch("z", 1),
+    i.BNE: _branch("z", 0),
+    i.BMI: _branch("n", 1),
+    i.BPL: _branch("n", 0),
+    i.BCS: _branch("c", 1),
+    i.BCC: _branch("c", 0),
+    i.BVC: _branch("v", 0),
+    i.BVS: _branch("v", 1),
+    i.AND: _logic(lambda a, b: a & b),
+    i.ORA: _logic(lambda a, b: a | b),
+    i.EOR: _logic(lambda a, b: a ^ b),
+    i.PHA: _pha,
+    i.PLA: _pla,
+    i.PHP: _php,
+    i.PLP: _plp,
+    i.JSR: _jsr,
+    i.RTS: _rts,
+    i.BIT: _bit,
+    i.ASL: _shift(_asl),
+    i.LSR: _shift(_lsr),
+    i.ROL: _shift(_rol),
+    i.ROR: _shift(_ror),
+    i.ADC: _adc,
+    i.SBC: _sbc,
+    i.BRK: _brk,
+    i.RTI: _rti,
+}
+
+
+def _unknown(opcode):
+    def unknown(cpu):
+        raise NotImplementedError(f"Unknown instruction {opcode:#04x}")
+
+    return unknown
+
+
+def build_dispatch_table() -> List[Handler]:
+    table: List[Handler] = []
+    for opcode, entry in enumerate(opcodes):
+        if entry is None:
+            table.append(_unknown(opcode))
+        elif entry.page_penalty:
+            table.append(operations[entry.instruction](read_modes[entry.mode]))
+        else:
+            table.append(operations[entry.instruction](modes[entry.mode]))
+    return table
+
+
+dispatch_table = build_dispatch_table()
@@ -0,0 +1,95 @@
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from src.model import CPU, Bus, RAM
+
+# Run many independent machines across a process pool. The shared ROM is
+# handed to each worker once by the pool initializer, jobs only carry their
+# own image.
+
+
+class Job(NamedTuple):
+    name: str
+    image: bytes
+    load: int = 0
+    entry: Optional[int] = None  # defaults to the load address
+    pc: Optional[int] = None  # stop when PC reaches this address
+    cycles: Optional[int] = None  # cycle budget
+    instructions: Optional[int] = None  # instruction budget
+
+
+class JobResult(NamedTuple):
+    name: str
+    reason: Optional[str]  # StopReason name, None on error
+    instructions: Optional[int]  # None on error, run_until() loses its count
+    cycles: Optional[int]  # None on error too, to match
+    registers: Tuple[int, int, int, int, int, int]  # A, X, Y, S, P, PC
+    digest: str  # SHA-256 of the final 64K memory
+    wall_time: float
+    error: Optional[str] = None
+
+
+_rom: Optional[bytes] = None
+_rom_address = 0
+
+
+def _init_worker(rom, rom_address):
+    global _rom, _rom_address
+    _rom = rom
+    _rom_address = rom_address
+
+
+def run_job(job: Job, rom: Optional[bytes] = None, rom_address=0) -> JobResult:
+    ram = bytearray(0x10000)
+    ram[job.load : job.load + len(job.image)] = job.image
+    bus = Bus(RAM(ram))
+    if rom:
+        bus.map_rom(rom_address, rom)
+    cpu = CPU(bus)
+    cpu.PC = job.load if job.entry is None else job.entry
+
+    start = time.perf_counter()
+    reason = error = instructions = cycles = None
+    try:
+        result = cpu.run_until(
+            pc=job.pc, cycles=job.cycles, instructions=job.instructions
+        )
+        reason = result.reason.name
+        instructions = result.instructions
+        cycles = result.cycles
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall_time = time.perf_counter() - start
+
+    return JobResult(
+        job.name,
+        reason,
+        instructions,
+        cycles,
+        (cpu.A, cpu.X, cpu.Y, cpu.S, cpu.P, cpu.PC),
+        hashlib.sha256(ram).hexdigest(),
+        wall_time,
+        error,
+    )
+
+
+def _run(job):
+    return run_job(job, _rom, _rom_address)
+
+
+def run_fleet(
+    jobs: Iterable[Job], rom: Optional[bytes] = None, rom_address=0, workers=None
+) -> Iterator[JobResult]:
+    # Results are yielded in completion order
+    jobs = list(jobs)
+    for job in jobs:
+        if job.pc is None and job.cycles is None and job.instructions is None:
+            raise ValueError(f"Job {job.name} has no stop condition or budget")
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(rom, rom_address)
+    ) as executor:
+        futures = [executor.submit(_run, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
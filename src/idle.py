@@ -0,0 +1,46 @@
+from typing import Optional
+
+from src.instructions import i, m, opcodes
+from src.model import ROM, Device, MemoryDevice
+
+# Detection of guest code that waits for a device: a load of a device register
+# followed by a branch back to the load, such as LDA $D011 / BPL in the Woz
+# Monitor. Nothing but the device can end such a loop, so the host can sleep
+# on the device's input source instead of running it.
+
+loads = {i.LDA, i.LDX, i.LDY, i.BIT}
+
+
+def _load(bus, address):
+    # The device register read by the instruction at address, if it is an
+    # absolute load from a device page
+    entry = opcodes[bus.ram[address]]
+    if entry is None or entry.instruction not in loads or entry.mode != m.ABS:
+        return None
+    register = bus.ram[(address + 1) & 0xFFFF] | bus.ram[(address + 2) & 0xFFFF] << 8
+    device = bus.read_pages[register >> 8]
+    if not isinstance(device, Device) or isinstance(device, (ROM, MemoryDevice)):
+        return None
+    return register
+
+
+def _branch_target(bus, address):
+    entry = opcodes[bus.ram[address]]
+    if entry is None or entry.mode != m.REL:
+        return None
+    offset = bus.ram[(address + 1) & 0xFFFF]
+    return (address + 2 + ((offset ^ 0x80) - 0x80)) & 0xFFFF
+
+
+def polled_register(cpu) -> Optional[int]:
+    # The device register the CPU is polling in a two instruction loop, with
+    # the PC on either instruction. None when it is doing anything else.
+    bus = cpu.bus
+    pc = cpu.PC
+    register = _load(bus, pc)
+    if register is not None and _branch_target(bus, (pc + 3) & 0xFFFF) == pc:
+        return register
+    start = _branch_target(bus, pc)
+    if start is not None and (start + 3) & 0xFFFF == pc:
+        return _load(bus, start)
+    return None
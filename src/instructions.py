@@ -1,4 +1,4 @@
-from typing import List, Tuple, Optional
+from typing import Dict, List, NamedTuple, Set, Tuple, Optional
 from enum import Enum
 
 
@@ -89,9 +89,9 @@ standard: List[List[Optional[Tuple[Instruction, AddressingMode]]]] = [
         [(i.BPL, m.REL), (i.ORA, m.IND_Y), None, None, None, (i.ORA, m.ZPG_X), (i.ASL, m.ZPG_X), None, (i.CLC, m.IMPL), (i.ORA,m.ABS_Y), None, None, None, (i.ORA,m.ABS_X), (i.ASL, m.ABS_X), None], # 1
         [(i.JSR, m.ABS), (i.AND, m.IND_X), None, None, (i.BIT, m.ZPG), (i.AND, m.ZPG), (i.ROL, m.ZPG), None, (i.PLP, m.IMPL), (i.AND, m.IMM), (i.ROL, m.A), None, (i.BIT, m.ABS), (i.AND, m.ABS), (i.ROL, m.ABS), None], # 2
         [(i.BMI, m.REL), (i.AND, m.IND_Y), None, None, None, (i.AND, m.ZPG_X), (i.ROL, m.ZPG_X), None, (i.SEC, m.IMPL), (i.AND, m.ABS_Y), None, None, None, (i.AND, m.ABS_X), (i.ROL, m.ABS_X), None], # 3
-        [(i.RTI, m.IMPL), (i.EOR, m.IND_X), None, None, (i.EOR, m.ZPG), None, (i.LSR, m.ZPG), None, (i.PHA, m.IMPL), (i.EOR, m.IMM), (i.LSR, m.A), None, (i.JMP, m.ABS), (i.EOR, m.ABS), (i.LSR, m.ABS), None], # 4
+        [(i.RTI, m.IMPL), (i.EOR, m.IND_X), None, None, None, (i.EOR, m.ZPG), (i.LSR, m.ZPG), None, (i.PHA, m.IMPL), (i.EOR, m.IMM), (i.LSR, m.A), None, (i.JMP, m.ABS), (i.EOR, m.ABS), (i.LSR, m.ABS), None], # 4
         [(i.BVC, m.REL), (i.EOR, m.IND_Y), None, None, None, (i.EOR, m.ZPG_X), (i.LSR, m.ZPG_X), None, (i.CLI, m.IMPL), (i.EOR, m.ABS_Y), None, None, None, (i.EOR, m.ABS_X), (i.LSR, m.ABS_X), None], # 5
-        [(i.RTS, m.ABS), (i.ADC, m.IND_X), None, None, None, (i.ADC, m.ZPG), (i.ROR, m.ZPG), None, (i.PLA, m.IMPL), (i.ADC, m.IMM), (i.ROR, m.A), None, (i.JMP, m.IND), (i.ADC, m.ABS), (i.ROR, m.ABS), None], # 6
+        [(i.RTS, m.IMPL), (i.ADC, m.IND_X), None, None, None, (i.ADC, m.ZPG), (i.ROR, m.ZPG), None, (i.PLA, m.IMPL), (i.ADC, m.IMM), (i.ROR, m.A), None, (i.JMP, m.IND), (i.ADC, m.ABS), (i.ROR, m.ABS), None], # 6
         [(i.BVS, m.REL), (i.ADC, m.IND_Y), None, None, None, (i.ADC, m.ZPG_X), (i.ROR, m.ZPG_X), None, (i.SEI, m.IMPL), (i.ADC, m.ABS_Y), None, None, None, (i.ADC, m.ABS_X), (i.ROR, m.ABS_X), None], # 7
         [None, (i.STA, m.IND_X), None, None, (i.STY, m.ZPG), (i.STA, m.ZPG), (i.STX, m.ZPG), None, (i.DEY, m.IMPL), None, (i.TXA, m.IMPL), None, (i.STY, m.ABS), (i.STA, m.ABS), (i.STX, m.ABS), None], # 8
         [(i.BCC, m.REL), (i.STA, m.IND_Y), None, None, (i.STY, m.ZPG_X), (i.STA, m.ZPG_X), (i.STX, m.ZPG_Y), None, (i.TYA, m.IMPL), (i.STA, m.ABS_Y), (i.TXS, m.IMPL), None, None, (i.STA, m.ABS_X), None, None ], # 9
@@ -104,11 +104,157 @@ standard: List[List[Optional[Tuple[Instruction, AddressingMode]]]] = [
     ]
 # fmt: on
 
+# Base cycle counts of the standard set, 0 for unimplemented opcodes
+# fmt: off
+timing: List[List[int]] = [
+        #0  1   2   3   4   5   6   7   8   9   A   B   C   D   E   F
+        [ 7,  6,  0,  0,  0,  3,  5,  0,  3,  2,  2,  0,  0,  4,  6,  0], # 0
+        [ 2,  5,  0,  0,  0,  4,  6,  0,  2,  4,  0,  0,  0,  4,  7,  0], # 1
+        [ 6,  6,  0,  0,  3,  3,  5,  0,  4,  2,  2,  0,  4,  4,  6,  0], # 2
+        [ 2,  5,  0,  0,  0,  4,  6,  0,  2,  4,  0,  0,  0,  4,  7,  0], # 3
+        [ 6,  6,  0,  0,  0,  3,  5,  0,  3,  2,  2,  0,  3,  4,  6,  0], # 4
+        [ 2,  5,  0,  0,  0,  4,  6,  0,  2,  4,  0,  0,  0,  4,  7,  0], # 5
+        [ 6,  6,  0,  0,  0,  3,  5,  0,  4,  2,  2,  0,  5,  4,  6,  0], # 6
+        [ 2,  5,  0,  0,  0,  4,  6,  0,  2,  4,  0,  0,  0,  4,  7,  0], # 7
+        [ 0,  6,  0,  0,  3,  3,  3,  0,  2,  0,  2,  0,  4,  4,  4,  0], # 8
+        [ 2,  6,  0,  0,  4,  4,  4,  0,  2,  5,  2,  0,  0,  5,  0,  0], # 9
+        [ 2,  6,  2,  0,  3,  3,  3,  0,  2,  2,  2,  0,  4,  4,  4,  0], # A
+        [ 2,  5,  0,  0,  4,  4,  4,  0,  2,  4,  2,  0,  4,  4,  4,  0], # B
+        [ 2,  6,  0,  0,  3,  3,  5,  0,  2,  2,  2,  0,  4,  4,  6,  0], # C
+        [ 2,  5,  0,  0,  0,  4,  6,  0,  2,  4,  0,  0,  0,  4,  7,  0], # D
+        [ 2,  6,  0,  0,  3,  3,  5,  0,  2,  2,  2,  0,  4,  4,  6,  0], # E
+        [ 2,  5,  0,  0,  0,  4,  6,  0,  2,  4,  0,  0,  0,  4,  7,  0], # F
+    ]
+# fmt: on
+
+
+class Access(Enum):
+    NONE = "none"
+    READ = "read"
+    WRITE = "write"
+    RMW = "rmw"
+
+
+# Instruction length in bytes, opcode included
+length: Dict[AddressingMode, int] = {
+    m.IMPL: 1,
+    m.A: 1,
+    m.IMM: 2,
+    m.REL: 2,
+    m.ZPG: 2,
+    m.ZPG_X: 2,
+    m.ZPG_Y: 2,
+    m.ABS: 3,
+    m.ABS_X: 3,
+    m.ABS_Y: 3,
+    m.IND: 3,
+    m.IND_X: 2,
+    m.IND_Y: 2,
+}
+
+reads: Set[Instruction] = {
+    i.LDA, i.LDX, i.LDY, i.CMP, i.CPX, i.CPY, i.AND, i.ORA, i.EOR, i.BIT, i.ADC, i.SBC,
+}
+writes: Set[Instruction] = {i.STA, i.STX, i.STY}
+read_modify_writes: Set[Instruction] = {i.ASL, i.LSR, i.ROL, i.ROR, i.INC, i.DEC}
+
+# Read instructions take one extra cycle when an indexed address crosses a page.
+# Branches take one extra cycle when taken and another one when the target is
+# on a different page than the next instruction.
+page_crossing_modes: Set[AddressingMode] = {m.ABS_X, m.ABS_Y, m.IND_Y}
+
+# Status flags changed by each instruction
+flags: Dict[Instruction, str] = {
+    i.ADC: "NVZC", i.SBC: "NVZC",
+    i.AND: "NZ", i.ORA: "NZ", i.EOR: "NZ",
+    i.ASL: "NZC", i.LSR: "NZC", i.ROL: "NZC", i.ROR: "NZC",
+    i.BIT: "NVZ",
+    i.CMP: "NZC", i.CPX: "NZC", i.CPY: "NZC",
+    i.DEC: "NZ", i.DEX: "NZ", i.DEY: "NZ", i.INC: "NZ", i.INX: "NZ", i.INY: "NZ",
+    i.LDA: "NZ", i.LDX: "NZ", i.LDY: "NZ",
+    i.TAX: "NZ", i.TAY: "NZ", i.TSX: "NZ", i.TXA: "NZ", i.TYA: "NZ",
+    i.PLA: "NZ", i.PLP: "NVDIZC", i.RTI: "NVDIZC",
+    i.CLC: "C", i.SEC: "C", i.CLD: "D", i.SED: "D", i.CLI: "I", i.SEI: "I", i.CLV: "V",
+}
+
+
+class Opcode(NamedTuple):
+    opcode: int
+    instruction: Instruction
+    mode: AddressingMode
+    length: int
+    cycles: int
+    page_penalty: int
+    access: Access
+    flags: str
+
+
+def _compile(opcode: int) -> Optional[Opcode]:
+    entry = standard[opcode >> 4][opcode & 0xF]
+    if entry is None:
+        return None
+    instruction, mode = entry
+    if instruction in reads and mode not in (m.IMM, m.REL):
+        access = Access.READ
+    elif instruction in writes:
+        access = Access.WRITE
+    elif instruction in read_modify_writes and mode != m.A:
+        access = Access.RMW
+    else:
+        access = Access.NONE
+    return Opcode(
+        opcode,
+        instruction,
+        mode,
+        length[mode],
+        timing[opcode >> 4][opcode & 0xF],
+        1 if access == Access.READ and mode in page_crossing_modes else 0,
+        access,
+        flags.get(instruction, ""),
+    )
+
+
+# Pre-decoded standard set, indexed by opcode. None for unimplemented opcodes.
+opcodes: List[Optional[Opcode]] = [_compile(op) for op in range(256)]
+
+cycles_standard: List[int] = [entry.cycles if entry else 0 for entry in opcodes]
+
 
 def decode_standard(instruction) -> Optional[Tuple[Instruction, AddressingMode]]:
-    try:
-        i, m = standard[instruction >> 4][instruction & 0xF]
-        # print(f"{instruction:#04x} {i.value} {m.value}")
-        return i, m
-    except TypeError:
+    entry = opcodes[instruction]
+    if entry is None:
         raise NotImplementedError(f"Unknown instruction {instruction:#04x}")
+    return entry.instruction, entry.mode
+
+
+# Assembler syntax of the operand for each addressing mode
+operand_formats: Dict[AddressingMode, str] = {
+    m.IMPL: "",
+    m.A: "A",
+    m.IMM: "#${:02X}",
+    m.ZPG: "${:02X}",
+    m.ZPG_X: "${:02X},X",
+    m.ZPG_Y: "${:02X},Y",
+    m.ABS: "${:04X}",
+    m.ABS_X: "${:04X},X",
+    m.ABS_Y: "${:04X},Y",
+    m.IND: "(${:04X})",
+    m.IND_X: "(${:02X},X)",
+    m.IND_Y: "(${:02X}),Y",
+    m.REL: "${:04X}",
+}
+
+
+def format_instruction(entry: Opcode, operand: bytes, address: int) -> str:
+    # operand holds the bytes after the opcode, address is that of the opcode.
+    # Relative branches are shown with their target address.
+    if entry.mode == m.REL:
+        value = (address + 2 + ((operand[0] ^ 0x80) - 0x80)) & 0xFFFF
+    elif entry.length == 3:
+        value = operand[0] | operand[1] << 8
+    elif entry.length == 2:
+        value = operand[0]
+    else:
+        value = 0
+    text = operand_formats[entry.mode].format(value)
+    return f"{entry.instruction.value} {text}" if text else entry.instruction.value
@@ -0,0 +1,62 @@
+import os
+from typing import List, NamedTuple, Optional, Tuple
+
+# Load raw binary images straight into machine memory. Segments are read with
+# readinto() into a view of the pre-allocated RAM, so no intermediate bytes
+# objects are created.
+
+MEMORY_SIZE = 0x10000
+
+
+class Segment(NamedTuple):
+    address: int  # load address in memory
+    offset: int = 0  # start in the file
+    size: Optional[int] = None  # None reads to the end of the file
+
+
+def parse_segment(text) -> Segment:
+    # "ADDR[:OFFSET[:SIZE]]" in hex, e.g. "0200" or "ff00:100:100"
+    fields = [int(field, 16) for field in text.split(":")]
+    if not 1 <= len(fields) <= 3:
+        raise ValueError(f"Invalid segment {text}")
+    return Segment(*fields)
+
+
+def load_segments(path, ram, segments) -> List[Tuple[int, int]]:
+    # Returns the (start, end) address range filled by each segment
+    view = memoryview(ram)
+    ranges = []
+    with open(path, "rb", buffering=0) as f:
+        file_size = os.fstat(f.fileno()).st_size
+        for segment in segments:
+            size = segment.size
+            if size is None:
+                size = max(file_size - segment.offset, 0)
+            end = segment.address + size
+            if end > len(ram):
+                raise ValueError(
+                    f"Segment at {segment.address:#06x} of {size} bytes does not fit in memory"
+                )
+            f.seek(segment.offset)
+            count = f.readinto(view[segment.address : end])
+            ranges.append((segment.address, segment.address + count))
+    return ranges
+
+
+def load_image(path, address=0, segments=None):
+    # Fresh 64K memory with the image loaded, whole file at address unless
+    # segments are given
+    ram = bytearray(MEMORY_SIZE)
+    ranges = load_segments(path, ram, segments or [Segment(address)])
+    return ram, ranges
+
+
+def program_range(ranges, entry) -> Tuple[int, int]:
+    # The loaded range that holds the entry point, the first one otherwise
+    return next(((start, end) for start, end in ranges if start <= entry < end), ranges[0])
+
+
+def leaves(start, end):
+    # Stop condition for run_until(): the program has jumped, branched or run
+    # off the end of its range
+    return lambda cpu: not start <= cpu.PC < end
@@ -1,4 +1,19 @@
-from src.instructions import decode_standard, i, m
+import struct
+import sys
+import zlib
+from array import array
+from enum import Enum
+from typing import NamedTuple, Optional
+
+from src.dispatch import dispatch_table
+from src.instructions import (
+    cycles_standard,
+    decode_standard,
+    format_instruction,
+    i,
+    m,
+    opcodes,
+)
 
 
 def uint8(value: int) -> int:
@@ -41,42 +56,343 @@ class Memory:
 
         for index in range(start, end, 16):
             print(
-                f"{index:04x}\t{' '.join(f'{x:02x}' for x in self.data[index : index + 16])}"
+                f"{index:04x}\t{' '.join(f'{x:02x}' for x in self.data[index : min(index + 16, end)])}"
             )
 
 
+class RAM(Memory):
+    # Quiet memory backend, reads and writes go straight to the bytearray
+    def __init__(self, data: bytearray):
+        super().__init__(data if isinstance(data, bytearray) else bytearray(data))
+
+    def __setitem__(self, address, value):
+        self.data[address] = value
+
+    def __getitem__(self, address):
+        return self.data[address]
+
+
+class TracedRAM(RAM):
+    # RAM that reports every access to a trace sink: sink(kind, address, value)
+    def __init__(self, data: bytearray, sink):
+        super().__init__(data)
+        self.sink = sink
+
+    def __setitem__(self, address, value):
+        self.data[address] = value
+        self.sink("W", address, value)
+
+    def __getitem__(self, address):
+        value = self.data[address]
+        self.sink("R", address, value)
+        return value
+
+
+class ListTrace:
+    # Collects accesses in memory as (kind, address, value) tuples
+    def __init__(self):
+        self.entries = []
+
+    def __call__(self, kind, address, value):
+        self.entries.append((kind, address, value))
+
+    def clear(self):
+        self.entries.clear()
+
+
+class FileTrace:
+    # Writes accesses to a text file in the same format as Memory prints them
+    def __init__(self, file, buffer_size=4096):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.lines = []
+
+    def __call__(self, kind, address, value):
+        self.lines.append(f"{kind} {address:#06x}: {value:x}\n")
+        if len(self.lines) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.writelines(self.lines)
+        self.lines.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class FlightRecorder:
+    # Ring buffer of the last size instructions: the PC and the registers
+    # packed as A | X << 8 | Y << 16 | S << 24 | P << 32, both taken before the
+    # instruction runs. The CPU dumps it when an exception escapes a run.
+    def __init__(self, size=256, file=None):
+        self.size = size
+        self.pcs = array("H", bytes(2 * size))
+        self.registers = array("Q", bytes(8 * size))
+        self.index = 0  # next slot to write
+        self.count = 0  # instructions recorded in total
+        self.file = file
+
+    def record(self, cpu):
+        index = self.index
+        self.pcs[index] = cpu.PC
+        self.registers[index] = (
+            cpu.A | cpu.X << 8 | cpu.Y << 16 | cpu.S << 24 | cpu.P << 32
+        )
+        index += 1
+        self.index = 0 if index == self.size else index
+        self.count += 1
+
+    def entries(self):
+        # (pc, A, X, Y, S, P) tuples, oldest first
+        size = self.size
+        count = min(self.count, size)
+        start = (self.index - count) % size
+        result = []
+        for n in range(count):
+            index = (start + n) % size
+            packed = self.registers[index]
+            result.append(
+                (
+                    self.pcs[index],
+                    packed & 0xFF,
+                    packed >> 8 & 0xFF,
+                    packed >> 16 & 0xFF,
+                    packed >> 24 & 0xFF,
+                    packed >> 32 & 0xFF,
+                )
+            )
+        return result
+
+    def format(self, ram):
+        # Disassembled from the current memory, code changed since it ran
+        # shows up in its new form. Addresses past the end of memory show as
+        # unknown bytes, the recorder dumps after exactly that kind of crash.
+        size = len(ram)
+        lines = []
+        for pc, a, x, y, s, p in self.entries():
+            entry = opcodes[ram[pc]] if pc < size else None
+            if entry is None:
+                code = f"{ram[pc]:02X}" if pc < size else "??"
+                text = "???"
+            else:
+                addresses = [(pc + n) & 0xFFFF for n in range(1, entry.length)]
+                if all(address < size for address in addresses):
+                    operand = bytes(ram[address] for address in addresses)
+                    code = " ".join(f"{b:02X}" for b in bytes([ram[pc]]) + operand)
+                    text = format_instruction(entry, operand, pc)
+                else:
+                    code = f"{ram[pc]:02X}"
+                    text = "???"
+            lines.append(
+                f"{pc:04X}  {code:<8}  {text:<14}"
+                f"A:{a:02X} X:{x:02X} Y:{y:02X} S:{s:02X} P:{p:02X}\n"
+            )
+        return "".join(lines)
+
+    def dump(self, cpu):
+        file = self.file or sys.stderr
+        file.write(f"Last {min(self.count, self.size)} of {self.count} instructions:\n")
+        file.write(self.format(cpu.bus.ram))
+        file.flush()
+
+
+# Interrupts. CPU.pending holds the IRQ lines held low by devices in its low
+# bits and a latched NMI above them, so the execution loops only test one int
+# between instructions.
+NMI = 0x100
+IRQ_LINES = 0xFF
+NMI_VECTOR = 0xFFFA
+IRQ_VECTOR = 0xFFFE
+INTERRUPT_CYCLES = 7
+
+# Snapshot layout: A, X, Y, S, P, PC, cycles, followed by the memory image
+SNAPSHOT_REGISTERS = struct.Struct("<BBBBBHQ")
+SNAPSHOT_MAGIC = b"6502SNAP"
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path, snapshot: bytes):
+    with open(path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(bytes([SNAPSHOT_VERSION]))
+        f.write(zlib.compress(snapshot))
+
+
+def load_snapshot(path) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a snapshot file")
+    version = data[len(SNAPSHOT_MAGIC)]
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    return zlib.decompress(data[len(SNAPSHOT_MAGIC) + 1 :])
+
+
+class StopReason(Enum):
+    PC = "pc"
+    CYCLES = "cycles"
+    INSTRUCTIONS = "instructions"
+    PREDICATE = "predicate"
+    EVENT = "event"  # a scheduled event stopped the run
+    BREAKPOINT = "breakpoint"
+    WATCHPOINT = "watchpoint"
+
+
+class Access(Enum):
+    EXECUTE = "execute"
+    READ = "read"
+    WRITE = "write"
+
+
+class Hit(NamedTuple):
+    # The breakpoint or watchpoint that stopped a run
+    access: Access
+    address: int
+    value: Optional[int]  # the byte read or written
+    pc: int  # the instruction that made the access
+
+
+class RunResult(NamedTuple):
+    reason: StopReason
+    instructions: int
+    cycles: int
+    pc: int
+    hit: Optional[Hit] = None
+
+
+class Device:
+    # Memory mapped device. Gets every access to the pages it is mapped to and
+    # falls back to plain RAM for the addresses it does not handle.
+    def __init__(self):
+        self.ram = None
+
+    def attach(self, bus):
+        self.ram = bus.ram
+
+    def read(self, address):
+        return self.ram[address]
+
+    def write(self, address, value):
+        self.ram[address] = value
+
+
+class ROM(Device):
+    # Read-only pages, reads are served from RAM and writes are ignored
+    def write(self, address, value):
+        pass
+
+
+class MemoryDevice(Device):
+    # Adapter for memory backends that need to see every access
+    def __init__(self, memory):
+        super().__init__()
+        self.memory = memory
+
+    def read(self, address):
+        return self.memory[address]
+
+    def write(self, address, value):
+        self.memory[address] = value
+
+
 class Bus:
+    # 256-entry page tables map every page either to RAM (None) or to a device
     def __init__(self, memory):
         self.address = None
         self.data = None
         self.memory = memory
+        self.ram = memory.data
+        # Quiet RAM is accessed directly, other backends see every access
+        default = None if type(memory) is RAM else MemoryDevice(memory)
+        self.read_pages = [default] * 0x100
+        self.write_pages = [default] * 0x100
+
+    def read(self, address):
+        device = self.read_pages[address >> 8]
+        if device is None:
+            return self.ram[address]
+        return device.read(address)
+
+    def write(self, address, value):
+        device = self.write_pages[address >> 8]
+        if device is None:
+            self.ram[address] = value
+        else:
+            device.write(address, value)
+
+    def map_device(self, start, end, device):
+        # Route all pages between start and end (inclusive) to device
+        device.attach(self)
+        for page in range(start >> 8, (end >> 8) + 1):
+            self.read_pages[page] = device
+            self.write_pages[page] = device
+
+    def map_rom(self, start, data):
+        # Load data at start and make its pages read-only
+        end = start + len(data)
+        self.ram[start:end] = data
+        rom = ROM()
+        rom.attach(self)
+        for page in range(start >> 8, ((end - 1) >> 8) + 1):
+            self.write_pages[page] = rom
 
     def memory_read(self):
-        self.data = self.memory[self.address]
+        self.data = self.read(self.address)
         return self.data
 
     def memory_write(self, value):
         self.data = value
-        self.memory[self.address] = self.data
+        self.write(self.address, value)
 
 
 class CPU:
+    # Registers and flags are plain slots holding already masked ints. Flags are
+    # packed into the status register only when P is read.
+    __slots__ = (
+        "A",
+        "X",
+        "Y",
+        "S",
+        "PC",
+        "n",
+        "v",
+        "d",
+        "i",
+        "z",
+        "c",
+        "_flags",
+        "bus",
+        "data",
+        "instruction",
+        "addressing_mode",
+        "cycles",
+        "recorder",
+        "pending",
+    )
+
     def __init__(self, bus=None):
-        self._A = 0x00  # accumulator
-        self._P = 0x00  # status register, 7-bit
-        self._n = 0b0  # negative
-        self._v = 0b0  # overflow
-        self._d = 0b0  # decimal
-        self._i = 0b0  # interrupt disable
-        self._z = 0b0  # zero
-        self._c = 0b0  # carry
-        self._PC = 0x0000  # program counter - 16-bit
-        self._S = 0xFF  # stack pointer
-        self._X = 0x00  # index register X
-        self._Y = 0x00  # index register Y
+        self.A = 0x00  # accumulator
+        self.n = 0b0  # negative
+        self.v = 0b0  # overflow
+        self.d = 0b0  # decimal
+        self.i = 0b0  # interrupt disable
+        self.z = 0b0  # zero
+        self.c = 0b0  # carry
+        self._flags = 0x00  # unused status bits 4 and 5
+        self.PC = 0x0000  # program counter - 16-bit
+        self.S = 0xFF  # stack pointer
+        self.X = 0x00  # index register X
+        self.Y = 0x00  # index register Y
         self.bus = bus
+        self.data = None
         self.instruction = None
         self.addressing_mode = None
+        self.cycles = 0  # elapsed clock cycles
+        self.recorder = None  # FlightRecorder of recent instructions
+        self.pending = 0  # IRQ lines and NMI, see NMI and IRQ_LINES
 
     def __str__(self):
         GREEN = "\033[92m"
@@ -96,17 +412,14 @@ class CPU:
         )
 
     def fetch(self):
-        self.bus.address = self.PC
-        self.data = self.bus.memory_read()
-        self.PC += 1
+        self.data = self.bus.read(self.PC)
+        self.PC = uint16(self.PC + 1)
 
     def read(self, address):
-        self.bus.address = address
-        return self.bus.memory_read()
+        return self.bus.read(address)
 
     def write(self, address, value):
-        self.bus.address = address
-        self.bus.memory_write(value)
+        self.bus.write(address, value)
 
     def decode(self):
         self.instruction, self.addressing_mode = decode_standard(self.data)
@@ -140,12 +453,12 @@ class CPU:
             ll = self.data
             self.fetch()
             hh = self.data
-            return toUint16(hh, ll) + self.X
+            return uint16(toUint16(hh, ll) + self.X)
         elif self.addressing_mode == m.ABS_Y:
             ll = self.data
             self.fetch()
             hh = self.data
-            return toUint16(hh, ll) + self.Y
+            return uint16(toUint16(hh, ll) + self.Y)
         elif self.addressing_mode == m.IND:
             ll = self.data
             self.fetch()
@@ -161,7 +474,7 @@ class CPU:
         elif self.addressing_mode == m.IND_Y:
             ll = self.read(uint8(self.data))
             hh = self.read(uint8(self.data + 1))
-            return toUint16(hh, ll) + self.Y
+            return uint16(toUint16(hh, ll) + self.Y)
         else:
             raise NotImplementedError("Unknown addressing mode")
 
@@ -170,8 +483,19 @@ class CPU:
         if self.addressing_mode in [m.REL, m.IMM]:
             # Use literal value
             return addr
+        if self.addressing_mode in [m.ABS_X, m.ABS_Y, m.IND_Y]:
+            # Extra cycle when indexing crosses a page boundary
+            index = self.X if self.addressing_mode == m.ABS_X else self.Y
+            if (uint16(addr - index) ^ addr) & 0xFF00:
+                self.cycles += 1
         return self.read(addr)
 
+    def branch(self, offset):
+        # Taken branch costs one extra cycle, two if it crosses a page
+        target = uint16(self.PC + offset)
+        self.cycles += 2 if (self.PC ^ target) & 0xFF00 else 1
+        self.PC = target
+
     def stack_push(self, value):
         self.write(0x0100 + self.S, value)
         self.S = uint8(self.S - 1)
@@ -291,35 +615,35 @@ class CPU:
             case i.BEQ:
                 offset = toInt8(self.get_data())
                 if self.z == 1:
-                    self.PC = uint16(self.PC + offset)
+                    self.branch(offset)
             case i.BNE:
                 offset = toInt8(self.get_data())
                 if self.z == 0:
-                    self.PC = uint16(self.PC + offset)
+                    self.branch(offset)
             case i.BMI:
                 offset = toInt8(self.get_data())
                 if self.n == 1:
-                    self.PC = uint16(self.PC + offset)
+                    self.branch(offset)
             case i.BPL:
                 offset = toInt8(self.get_data())
                 if self.n == 0:
-                    self.PC = uint16(self.PC + offset)
+                    self.branch(offset)
             case i.BCS:
                 offset = toInt8(self.get_data())
                 if self.c == 1:
-                    self.PC = uint16(self.PC + offset)
+                    self.branch(offset)
             case i.BCC:
                 offset = toInt8(self.get_data())
                 if self.c == 0:
-                    self.PC = uint16(self.PC + offset)
+                    self.branch(offset)
             case i.BVC:
                 offset = toInt8(self.get_data())
                 if self.v == 0:
-                    self.PC = uint16(self.PC + offset)
+                    self.branch(offset)
             case i.BVS:
                 offset = toInt8(self.get_data())
                 if self.v == 1:
-                    self.PC = uint16(self.PC + offset)
+                    self.branch(offset)
             case i.AND:
                 self.A = self.A & self.get_data()
                 self.z = self.calc_z(self.A)
@@ -355,7 +679,7 @@ class CPU:
                 value = self.get_data()
                 self.n = (value >> 7) & 0x01
                 self.v = (value >> 6) & 0x01
-                self.z = (value & self.A) == 0
+                self.z = self.calc_z(value & self.A)
             case i.ASL:
                 if self.addressing_mode == m.A:
                     self.c = (self.A >> 7) & 0x01
@@ -429,18 +753,18 @@ class CPU:
                     result = result + ah + mh
                     if result > 0x99:
                         result += 0x60
-                    self.v = ~((self.A ^ M) & 0x80) & ((self.A ^ result) & 0x80) != 0
+                    self.v = int(~((self.A ^ M) & 0x80) & ((self.A ^ result) & 0x80) != 0)
                     self.c = 1 if result > 0xFF else 0
-                    self.A = result
+                    self.A = uint8(result)
                     self.z = self.calc_z(self.A)
                     self.n = self.calc_n(self.A)
                 else:
                     M = self.get_data()
                     result = self.A + M + self.c
                     # A and M have the same sign AND the result sign is different
-                    self.v = ~((self.A ^ M) & 0x80) & ((self.A ^ result) & 0x80) != 0
+                    self.v = int(~((self.A ^ M) & 0x80) & ((self.A ^ result) & 0x80) != 0)
                     self.c = 1 if result > 0xFF else 0
-                    self.A = result
+                    self.A = uint8(result)
                     self.z = self.calc_z(self.A)
                     self.n = self.calc_n(self.A)
             case i.SBC:
@@ -470,18 +794,18 @@ class CPU:
 
                     result = (result_h | result_l) & 0xFF
 
-                    self.v = ((self.A ^ M) & 0x80) & ((self.A ^ result) & 0x80) != 0
+                    self.v = int(((self.A ^ M) & 0x80) & ((self.A ^ result) & 0x80) != 0)
 
-                    self.A = result
+                    self.A = uint8(result)
                     self.z = self.calc_z(self.A)
                     self.n = self.calc_n(self.A)
                 else:
                     M = self.get_data()
                     result = self.A + ~(M) + self.c
                     # A and M have different sign AND the result sign is different
-                    self.v = ((self.A ^ M) & 0x80) & ((self.A ^ result) & 0x80) != 0
+                    self.v = int(((self.A ^ M) & 0x80) & ((self.A ^ result) & 0x80) != 0)
                     self.c = 1 if result >= 0 else 0
-                    self.A = result
+                    self.A = uint8(result)
                     self.z = self.calc_z(self.A)
                     self.n = self.calc_n(self.A)
             case i.BRK:
@@ -504,18 +828,152 @@ class CPU:
                     f"Instruction {self.instruction} not implemented"
                 )
 
-    def step(self, cycles=1):
-        for _ in range(cycles):
-            self.fetch()
-            self.decode()
-            self.execute()
+    def step(self, count=1):
+        recorder = self.recorder
+        try:
+            for _ in range(count):
+                if self.pending:
+                    self.interrupt()
+                if recorder is not None:
+                    recorder.record(self)
+                self.fetch()
+                self.cycles += cycles_standard[self.data]
+                self.decode()
+                self.execute()
+        except Exception:
+            self.crashed()
+            raise
+
+    def dispatch(self, count=1):
+        # Table-driven alternative to fetch/decode/execute
+        table = dispatch_table
+        timing = cycles_standard
+        recorder = self.recorder
+        try:
+            for _ in range(count):
+                if self.pending:
+                    self.interrupt()
+                if recorder is not None:
+                    recorder.record(self)
+                pc = self.PC
+                opcode = self.read(pc)
+                self.PC = (pc + 1) & 0xFFFF
+                self.cycles += timing[opcode]
+                table[opcode](self)
+        except Exception:
+            self.crashed()
+            raise
+
+    def assert_irq(self, line=1):
+        # A device pulls its IRQ line low. IRQ is level triggered: it is taken
+        # whenever the I flag is clear until every line is released again.
+        self.pending |= line & IRQ_LINES
+
+    def release_irq(self, line=1):
+        self.pending &= ~(line & IRQ_LINES)
+
+    def trigger_nmi(self):
+        # NMI is edge triggered, one call is taken once whatever the I flag
+        self.pending |= NMI
+
+    def interrupt(self):
+        # Called between instructions while anything is pending. Pushes PC
+        # and P with B clear, sets I and jumps through the vector. Returns
+        # True when an interrupt was taken.
+        if self.pending & NMI:
+            self.pending &= ~NMI
+            vector = NMI_VECTOR
+        elif not self.i:
+            vector = IRQ_VECTOR
+        else:
+            return False
+        pc = self.PC
+        self.stack_push(pc >> 8)
+        self.stack_push(pc & 0xFF)
+        self.stack_push(self.P & 0xEF)
+        self.i = 1
+        self.PC = self.read(vector) | self.read(vector + 1) << 8
+        self.cycles += INTERRUPT_CYCLES
+        return True
+
+    def crashed(self):
+        # Post-mortem dump of the flight recorder, if there is one
+        if self.recorder is not None:
+            self.recorder.dump(self)
+
+    def run_cycles(self, budget):
+        # Run whole instructions until at least budget cycles have elapsed,
+        # return the number of cycles actually used
+        return self.run_until(cycles=budget).cycles
+
+    def run_until(self, pc=None, cycles=None, instructions=None, predicate=None):
+        # Run the dispatch engine until one of the stop conditions holds. All
+        # conditions are checked after each instruction: pc is reached, cycles
+        # or instructions budgets are used up, or predicate(cpu) returns True.
+        if pc is None and cycles is None and instructions is None and predicate is None:
+            raise ValueError("No stop condition given")
+
+        table = dispatch_table
+        timing = cycles_standard
+        read = self.read
+        recorder = self.recorder
+        stop_pc = -1 if pc is None else pc
+        start = self.cycles
+        end = start + cycles if cycles is not None else float("inf")
+        limit = instructions if instructions is not None else -1
+        count = 0
+
+        if cycles is not None and cycles <= 0:
+            reason = StopReason.CYCLES
+        elif instructions is not None and instructions <= 0:
+            reason = StopReason.INSTRUCTIONS
+        else:
+            try:
+                while True:
+                    if self.pending:
+                        self.interrupt()
+                    if recorder is not None:
+                        recorder.record(self)
+                    address = self.PC
+                    opcode = read(address)
+                    self.PC = (address + 1) & 0xFFFF
+                    self.cycles += timing[opcode]
+                    table[opcode](self)
+                    count += 1
+                    if self.PC == stop_pc:
+                        reason = StopReason.PC
+                        break
+                    if self.cycles >= end:
+                        reason = StopReason.CYCLES
+                        break
+                    if count == limit:
+                        reason = StopReason.INSTRUCTIONS
+                        break
+                    if predicate is not None and predicate(self):
+                        reason = StopReason.PREDICATE
+                        break
+            except Exception:
+                self.crashed()
+                raise
+
+        return RunResult(reason, count, self.cycles - start, self.PC)
 
     def run(self):
-        mem_end = len(self.bus.memory.data)
-        while self.PC < mem_end:
-            self.fetch()
-            self.decode()
-            self.execute()
+        mem_end = len(self.bus.ram)
+        recorder = self.recorder
+        try:
+            while self.PC < mem_end:
+                if self.pending:
+                    self.interrupt()
+                if recorder is not None:
+                    recorder.record(self)
+                self.fetch()
+                self.cycles += cycles_standard[self.data]
+                self.decode()
+                self.execute()
+        except Exception:
+            self.crashed()
+            raise
         print("End of program")
 
     def reset(self, ll=0xFFFC, hh=0xFFFD):
@@ -524,98 +982,44 @@ class CPU:
         hh_data = self.read(hh)
         self.PC = toUint16(hh_data, ll_data)
 
-    @property
-    def A(self):
-        return self._A
-
-    @A.setter
-    def A(self, value):
-        self._A = uint8(value)
-
-    @property
-    def X(self):
-        return self._X
-
-    @X.setter
-    def X(self, value):
-        self._X = uint8(value)
-
-    @property
-    def Y(self):
-        return self._Y
-
-    @Y.setter
-    def Y(self, value):
-        self._Y = uint8(value)
-
-    @property
-    def PC(self):
-        return self._PC
-
-    @PC.setter
-    def PC(self, value):
-        self._PC = uint16(value)
-
-    @property
-    def S(self):
-        return self._S
-
-    @S.setter
-    def S(self, value):
-        self._S = uint8(value)
+    def snapshot(self) -> bytes:
+        # Registers, flags, cycle count and the memory image. Device state is
+        # not included.
+        registers = SNAPSHOT_REGISTERS.pack(
+            self.A, self.X, self.Y, self.S, self.P, self.PC, self.cycles
+        )
+        return registers + bytes(self.bus.ram)
+
+    def restore(self, snapshot: bytes):
+        # Restore in place, the memory image is copied into the existing RAM.
+        # Translated blocks, if any, must be flushed by the caller.
+        size = SNAPSHOT_REGISTERS.size
+        ram = self.bus.ram
+        if len(snapshot) - size != len(ram):
+            raise ValueError("Snapshot does not match the memory size")
+        self.A, self.X, self.Y, self.S, self.P, self.PC, self.cycles = (
+            SNAPSHOT_REGISTERS.unpack_from(snapshot)
+        )
+        ram[:] = memoryview(snapshot)[size:]
 
     @property
     def P(self):
-        return self._P
+        return (
+            self.n << 7
+            | self.v << 6
+            | self._flags
+            | self.d << 3
+            | self.i << 2
+            | self.z << 1
+            | self.c
+        )
 
     @P.setter
     def P(self, value):
-        self._P = uint8(value) & 0xFF
-
-    @property
-    def n(self):
-        return (self._P >> 7) & 0x01
-
-    @n.setter
-    def n(self, value):
-        self._P = self._P & ~(1 << 7) | bit(value) << 7
-
-    @property
-    def v(self):
-        return (self._P >> 6) & 0x01
-
-    @v.setter
-    def v(self, value):
-        self._P = self._P & ~(1 << 6) | bit(value) << 6
-
-    @property
-    def d(self):
-        return (self._P >> 3) & 0x01
-
-    @d.setter
-    def d(self, value):
-        self._P = self._P & ~(1 << 3) | bit(value) << 3
-
-    @property
-    def i(self):
-        return (self._P >> 2) & 0x01
-
-    @i.setter
-    def i(self, value):
-        self._P = self._P & ~(1 << 2) | bit(value) << 2
-
-    @property
-    def z(self):
-        return (self._P >> 1) & 0x01
-
-    @z.setter
-    def z(self, value):
-        self._P = self._P & ~(1 << 1) | bit(value) << 1
-
-    @property
-    def c(self):
-        return self._P & 0x01
-
-    @c.setter
-    def c(self, value):
-        self._P = self._P & ~(1) | bit(value)
+        self.n = (value >> 7) & 0x01
+        self.v = (value >> 6) & 0x01
+        self._flags = value & 0x30
+        self.d = (value >> 3) & 0x01
+        self.i = (value >> 2) & 0x01
+        self.z = (value >> 1) & 0x01
+        self.c = value & 0x01
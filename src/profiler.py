@@ -0,0 +1,148 @@
+import bisect
+import re
+from collections import Counter
+
+from src.model import RunResult, StopReason
+
+# Sampling profiler for guest code. The CPU runs in chunks of interval
+# instructions through CPU.run_until(), so the only per-instruction cost is the
+# instruction counter the dispatch loop already keeps. The PC and the call
+# stack are sampled between chunks.
+
+JSR = 0x20
+
+
+def load_symbols(path):
+    # VICE label files as written by ld65 -Ln ("al 00FF29 .NEXTCHAR") or
+    # plain "NAME = $FF29" lines
+    symbols = {}
+    with open(path) as f:
+        for line in f:
+            match = re.match(r"al\s+([0-9A-Fa-f]+)\s+\.(\w+)", line) or re.match(
+                r"(\w+)\s*=\s*\$([0-9A-Fa-f]+)", line
+            )
+            if not match:
+                continue
+            if line.startswith("al"):
+                address, name = match.groups()
+            else:
+                name, address = match.groups()
+            symbols[name] = int(address, 16) & 0xFFFF
+    return symbols
+
+
+class Profiler:
+    def __init__(self, cpu, interval=100, symbols=None, range_size=0x100):
+        if interval <= 0:
+            raise ValueError("Sampling interval must be positive")
+        self.cpu = cpu
+        self.interval = interval
+        self.range_size = range_size
+        self.countdown = interval
+        self.samples: Counter = Counter()  # PC -> samples
+        self.stacks: Counter = Counter()  # call targets + PC -> samples
+        names = sorted((address, name) for name, address in (symbols or {}).items())
+        self.symbol_addresses = [address for address, _ in names]
+        self.symbol_names = [name for _, name in names]
+
+    def run(self, pc=None, cycles=None, instructions=None, predicate=None):
+        # Same stop conditions as CPU.run_until()
+        if pc is None and cycles is None and instructions is None and predicate is None:
+            raise ValueError("No stop condition given")
+        cpu = self.cpu
+        start = cpu.cycles
+        count = 0
+        while True:
+            chunk = self.countdown
+            if instructions is not None:
+                chunk = min(chunk, instructions - count)
+            remaining = None if cycles is None else cycles - (cpu.cycles - start)
+            result = cpu.run_until(pc, remaining, chunk, predicate)
+            reason = result.reason
+            if reason == StopReason.INSTRUCTIONS and predicate is not None and predicate(cpu):
+                # run_until() checks the budget first, the predicate held too
+                reason = StopReason.PREDICATE
+            count += result.instructions
+            self.countdown -= result.instructions
+            if self.countdown <= 0:
+                self.sample()
+                self.countdown = self.interval
+            if reason != StopReason.INSTRUCTIONS or count == instructions:
+                break
+        return RunResult(reason, count, cpu.cycles - start, cpu.PC)
+
+    def sample(self):
+        pc = self.cpu.PC
+        self.samples[pc] += 1
+        self.stacks[self.call_stack() + (pc,)] += 1
+
+    def call_stack(self):
+        # Walk the stack page for return addresses that follow a JSR. This is
+        # a heuristic, data pushed by the guest can look like a return address.
+        ram = self.cpu.bus.ram
+        frames = []
+        s = self.cpu.S + 1
+        while s < 0xFF:
+            ret = ram[0x0100 + s] | ram[0x0101 + s] << 8
+            call = ret - 3
+            if call >= 0 and ram[call] == JSR:
+                frames.append(ram[call + 1] | ram[call + 2] << 8)
+                s += 2
+            else:
+                s += 1
+        frames.reverse()
+        return tuple(frames)
+
+    def symbol(self, address, offset=True):
+        index = bisect.bisect_right(self.symbol_addresses, address) - 1
+        if index < 0:
+            return f"${address:04X}"
+        name = self.symbol_names[index]
+        delta = address - self.symbol_addresses[index]
+        return f"{name}+{delta}" if offset and delta else name
+
+    def ranges(self):
+        ranges: Counter = Counter()
+        for address, count in self.samples.items():
+            ranges[address - address % self.range_size] += count
+        return ranges
+
+    def functions(self):
+        functions: Counter = Counter()
+        for address, count in self.samples.items():
+            functions[self.symbol(address, offset=False)] += count
+        return functions
+
+    def report(self, top=20):
+        total = sum(self.samples.values())
+        lines = [f"Samples: {total} (every {self.interval} instructions)"]
+        if not total:
+            return lines[0] + "\n"
+
+        def table(title, counter, label):
+            lines.append("")
+            lines.append(title)
+            for key, count in counter.most_common(top):
+                lines.append(f"  {label(key):<24} {count:>8} {100 * count / total:6.1f}%")
+
+        table("Addresses", self.samples, lambda a: f"{a:04X} {self.symbol(a)}")
+        size = self.range_size
+        table(
+            f"Ranges (${size:X} bytes)",
+            self.ranges(),
+            lambda a: f"{a:04X}-{min(a + size - 1, 0xFFFF):04X}",
+        )
+        if self.symbol_names:
+            table("Symbols", self.functions(), str)
+        return "\n".join(lines) + "\n"
+
+    def folded(self):
+        # One "outer;inner;leaf count" line per distinct stack, the format read
+        # by flamegraph.pl and speedscope
+        folded: Counter = Counter()
+        for stack, count in self.stacks.items():
+            *calls, pc = stack
+            frames = [self.symbol(address) for address in calls]
+            frames.append(self.symbol(pc, offset=False))
+            folded[";".join(frames)] += count
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(folded.items()))
@@ -0,0 +1,113 @@
+import heapq
+import itertools
+from typing import Callable, List, Optional, Tuple
+
+from src.model import RunResult, StopReason
+
+# Event scheduler keyed on CPU.cycles. Devices schedule callbacks at future
+# cycles instead of being polled on every instruction. run_until() runs the
+# dispatch loop in one piece up to the next due event, so the loop costs the
+# same however many devices are attached.
+
+
+class Event:
+    __slots__ = ("cycle", "callback", "period", "cancelled")
+
+    def __init__(self, cycle, callback, period=None):
+        self.cycle = cycle  # due when CPU.cycles reaches this
+        self.callback = callback
+        self.period = period  # reschedule every period cycles
+        self.cancelled = False
+
+
+class Scheduler:
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.events: List[Tuple[int, int, Event]] = []  # heap of (cycle, order, event)
+        self.order = itertools.count()  # keeps events due together in order
+        self.stopped = False
+
+    def at(self, cycle, callback: Callable[[], None], period=None) -> Event:
+        event = Event(cycle, callback, period)
+        heapq.heappush(self.events, (cycle, next(self.order), event))
+        return event
+
+    def after(self, delay, callback: Callable[[], None]) -> Event:
+        return self.at(self.cpu.cycles + delay, callback)
+
+    def every(self, period, callback: Callable[[], None]) -> Event:
+        # First due one period from now, then every period cycles after the
+        # cycle it was due at, so late runs do not make it drift
+        if period <= 0:
+            raise ValueError("Period must be positive")
+        return self.at(self.cpu.cycles + period, callback, period)
+
+    def cancel(self, event: Event):
+        # Cancelled events stay in the heap until they come up
+        event.cancelled = True
+
+    def stop(self):
+        # Called from a callback to end run_until() with StopReason.EVENT
+        self.stopped = True
+
+    def next_cycle(self) -> Optional[int]:
+        events = self.events
+        while events and events[0][2].cancelled:
+            heapq.heappop(events)
+        return events[0][0] if events else None
+
+    def fire(self):
+        # Run every callback that is due
+        events = self.events
+        cycles = self.cpu.cycles
+        while events and events[0][0] <= cycles:
+            _, _, event = heapq.heappop(events)
+            if event.cancelled:
+                continue
+            if event.period is not None:
+                # Periods missed while the clock jumped forward are dropped
+                missed = max(cycles - event.cycle, 0) // event.period
+                event.cycle += (missed + 1) * event.period
+                heapq.heappush(events, (event.cycle, next(self.order), event))
+            event.callback()
+
+    def run_until(self, pc=None, cycles=None, instructions=None, predicate=None):
+        # CPU.run_until() with events: same stop conditions, plus a callback
+        # calling stop(). With no condition the run ends only that way.
+        if pc is None and cycles is None and instructions is None and predicate is None:
+            if self.next_cycle() is None:
+                raise ValueError("No stop condition or event given")
+        cpu = self.cpu
+        start = cpu.cycles
+        count = 0
+        self.stopped = False
+        while True:
+            self.fire()
+            if self.stopped:
+                reason = StopReason.EVENT
+                break
+            budget = None if cycles is None else cycles - (cpu.cycles - start)
+            due = self.next_cycle()
+            if due is not None and (budget is None or due - cpu.cycles < budget):
+                # Leave the dispatch loop when the next event is due
+                chunk = due - cpu.cycles
+            else:
+                chunk = budget
+            remaining = None if instructions is None else instructions - count
+            result = cpu.run_until(pc, chunk, remaining, predicate)
+            count += result.instructions
+            reason = result.reason
+            if reason != StopReason.CYCLES or chunk == budget:
+                break
+            # Stopped for an event. run_until() checks the cycles first, so
+            # see whether another condition held on the same instruction.
+            if count == instructions:
+                reason = StopReason.INSTRUCTIONS
+                break
+            if predicate is not None and predicate(cpu):
+                reason = StopReason.PREDICATE
+                break
+        if reason != StopReason.EVENT:
+            # Events that came due on the last instruction
+            self.fire()
+        return RunResult(reason, count, cpu.cycles - start, cpu.PC)
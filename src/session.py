@@ -0,0 +1,158 @@
+import zlib
+from typing import List, NamedTuple
+
+from src.apple1 import AppleI, print_output
+from src.model import SNAPSHOT_REGISTERS
+
+# Recording and replay of Woz Monitor sessions. A session is the machine
+# snapshot at the start of the recording and every event from outside the
+# guest, tagged with the cycle count at which it happened: keys sent to the
+# keyboard, the clock jumps of the idle sleep and the end of the run. The
+# guest is deterministic between events, so running to each cycle and
+# applying the event there reproduces the session exactly, without waiting
+# for the input.
+#
+# File layout: magic, version byte, then zlib compressed: the snapshot size
+# and the snapshot, and per event the cycles since the previous event and a
+# code byte, all sizes and counts as LEB128 varints. Codes below JUMP are
+# keys, JUMP is followed by the cycles added.
+
+SESSION_MAGIC = b"6502WOZS"
+SESSION_VERSION = 1
+
+JUMP = 0x80  # the clock moved on by the value
+END = 0x81  # the recording stopped
+
+
+class Event(NamedTuple):
+    cycle: int
+    code: int  # key, JUMP or END
+    value: int = 0
+
+
+class Session(NamedTuple):
+    snapshot: bytes  # CPU.snapshot() when the recording started
+    events: List[Event]
+
+
+def snapshot_cycles(snapshot):
+    return SNAPSHOT_REGISTERS.unpack_from(snapshot)[-1]
+
+
+def write_varint(out: bytearray, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise ValueError("Truncated session")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def encode_session(session: Session) -> bytes:
+    out = bytearray()
+    write_varint(out, len(session.snapshot))
+    out += session.snapshot
+    cycle = snapshot_cycles(session.snapshot)
+    for event in session.events:
+        write_varint(out, event.cycle - cycle)
+        out.append(event.code)
+        if event.code == JUMP:
+            write_varint(out, event.value)
+        cycle = event.cycle
+    return SESSION_MAGIC + bytes([SESSION_VERSION]) + zlib.compress(out)
+
+
+def decode_session(data: bytes) -> Session:
+    if data[: len(SESSION_MAGIC)] != SESSION_MAGIC:
+        raise ValueError("Not a session file")
+    version = data[len(SESSION_MAGIC)]
+    if version != SESSION_VERSION:
+        raise ValueError(f"Unsupported session version {version}")
+    data = zlib.decompress(data[len(SESSION_MAGIC) + 1 :])
+    size, position = read_varint(data, 0)
+    snapshot = bytes(data[position : position + size])
+    position += size
+    cycle = snapshot_cycles(snapshot)
+    events = []
+    while position < len(data):
+        delta, position = read_varint(data, position)
+        if position >= len(data):
+            raise ValueError("Truncated session")
+        code = data[position]
+        position += 1
+        value = 0
+        if code == JUMP:
+            value, position = read_varint(data, position)
+        elif code > END:
+            raise ValueError(f"Invalid event code {code:#04x}")
+        cycle += delta
+        events.append(Event(cycle, code, value))
+    return Session(snapshot, events)
+
+
+def save_session(path, session: Session):
+    with open(path, "wb") as f:
+        f.write(encode_session(session))
+
+
+def load_session(path) -> Session:
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        return decode_session(data)
+    except (ValueError, IndexError, zlib.error) as e:
+        raise ValueError(f"{path}: {e}") from None
+
+
+class SessionRecorder:
+    # Set as AppleI.recorder. Takes the snapshot when created, so create it
+    # before the first key is sent and once memory holds the start state.
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.snapshot = cpu.snapshot()
+        self.events: List[Event] = []
+
+    def key(self, key):
+        self.events.append(Event(self.cpu.cycles, key & 0x7F))
+
+    def jump(self, cycles):
+        # Called after the clock moved on by cycles
+        self.events.append(Event(self.cpu.cycles - cycles, JUMP, cycles))
+
+    def session(self) -> Session:
+        # The events so far and the end of the run at the current cycle
+        return Session(self.snapshot, self.events + [Event(self.cpu.cycles, END)])
+
+
+def replay(session: Session, output=print_output) -> AppleI:
+    # Run a recorded session on a new machine as fast as it emulates. Raises
+    # ValueError if the guest does not reach an event at the recorded cycle.
+    machine = AppleI(output)
+    cpu = machine.cpu
+    cpu.restore(session.snapshot)
+    for event in session.events:
+        if event.cycle > cpu.cycles:
+            cpu.run_until(cycles=event.cycle - cpu.cycles)
+        if cpu.cycles != event.cycle:
+            raise ValueError(
+                f"Replay reached cycle {cpu.cycles} instead of {event.cycle}"
+            )
+        if event.code == JUMP:
+            cpu.cycles += event.value
+        elif event.code == END:
+            break
+        else:
+            machine.pia.send_key(event.code)
+    return machine
@@ -0,0 +1,409 @@
+from array import array
+
+from src.instructions import i, m, opcodes
+
+# Basic block translation engine. Straight-line guest code starting at a PC is
+# compiled once into a Python function with operands and addresses resolved
+# ahead of time. Registers live in locals while the block runs and are written
+# back to the CPU when it exits. Blocks are cached by start address and dropped
+# when the guest writes into them.
+
+MAX_BLOCK_LENGTH = 64
+
+# Instructions that end a basic block
+block_end = {
+    i.JMP, i.JSR, i.RTS, i.RTI, i.BRK,
+    i.BEQ, i.BNE, i.BMI, i.BPL, i.BCS, i.BCC, i.BVC, i.BVS,
+}
+
+branches = {
+    i.BEQ: ("z", 1),
+    i.BNE: ("z", 0),
+    i.BMI: ("n", 1),
+    i.BPL: ("n", 0),
+    i.BCS: ("c", 1),
+    i.BCC: ("c", 0),
+    i.BVC: ("v", 0),
+    i.BVS: ("v", 1),
+}
+
+REGISTERS = "A, X, Y, S, n, v, d, i, z, c, f"
+CPU_REGISTERS = "cpu.A, cpu.X, cpu.Y, cpu.S, cpu.n, cpu.v, cpu.d, cpu.i, cpu.z, cpu.c, cpu._flags"
+PACK_P = "(n << 7 | v << 6 | f | d << 3 | i << 2 | z << 1 | c)"
+
+
+def _nz(register):
+    return [f"z = 0 if {register} else 1", f"n = {register} >> 7"]
+
+
+def _unpack_p(value):
+    return [
+        f"n = ({value} >> 7) & 0x01",
+        f"v = ({value} >> 6) & 0x01",
+        f"f = {value} & 0x30",
+        f"d = ({value} >> 3) & 0x01",
+        f"i = ({value} >> 2) & 0x01",
+        f"z = ({value} >> 1) & 0x01",
+        f"c = {value} & 0x01",
+    ]
+
+
+class _Instruction:
+    # Source generation state for one guest instruction
+    def __init__(self, entry, pc, operand, index, cycles):
+        self.instruction = entry.instruction
+        self.mode = entry.mode
+        self.penalty = entry.page_penalty
+        self.pc = pc
+        self.operand = operand
+        self.next = (pc + entry.length) & 0xFFFF
+        self.index = index  # instructions executed when this one is done
+        self.cycles = cycles  # static cycles when this one is done
+        self.lines = []
+        self.writes = False
+
+    def emit(self, *lines):
+        self.lines.extend(lines)
+
+    def exit(self, pc):
+        return [
+            f"{CPU_REGISTERS} = {REGISTERS}",
+            f"cpu.cycles = cycles + {self.cycles}",
+            f"cpu.PC = {pc}",
+            f"return {self.index}",
+        ]
+
+    def write(self, address, value):
+        # Writes into translated code end the block after this instruction
+        self.emit(
+            f"write({address}, {value})",
+            f"if code[{address}]:",
+            f"    invalidate({address})",
+            "    modified = 1",
+        )
+        self.writes = True
+
+    def address(self):
+        # Emit code that leaves the effective address in addr
+        op = self.operand
+        penalty = self.penalty
+        match self.mode:
+            case m.ZPG:
+                self.emit(f"addr = {op:#04x}")
+            case m.ZPG_X:
+                self.emit(f"addr = ({op:#04x} + X) & 0xFF")
+            case m.ZPG_Y:
+                self.emit(f"addr = ({op:#04x} + Y) & 0xFF")
+            case m.ABS:
+                self.emit(f"addr = {op:#06x}")
+            case m.ABS_X | m.ABS_Y:
+                index = "X" if self.mode == m.ABS_X else "Y"
+                if penalty:
+                    self.emit(f"if {index} > {0xFF - (op & 0xFF):#04x}:", "    cycles += 1")
+                self.emit(f"addr = ({op:#06x} + {index}) & 0xFFFF")
+            case m.IND:
+                pointer_hh = (op & 0xFF00) | ((op + 1) & 0xFF)
+                self.emit(f"addr = read({op:#06x}) | read({pointer_hh:#06x}) << 8")
+            case m.IND_X:
+                self.emit(
+                    f"addr = ({op:#04x} + X) & 0xFF",
+                    "addr = read(addr) | read((addr + 1) & 0xFF) << 8",
+                )
+            case m.IND_Y:
+                self.emit(f"addr = read({op:#04x}) | read({(op + 1) & 0xFF:#04x}) << 8")
+                if penalty:
+                    self.emit("if (addr & 0xFF) + Y > 0xFF:", "    cycles += 1")
+                self.emit("addr = (addr + Y) & 0xFFFF")
+            case _:
+                raise NotImplementedError(f"Unknown addressing mode {self.mode}")
+        return "addr"
+
+    def value(self):
+        # Expression for the operand value of a read instruction
+        if self.mode == m.IMM:
+            return f"{self.operand:#04x}"
+        return f"read({self.address()})"
+
+    def push(self, value):
+        self.write("0x0100 + S", value)
+        self.emit("S = (S - 1) & 0xFF")
+
+    def pull(self, target):
+        self.emit("S = (S + 1) & 0xFF", f"{target} = read(0x0100 + S)")
+
+    def generate(self):
+        inst = self.instruction
+        match inst:
+            case i.LDA | i.LDX | i.LDY:
+                register = inst.name[2]
+                self.emit(f"{register} = {self.value()}", *_nz(register))
+            case i.STA | i.STX | i.STY:
+                self.write(self.address(), inst.name[2])
+            case i.TAX | i.TAY | i.TSX | i.TXA | i.TYA:
+                self.emit(f"{inst.name[2]} = {inst.name[1]}", *_nz(inst.name[2]))
+            case i.TXS:
+                self.emit("S = X")
+            case i.NOP:
+                pass
+            case i.CLC | i.CLD | i.CLI | i.CLV:
+                self.emit(f"{inst.name[2].lower()} = 0")
+            case i.SEC | i.SED | i.SEI:
+                self.emit(f"{inst.name[2].lower()} = 1")
+            case i.INX | i.INY:
+                self.emit(f"{inst.name[2]} = ({inst.name[2]} + 1) & 0xFF", *_nz(inst.name[2]))
+            case i.DEX | i.DEY:
+                self.emit(f"{inst.name[2]} = ({inst.name[2]} - 1) & 0xFF", *_nz(inst.name[2]))
+            case i.INC | i.DEC:
+                delta = "+" if inst == i.INC else "-"
+                addr = self.address()
+                self.emit(f"t = (read({addr}) {delta} 1) & 0xFF", *_nz("t"))
+                self.write(addr, "t")
+            case i.CMP | i.CPX | i.CPY:
+                register = "A" if inst == i.CMP else inst.name[2]
+                self.emit(
+                    f"t = {self.value()}",
+                    f"c = 1 if {register} >= t else 0",
+                    f"t = ({register} - t) & 0xFF",
+                    *_nz("t"),
+                )
+            case i.AND | i.ORA | i.EOR:
+                operator = {i.AND: "&", i.ORA: "|", i.EOR: "^"}[inst]
+                self.emit(f"A = A {operator} {self.value()}", *_nz("A"))
+            case i.BIT:
+                self.emit(
+                    f"t = {self.value()}",
+                    "n = t >> 7",
+                    "v = (t >> 6) & 0x01",
+                    "z = 0 if t & A else 1",
+                )
+            case i.ASL | i.LSR | i.ROL | i.ROR:
+                if self.mode == m.A:
+                    self.emit("t = A")
+                else:
+                    addr = self.address()
+                    self.emit(f"t = read({addr})")
+                match inst:
+                    case i.ASL:
+                        self.emit("c = t >> 7", "t = (t << 1) & 0xFF")
+                    case i.LSR:
+                        self.emit("c = t & 0x01", "t = t >> 1")
+                    case i.ROL:
+                        self.emit("t = (t << 1) | (c & 0x01)", "c = t >> 8", "t = t & 0xFF")
+                    case i.ROR:
+                        self.emit("t = ((c & 0x01) << 8) | t", "c = t & 0x01", "t = t >> 1")
+                self.emit(*_nz("t"))
+                if self.mode == m.A:
+                    self.emit("A = t")
+                else:
+                    self.write(addr, "t")
+            case i.ADC:
+                self.emit(
+                    f"t = {self.value()}",
+                    "if d:",
+                    "    r = (A & 0x0F) + (t & 0x0F) + c",
+                    "    if r > 0x09:",
+                    "        r += 0x06",
+                    "    r = r + (A & 0xF0) + (t & 0xF0)",
+                    "    if r > 0x99:",
+                    "        r += 0x60",
+                    "else:",
+                    "    r = A + t + c",
+                    "v = 1 if ~(A ^ t) & (A ^ r) & 0x80 else 0",
+                    "c = 1 if r > 0xFF else 0",
+                    "A = r & 0xFF",
+                    *_nz("A"),
+                )
+            case i.SBC:
+                self.emit(
+                    f"t = {self.value()}",
+                    "if d:",
+                    "    b = 1 - c",
+                    "    r = (A & 0x0F) - (t & 0x0F) - b",
+                    "    if r < 0:",
+                    "        r = (r - 0x06) & 0x0F",
+                    "        b = 0x10",
+                    "    else:",
+                    "        b = 0",
+                    "    h = (A & 0xF0) - (t & 0xF0) - b",
+                    "    if h < 0:",
+                    "        h = (h - 0x60) & 0xF0",
+                    "        c = 0",
+                    "    else:",
+                    "        c = 1",
+                    "    r = (h | r) & 0xFF",
+                    "else:",
+                    "    r = A + ~t + c",
+                    "    c = 1 if r >= 0 else 0",
+                    "v = 1 if (A ^ t) & (A ^ r) & 0x80 else 0",
+                    "A = r & 0xFF",
+                    *_nz("A"),
+                )
+            case i.PHA:
+                self.push("A")
+            case i.PHP:
+                self.push(f"{PACK_P} | 0x18")
+            case i.PLA:
+                self.pull("A")
+                self.emit(*_nz("A"))
+            case i.PLP:
+                self.pull("t")
+                self.emit("t = t & 0xE7", *_unpack_p("t"))
+            case i.JMP:
+                if self.mode == m.ABS:
+                    self.emit(*self.exit(f"{self.operand:#06x}"))
+                else:
+                    self.emit(*self.exit(self.address()))
+            case i.JSR:
+                ret = (self.pc + 3) & 0xFFFF
+                self.push(f"{ret >> 8:#04x}")
+                self.push(f"{ret & 0xFF:#04x}")
+                self.emit(*self.exit(f"{self.operand:#06x}"))
+            case i.RTS:
+                self.pull("t")
+                self.pull("h")
+                self.emit(*self.exit("h << 8 | t"))
+            case i.RTI:
+                self.pull("t")
+                self.emit("t = t & 0xE7", *_unpack_p("t"))
+                self.pull("t")
+                self.pull("h")
+                self.emit(*self.exit("h << 8 | t"))
+            case i.BRK:
+                ret = (self.pc + 2) & 0xFFFF
+                self.push(f"{ret >> 8:#04x}")
+                self.push(f"{ret & 0xFF:#04x}")
+                self.push(f"{PACK_P} | 0x18")
+                self.emit("t = read(0xFFFE)")
+                self.emit(*self.exit("read(0xFFFF) << 8 | t"))
+            case _ if inst in branches:
+                flag, taken = branches[inst]
+                target = (self.next + ((self.operand ^ 0x80) - 0x80)) & 0xFFFF
+                penalty = 2 if (self.next ^ target) & 0xFF00 else 1
+                self.emit(f"if {flag} == {taken}:", f"    cycles += {penalty}")
+                self.emit(*[f"    {line}" for line in self.exit(f"{target:#06x}")])
+                self.emit(*self.exit(f"{self.next:#06x}"))
+            case _:
+                raise NotImplementedError(f"Instruction {inst} not implemented")
+        if self.writes and inst not in block_end:
+            self.emit("if modified:", *[f"    {line}" for line in self.exit(f"{self.next:#06x}")])
+        return self.lines
+
+
+class Translator:
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.blocks = {}  # start address -> compiled block
+        self.ranges = {}  # start address -> (start, end)
+        self.code = array("H", [0]) * 0x10000  # blocks covering each address
+        self.pages = [set() for _ in range(0x100)]  # page -> block start addresses
+
+    def peek(self, address):
+        return self.cpu.bus.ram[address & 0xFFFF]
+
+    def source(self, start):
+        # Generate the Python source of the block starting at start
+        lines = []
+        pc = start
+        cycles = 0
+        count = 0
+        inst = None
+        while count < MAX_BLOCK_LENGTH:
+            try:
+                opcode = self.peek(pc)
+                entry = opcodes[opcode]
+                if entry is None:
+                    raise NotImplementedError(f"Unknown instruction {opcode:#04x}")
+                operand = 0
+                for offset in range(entry.length - 1, 0, -1):
+                    operand = (operand << 8) | self.peek(pc + offset)
+            except (NotImplementedError, IndexError):
+                # Leave the failure to the instruction that causes it
+                if inst is None:
+                    raise
+                break
+            count += 1
+            cycles += entry.cycles
+            inst = _Instruction(entry, pc, operand, count, cycles)
+            lines.extend(inst.generate())
+            pc = inst.next
+            if entry.instruction in block_end:
+                break
+        if inst.instruction not in block_end:
+            lines.extend(inst.exit(f"{pc:#06x}"))
+
+        end = start + (pc - start) % 0x10000
+        body = "\n".join(f"    {line}" for line in lines)
+        return (
+            f"def block_{start:04x}(cpu):\n"
+            f"    read = cpu.read\n"
+            f"    write = cpu.write\n"
+            f"    cycles = cpu.cycles\n"
+            f"    modified = 0\n"
+            f"    {REGISTERS} = {CPU_REGISTERS}\n"
+            f"{body}\n"
+        ), end
+
+    def translate(self, start):
+        source, end = self.source(start)
+        namespace = {"code": self.code, "invalidate": self.invalidate}
+        exec(compile(source, f"<block {start:#06x}>", "exec"), namespace)
+        block = namespace[f"block_{start:04x}"]
+        self.blocks[start] = block
+        self.ranges[start] = (start, end)
+        for address in range(start, end):
+            self.code[address & 0xFFFF] += 1
+        for page in range(start >> 8, ((end - 1) >> 8) + 1):
+            self.pages[page & 0xFF].add(start)
+        return block
+
+    def invalidate(self, address):
+        # Drop every block that contains address
+        for start in list(self.pages[address >> 8]):
+            first, end = self.ranges[start]
+            if first <= address < end or first <= address + 0x10000 < end:
+                self.remove(start)
+
+    def remove(self, start):
+        first, end = self.ranges.pop(start)
+        del self.blocks[start]
+        for address in range(first, end):
+            self.code[address & 0xFFFF] -= 1
+        for page in range(first >> 8, ((end - 1) >> 8) + 1):
+            self.pages[page & 0xFF].discard(start)
+
+    def prepare(self, code_map):
+        # Translate every basic block found by src.disassembler.follow() up
+        # front instead of on first use
+        for start in code_map.blocks():
+            if start not in self.blocks:
+                self.translate(start)
+
+    def flush(self):
+        # Drop all blocks, e.g. after memory was changed from outside the CPU
+        for start in list(self.blocks):
+            self.remove(start)
+
+    def step(self):
+        # Run one block, return the number of instructions executed.
+        # Interrupts are taken between blocks.
+        cpu = self.cpu
+        if cpu.pending:
+            cpu.interrupt()
+        block = self.blocks.get(cpu.PC)
+        if block is None:
+            block = self.translate(cpu.PC)
+        return block(cpu)
+
+    def run(self, count):
+        # Run whole blocks until at least count instructions were executed
+        cpu = self.cpu
+        blocks = self.blocks
+        executed = 0
+        while executed < count:
+            if cpu.pending:
+                cpu.interrupt()
+            block = blocks.get(cpu.PC)
+            if block is None:
+                block = self.translate(cpu.PC)
+            executed += block(cpu)
+        return executed
@@ -0,0 +1,643 @@
+from typing import Callable, List
+
+import numpy as np
+
+from src.instructions import cycles_standard, i, m, opcodes
+from src.model import CPU, Bus, RAM
+
+# Lockstep engine for many machines running the same kind of workload. The
+# registers and flags of N machines are arrays and memory is an (N, 65536)
+# array. Every step fetches the opcode of each machine, groups the machines by
+# opcode and runs one vectorized handler per group. Handlers mirror
+# src/dispatch.py: they are called with the opcode already fetched and take the
+# array of machine indices in the group. Only plain RAM is modelled, there are
+# no devices or ROM pages.
+
+VectorHandler = Callable[[object, np.ndarray], None]
+
+_timing = np.array(cycles_standard, dtype=np.int64)
+
+
+def _read(cpu, idx, address):
+    return cpu.memory[idx, address].astype(np.int64)
+
+
+def _write(cpu, idx, address, value):
+    cpu.memory[idx, address] = value
+
+
+# Addressing modes
+
+
+def _imm(cpu, idx):
+    pc = cpu.PC[idx]
+    cpu.PC[idx] = (pc + 1) & 0xFFFF
+    return pc
+
+
+def _zpg(cpu, idx):
+    pc = cpu.PC[idx]
+    cpu.PC[idx] = (pc + 1) & 0xFFFF
+    return _read(cpu, idx, pc)
+
+
+def _zpg_x(cpu, idx):
+    return (_zpg(cpu, idx) + cpu.X[idx]) & 0xFF
+
+
+def _zpg_y(cpu, idx):
+    return (_zpg(cpu, idx) + cpu.Y[idx]) & 0xFF
+
+
+def _operand16(cpu, idx):
+    pc = cpu.PC[idx]
+    ll = _read(cpu, idx, pc)
+    hh = _read(cpu, idx, (pc + 1) & 0xFFFF)
+    cpu.PC[idx] = (pc + 2) & 0xFFFF
+    return hh, ll
+
+
+def _abs(cpu, idx):
+    hh, ll = _operand16(cpu, idx)
+    return (hh << 8) | ll
+
+
+def _abs_x(cpu, idx):
+    hh, ll = _operand16(cpu, idx)
+    return (((hh << 8) | ll) + cpu.X[idx]) & 0xFFFF
+
+
+def _abs_y(cpu, idx):
+    hh, ll = _operand16(cpu, idx)
+    return (((hh << 8) | ll) + cpu.Y[idx]) & 0xFFFF
+
+
+def _abs_x_read(cpu, idx):
+    hh, ll = _operand16(cpu, idx)
+    addr = (((hh << 8) | ll) + cpu.X[idx]) & 0xFFFF
+    cpu.cycles[idx] += (addr >> 8) != hh
+    return addr
+
+
+def _abs_y_read(cpu, idx):
+    hh, ll = _operand16(cpu, idx)
+    addr = (((hh << 8) | ll) + cpu.Y[idx]) & 0xFFFF
+    cpu.cycles[idx] += (addr >> 8) != hh
+    return addr
+
+
+def _ind(cpu, idx):
+    hh, ll = _operand16(cpu, idx)
+    target_ll = _read(cpu, idx, (hh << 8) | ll)
+    # hh is not incremented by the CPU when the pointer crosses a page
+    target_hh = _read(cpu, idx, (hh << 8) | ((ll + 1) & 0xFF))
+    return (target_hh << 8) | target_ll
+
+
+def _ind_x(cpu, idx):
+    zp = _zpg(cpu, idx) + cpu.X[idx]
+    ll = _read(cpu, idx, zp & 0xFF)
+    hh = _read(cpu, idx, (zp + 1) & 0xFF)
+    return (hh << 8) | ll
+
+
+def _ind_y_pointer(cpu, idx):
+    zp = _zpg(cpu, idx)
+    ll = _read(cpu, idx, zp)
+    hh = _read(cpu, idx, (zp + 1) & 0xFF)
+    return hh, ll
+
+
+def _ind_y(cpu, idx):
+    hh, ll = _ind_y_pointer(cpu, idx)
+    return (((hh << 8) | ll) + cpu.Y[idx]) & 0xFFFF
+
+
+def _ind_y_read(cpu, idx):
+    hh, ll = _ind_y_pointer(cpu, idx)
+    addr = (((hh << 8) | ll) + cpu.Y[idx]) & 0xFFFF
+    cpu.cycles[idx] += (addr >> 8) != hh
+    return addr
+
+
+modes = {
+    m.IMPL: None,
+    m.A: None,
+    m.IMM: _imm,
+    m.REL: _imm,
+    m.ZPG: _zpg,
+    m.ZPG_X: _zpg_x,
+    m.ZPG_Y: _zpg_y,
+    m.ABS: _abs,
+    m.ABS_X: _abs_x,
+    m.ABS_Y: _abs_y,
+    m.IND: _ind,
+    m.IND_X: _ind_x,
+    m.IND_Y: _ind_y,
+}
+
+read_modes = {
+    m.ABS_X: _abs_x_read,
+    m.ABS_Y: _abs_y_read,
+    m.IND_Y: _ind_y_read,
+}
+
+
+# Instruction semantics, same factories as src/dispatch.py
+
+
+def _nz(cpu, idx, value):
+    cpu.z[idx] = value == 0
+    cpu.n[idx] = value >> 7
+
+
+def _load(register):
+    def factory(addr):
+        def load(cpu, idx):
+            value = _read(cpu, idx, addr(cpu, idx))
+            getattr(cpu, register)[idx] = value
+            _nz(cpu, idx, value)
+
+        return load
+
+    return factory
+
+
+def _store(register):
+    def factory(addr):
+        def store(cpu, idx):
+            _write(cpu, idx, addr(cpu, idx), getattr(cpu, register)[idx])
+
+        return store
+
+    return factory
+
+
+def _transfer(source, target, flags=True):
+    def factory(addr):
+        def transfer(cpu, idx):
+            value = getattr(cpu, source)[idx]
+            getattr(cpu, target)[idx] = value
+            if flags:
+                _nz(cpu, idx, value)
+
+        return transfer
+
+    return factory
+
+
+def _flag(name, value):
+    def factory(addr):
+        def flag(cpu, idx):
+            getattr(cpu, name)[idx] = value
+
+        return flag
+
+    return factory
+
+
+def _nop(addr):
+    def nop(cpu, idx):
+        pass
+
+    return nop
+
+
+def _step_register(register, delta):
+    def factory(addr):
+        def step(cpu, idx):
+            array = getattr(cpu, register)
+            value = (array[idx] + delta) & 0xFF
+            array[idx] = value
+            _nz(cpu, idx, value)
+
+        return step
+
+    return factory
+
+
+def _step_memory(delta):
+    def factory(addr):
+        def step(cpu, idx):
+            dst = addr(cpu, idx)
+            value = (_read(cpu, idx, dst) + delta) & 0xFF
+            _nz(cpu, idx, value)
+            _write(cpu, idx, dst, value)
+
+        return step
+
+    return factory
+
+
+def _compare(register):
+    def factory(addr):
+        def compare(cpu, idx):
+            value = _read(cpu, idx, addr(cpu, idx))
+            reg = getattr(cpu, register)[idx]
+            cpu.c[idx] = reg >= value
+            _nz(cpu, idx, (reg - value) & 0xFF)
+
+        return compare
+
+    return factory
+
+
+def _jmp(addr):
+    def jmp(cpu, idx):
+        cpu.PC[idx] = addr(cpu, idx)
+
+    return jmp
+
+
+def _branch(flag, taken):
+    def factory(addr):
+        def branch(cpu, idx):
+            pc = cpu.PC[idx]
+            offset = _read(cpu, idx, pc)
+            pc = (pc + 1) & 0xFFFF
+            target = (pc + ((offset ^ 0x80) - 0x80)) & 0xFFFF
+            jump = getattr(cpu, flag)[idx] == taken
+            cpu.cycles[idx] += jump * np.where((pc ^ target) & 0xFF00, 2, 1)
+            cpu.PC[idx] = np.where(jump, target, pc)
+
+        return branch
+
+    return factory
+
+
+def _logic(operation):
+    def factory(addr):
+        def logic(cpu, idx):
+            value = operation(cpu.A[idx], _read(cpu, idx, addr(cpu, idx)))
+            cpu.A[idx] = value
+            _nz(cpu, idx, value)
+
+        return logic
+
+    return factory
+
+
+def _push(cpu, idx, value):
+    s = cpu.S[idx]
+    _write(cpu, idx, 0x0100 + s, value)
+    cpu.S[idx] = (s - 1) & 0xFF
+
+
+def _pop(cpu, idx):
+    s = (cpu.S[idx] + 1) & 0xFF
+    cpu.S[idx] = s
+    return _read(cpu, idx, 0x0100 + s)
+
+
+def _pha(addr):
+    def pha(cpu, idx):
+        _push(cpu, idx, cpu.A[idx])
+
+    return pha
+
+
+def _pla(addr):
+    def pla(cpu, idx):
+        value = _pop(cpu, idx)
+        cpu.A[idx] = value
+        _nz(cpu, idx, value)
+
+    return pla
+
+
+def _php(addr):
+    def php(cpu, idx):
+        _push(cpu, idx, cpu.status(idx) | 0x18)
+
+    return php
+
+
+def _plp(addr):
+    def plp(cpu, idx):
+        cpu.set_status(idx, _pop(cpu, idx) & 0xE7)
+
+    return plp
+
+
+def _jsr(addr):
+    def jsr(cpu, idx):
+        ret = (cpu.PC[idx] + 2) & 0xFFFF
+        _push(cpu, idx, ret >> 8)
+        _push(cpu, idx, ret & 0xFF)
+        cpu.PC[idx] = addr(cpu, idx)
+
+    return jsr
+
+
+def _rts(addr):
+    def rts(cpu, idx):
+        ll = _pop(cpu, idx)
+        hh = _pop(cpu, idx)
+        cpu.PC[idx] = (hh << 8) | ll
+
+    return rts
+
+
+def _bit(addr):
+    def bit(cpu, idx):
+        value = _read(cpu, idx, addr(cpu, idx))
+        cpu.n[idx] = value >> 7
+        cpu.v[idx] = (value >> 6) & 0x01
+        cpu.z[idx] = (value & cpu.A[idx]) == 0
+
+    return bit
+
+
+def _shift(operation):
+    def factory(addr):
+        def shift(cpu, idx):
+            if addr is None:
+                value, cpu.c[idx] = operation(cpu.A[idx], cpu.c[idx])
+                cpu.A[idx] = value
+            else:
+                dst = addr(cpu, idx)
+                value, cpu.c[idx] = operation(_read(cpu, idx, dst), cpu.c[idx])
+                _write(cpu, idx, dst, value)
+            _nz(cpu, idx, value)
+
+        return shift
+
+    return factory
+
+
+def _asl(value, carry):
+    return (value << 1) & 0xFF, value >> 7
+
+
+def _lsr(value, carry):
+    return value >> 1, value & 0x01
+
+
+def _rol(value, carry):
+    return ((value << 1) & 0xFF) | carry, value >> 7
+
+
+def _ror(value, carry):
+    return (carry << 7) | (value >> 1), value & 0x01
+
+
+def _adc(addr):
+    def adc(cpu, idx):
+        M = _read(cpu, idx, addr(cpu, idx))
+        A = cpu.A[idx]
+        c = cpu.c[idx]
+        low = (A & 0x0F) + (M & 0x0F) + c
+        low = np.where(low > 0x09, low + 0x06, low)
+        decimal = low + (A & 0xF0) + (M & 0xF0)
+        decimal = np.where(decimal > 0x99, decimal + 0x60, decimal)
+        result = np.where(cpu.d[idx] == 1, decimal, A + M + c)
+        cpu.v[idx] = (~(A ^ M) & (A ^ result) & 0x80) != 0
+        cpu.c[idx] = result > 0xFF
+        value = result & 0xFF
+        cpu.A[idx] = value
+        _nz(cpu, idx, value)
+
+    return adc
+
+
+def _sbc(addr):
+    def sbc(cpu, idx):
+        M = _read(cpu, idx, addr(cpu, idx))
+        A = cpu.A[idx]
+        c = cpu.c[idx]
+        binary = A + ~M + c
+
+        low = (A & 0x0F) - (M & 0x0F) - (1 - c)
+        borrow = np.where(low < 0, 0x10, 0)
+        low = np.where(low < 0, (low - 0x06) & 0x0F, low)
+        high = (A & 0xF0) - (M & 0xF0) - borrow
+        decimal_carry = high >= 0
+        high = np.where(high < 0, (high - 0x60) & 0xF0, high)
+        decimal = (high | low) & 0xFF
+
+        is_decimal = cpu.d[idx] == 1
+        result = np.where(is_decimal, decimal, binary)
+        cpu.c[idx] = np.where(is_decimal, decimal_carry, binary >= 0)
+        cpu.v[idx] = ((A ^ M) & (A ^ result) & 0x80) != 0
+        value = result & 0xFF
+        cpu.A[idx] = value
+        _nz(cpu, idx, value)
+
+    return sbc
+
+
+def _brk(addr):
+    def brk(cpu, idx):
+        ret = (cpu.PC[idx] + 1) & 0xFFFF
+        _push(cpu, idx, ret >> 8)
+        _push(cpu, idx, ret & 0xFF)
+        _push(cpu, idx, cpu.status(idx) | 0x18)
+        cpu.PC[idx] = (_read(cpu, idx, 0xFFFF) << 8) | _read(cpu, idx, 0xFFFE)
+
+    return brk
+
+
+def _rti(addr):
+    def rti(cpu, idx):
+        cpu.set_status(idx, _pop(cpu, idx) & 0xE7)
+        ll = _pop(cpu, idx)
+        hh = _pop(cpu, idx)
+        cpu.PC[idx] = (hh << 8) | ll
+
+    return rti
+
+
+operations = {
+    i.LDA: _load("A"),
+    i.LDX: _load("X"),
+    i.LDY: _load("Y"),
+    i.STA: _store("A"),
+    i.STX: _store("X"),
+    i.STY: _store("Y"),
+    i.TAX: _transfer("A", "X"),
+    i.TAY: _transfer("A", "Y"),
+    i.TSX: _transfer("S", "X"),
+    i.TXA: _transfer("X", "A"),
+    i.TXS: _transfer("X", "S", flags=False),
+    i.TYA: _transfer("Y", "A"),
+    i.NOP: _nop,
+    i.CLC: _flag("c", 0),
+    i.CLD: _flag("d", 0),
+    i.CLI: _flag("i", 0),
+    i.CLV: _flag("v", 0),
+    i.SEC: _flag("c", 1),
+    i.SED: _flag("d", 1),
+    i.SEI: _flag("i", 1),
+    i.INX: _step_register("X", 1),
+    i.INY: _step_register("Y", 1),
+    i.DEX: _step_register("X", -1),
+    i.DEY: _step_register("Y", -1),
+    i.DEC: _step_memory(-1),
+    i.INC: _step_memory(1),
+    i.CMP: _compare("A"),
+    i.CPX: _compare("X"),
+    i.CPY: _compare("Y"),
+    i.JMP: _jmp,
+    i.BEQ: _branch("z", 1),
+    i.BNE: _branch("z", 0),
+    i.BMI: _branch("n", 1),
+    i.BPL: _branch("n", 0),
+    i.BCS: _branch("c", 1),
+    i.BCC: _branch("c", 0),
+    i.BVC: _branch("v", 0),
+    i.BVS: _branch("v", 1),
+    i.AND: _logic(lambda a, b: a & b),
+    i.ORA: _logic(lambda a, b: a | b),
+    i.EOR: _logic(lambda a, b: a ^ b),
+    i.PHA: _pha,
+    i.PLA: _pla,
+    i.PHP: _php,
+    i.PLP: _plp,
+    i.JSR: _jsr,
+    i.RTS: _rts,
+    i.BIT: _bit,
+    i.ASL: _shift(_asl),
+    i.LSR: _shift(_lsr),
+    i.ROL: _shift(_rol),
+    i.ROR: _shift(_ror),
+    i.ADC: _adc,
+    i.SBC: _sbc,
+    i.BRK: _brk,
+    i.RTI: _rti,
+}
+
+
+def _unknown(cpu, idx):
+    # The scalar engines raise, here only the offending machines halt
+    cpu.halted[idx] = True
+
+
+def build_vector_table() -> List[VectorHandler]:
+    table: List[VectorHandler] = []
+    for entry in opcodes:
+        if entry is None:
+            table.append(_unknown)
+        elif entry.page_penalty:
+            table.append(operations[entry.instruction](read_modes[entry.mode]))
+        else:
+            table.append(operations[entry.instruction](modes[entry.mode]))
+    return table
+
+
+vector_table = build_vector_table()
+
+
+class VectorCPU:
+    # N machines in lockstep. Registers and flags are int64 arrays of already
+    # masked values, the same layout as the slots of CPU.
+    def __init__(self, count, image=None):
+        self.count = count
+        self.memory = np.zeros((count, 0x10000), dtype=np.uint8)
+        if image is not None:
+            self.memory[:, : len(image)] = np.frombuffer(bytes(image), dtype=np.uint8)
+        zeros = lambda: np.zeros(count, dtype=np.int64)  # noqa: E731
+        self.A = zeros()
+        self.X = zeros()
+        self.Y = zeros()
+        self.S = np.full(count, 0xFF, dtype=np.int64)
+        self.PC = zeros()
+        self.n = zeros()
+        self.v = zeros()
+        self.d = zeros()
+        self.i = zeros()
+        self.z = zeros()
+        self.c = zeros()
+        self._flags = zeros()
+        self.cycles = zeros()
+        self.instructions = zeros()  # executed per machine
+        self.halted = np.zeros(count, dtype=bool)  # hit an unknown opcode
+
+    @classmethod
+    def from_cpu(cls, cpu, count):
+        # count copies of a scalar CPU with plain RAM
+        vector = cls(count, cpu.bus.ram)
+        for name in ("A", "X", "Y", "S", "PC", "cycles"):
+            getattr(vector, name)[:] = getattr(cpu, name)
+        vector.P = cpu.P
+        return vector
+
+    def cpu(self, index) -> CPU:
+        # Scalar copy of one machine
+        cpu = CPU(Bus(RAM(bytearray(self.memory[index].tobytes()))))
+        cpu.A = int(self.A[index])
+        cpu.X = int(self.X[index])
+        cpu.Y = int(self.Y[index])
+        cpu.S = int(self.S[index])
+        cpu.P = int(self.status(index))
+        cpu.PC = int(self.PC[index])
+        cpu.cycles = int(self.cycles[index])
+        return cpu
+
+    def status(self, idx):
+        return (
+            self.n[idx] << 7
+            | self.v[idx] << 6
+            | self._flags[idx]
+            | self.d[idx] << 3
+            | self.i[idx] << 2
+            | self.z[idx] << 1
+            | self.c[idx]
+        )
+
+    def set_status(self, idx, value):
+        self.n[idx] = (value >> 7) & 0x01
+        self.v[idx] = (value >> 6) & 0x01
+        self._flags[idx] = value & 0x30
+        self.d[idx] = (value >> 3) & 0x01
+        self.i[idx] = (value >> 2) & 0x01
+        self.z[idx] = (value >> 1) & 0x01
+        self.c[idx] = value & 0x01
+
+    @property
+    def P(self):
+        return self.status(slice(None))
+
+    @P.setter
+    def P(self, value):
+        self.set_status(slice(None), np.asarray(value, dtype=np.int64))
+
+    def _execute(self, rows):
+        # One instruction on each machine in rows
+        pc = self.PC[rows]
+        ops = self.memory[rows, pc]
+        self.PC[rows] = (pc + 1) & 0xFFFF
+        self.cycles[rows] += _timing[ops]
+        self.instructions[rows] += 1
+
+        first = ops[0]
+        if (ops == first).all():
+            # Machines still in step, no grouping needed
+            vector_table[first](self, rows)
+            return
+        order = np.argsort(ops, kind="stable")
+        ops = ops[order]
+        rows = rows[order]
+        starts = np.flatnonzero(np.diff(ops)) + 1
+        table = vector_table
+        for group, op in zip(np.split(rows, starts), ops[np.r_[0, starts]]):
+            table[op](self, group)
+
+    def step(self, count=1):
+        # Lockstep steps, halted machines stay where they are
+        for _ in range(count):
+            rows = np.flatnonzero(~self.halted)
+            if not len(rows):
+                break
+            self._execute(rows)
+
+    def run_until(self, pc, instructions):
+        # Run each machine until it reaches pc, halts or has used its share of
+        # the instruction budget. Returns the mask of machines that reached pc.
+        done = np.zeros(self.count, dtype=bool)
+        for _ in range(instructions):
+            rows = np.flatnonzero(~(done | self.halted))
+            if not len(rows):
+                break
+            self._execute(rows)
+            done[rows] = self.PC[rows] == pc
+        return done
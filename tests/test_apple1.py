@@ -0,0 +1,160 @@
+import io
+import queue
+import time
+from collections import deque
+
+import pytest
+from src.apple1 import CLOCK_HZ, DSP, KBD, KBDCR, AppleI, InputReader, parse_woz_hex
+
+
+def boot():
+    output = []
+    machine = AppleI(output.append)
+    machine.cpu.run_until(instructions=1000)
+    return machine, output
+
+
+def type_line(machine, line):
+    for c in line:
+        machine.pia.send_key(ord(c))
+    machine.pia.send_key(0x0D)
+    machine.cpu.run_until(instructions=20000)
+
+
+def test_boot():
+    machine, output = boot()
+    assert "".join(output).endswith("\\\n")
+
+
+def test_examine():
+    machine, output = boot()
+    output.clear()
+    type_line(machine, "FF00.FF07")
+    assert "".join(output) == "FF00.FF07\n\nFF00: D8 58 A0 7F 8C 12 D0 A9\n"
+
+
+def test_store():
+    machine, output = boot()
+    type_line(machine, "0300: AA 55")
+    assert machine.memory[0x0300] == 0xAA
+    assert machine.memory[0x0301] == 0x55
+
+
+def test_pia():
+    output = []
+    machine = AppleI(output.append)
+    bus = machine.bus
+
+    assert bus.read(KBDCR) == 0
+    machine.pia.send_key(ord("A"))
+    assert bus.read(KBDCR) == 0x80
+    assert bus.read(KBD) == ord("A") | 0x80
+    assert bus.read(KBDCR) == 0
+
+    bus.write(DSP, ord("B") | 0x80)
+    assert output == ["B"]
+
+    # ROM is read-only, RAM on the device page is not
+    bus.write(0xFF00, 0x00)
+    assert bus.read(0xFF00) == 0xD8
+    bus.write(0xD000, 0x12)
+    assert bus.read(0xD000) == 0x12
+
+
+def test_run_batches():
+    output = []
+    reader = InputReader(io.StringIO("FF00.FF07\n"))
+
+    def display(text):
+        output.append(text)
+        # Quit once the examined line has been printed
+        if "".join(output).endswith("FF00: D8 58 A0 7F 8C 12 D0 A9\n"):
+            reader.keys.put("q")
+
+    machine = AppleI(display)
+    assert machine.run(reader.start(), batch=500) == "q"
+    assert "".join(output).endswith("FF00.FF07\n\nFF00: D8 58 A0 7F 8C 12 D0 A9\n")
+
+
+def test_input_reader():
+    reader = InputReader(io.StringIO("AB\n")).start()
+    reader.thread.join(timeout=1)
+    assert reader.finished()
+    assert [reader.keys.get_nowait() for _ in range(3)] == ["A", "B", "\n"]
+    assert reader.keys.empty()
+
+
+def test_run_until_input_ends():
+    # The monitor handles the whole input before run() returns
+    output = []
+    machine = AppleI(output.append)
+    assert machine.run(InputReader(io.StringIO("FF00.FF07\n")).start()) is None
+    assert "".join(output).endswith("FF00.FF07\n\nFF00: D8 58 A0 7F 8C 12 D0 A9\n")
+    assert machine.idle()
+
+
+PROGRAM = """0300: A9 C1 20 EF FF
+: 4C 05 03
+0300.0307
+0300 R
+"""
+
+
+def test_parse_woz_hex():
+    program = parse_woz_hex(PROGRAM + "0400: 01\n0401: 02 03\n")
+    assert program.segments == [
+        (0x0300, bytes([0xA9, 0xC1, 0x20, 0xEF, 0xFF, 0x4C, 0x05, 0x03])),
+        (0x0400, bytes([0x01, 0x02, 0x03])),
+    ]
+    assert program.run == 0x0300
+
+
+def test_parse_woz_hex_error():
+    with pytest.raises(ValueError, match="Line 2"):
+        parse_woz_hex("0300: 01\n0301: XY\n")
+    with pytest.raises(ValueError, match="Line 1"):
+        parse_woz_hex(": 01\n")
+
+
+def test_paste():
+    machine, output = boot()
+    machine.paste(PROGRAM)
+    assert isinstance(machine.pia.keys, deque)
+    machine.cpu.run_until(instructions=50000)
+    # Prints A from the program, then spins in its JMP loop
+    assert machine.memory[0x0305] == 0x4C
+    assert "".join(output).endswith("0300 R\n\n0300: A9A")
+    assert machine.cpu.PC == 0x0305
+
+
+def test_load_direct():
+    machine, output = boot()
+    assert machine.load(PROGRAM + "FF00: 00\n") == 0x0300
+    assert machine.memory[0x0300:0x0308] == bytes(
+        [0xA9, 0xC1, 0x20, 0xEF, 0xFF, 0x4C, 0x05, 0x03]
+    )
+    # The ROM stays read-only
+    assert machine.memory[0xFF00] == 0xD8
+
+
+class SlowInput(io.StringIO):
+    # Input that arrives after a delay, like a user typing
+    def read(self, size=-1):
+        time.sleep(0.2)
+        return super().read(size)
+
+
+def test_idle_sleep():
+    # Waiting for input blocks the host and moves the clock on instead
+    output = []
+    machine = AppleI(output.append)
+    reader = InputReader(SlowInput("FF00.FF07\n")).start()
+    wall = time.perf_counter()
+    process = time.process_time()
+    assert machine.run(reader) is None
+    wall = time.perf_counter() - wall
+    process = time.process_time() - process
+    assert "".join(output).endswith("FF00: D8 58 A0 7F 8C 12 D0 A9\n")
+    assert wall > 2
+    assert process < wall / 2
+    assert machine.cpu.cycles > 0.8 * wall * CLOCK_HZ
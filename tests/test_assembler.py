@@ -0,0 +1,134 @@
+import pytest
+from src import assembler
+from src.assembler import assemble, evaluate
+from src.instructions import format_instruction, m, opcodes
+from src.model import CPU, Bus, RAM, StopReason
+
+
+@pytest.mark.parametrize(
+    "entry", [entry for entry in opcodes if entry], ids=lambda entry: f"{entry.opcode:02x}"
+)
+def test_every_opcode(entry):
+    # Operands that only fit the addressing mode of the opcode
+    operand = bytes([0x34, 0x12])[: entry.length - 1]
+    if entry.mode == m.REL:
+        operand = bytes([0xFB])
+    text = format_instruction(entry, operand, 0x0200)
+    program = assemble(f".org $0200\n{text}\n")
+    assert program.segments == [(0x0200, bytes([entry.opcode]) + operand)]
+
+
+def test_labels_and_directives():
+    program = assemble(
+        """
+        CHAR = 'A'      ; constants can be used before their definition
+        .org $0300
+start:  LDX #3
+loop:   DEX
+        BNE loop
+        LDA #<msg
+        LDY #>msg
+        STA table,X
+        LDA (ptr),Y
+        LDA zp          ; defined later, so absolute
+        LDA $30         ; zero page
+        JMP (vec)
+        ASL
+msg:    .byte "HI;", CHAR, 13, -1
+table:  .word start, *, msg+1
+        .org $0400
+        .byte 1 << 4 | 3, (2 + 3) * 4, %1010, ~0 & $FF
+ptr = $20
+vec = $FFFC
+zp = $30
+"""
+    )
+    assert program.symbols["loop"] == 0x0302
+    assert program.symbols["msg"] == 0x0317
+    # fmt: off
+    assert program.segments == [
+        (0x0300, bytes([
+            0xA2, 0x03,         # LDX #3
+            0xCA,               # DEX
+            0xD0, 0xFD,         # BNE loop
+            0xA9, 0x17,         # LDA #<msg
+            0xA0, 0x03,         # LDY #>msg
+            0x9D, 0x1D, 0x03,   # STA table,X
+            0xB1, 0x20,         # LDA (ptr),Y
+            0xAD, 0x30, 0x00,   # LDA zp
+            0xA5, 0x30,         # LDA $30
+            0x6C, 0xFC, 0xFF,   # JMP (vec)
+            0x0A,               # ASL
+            0x48, 0x49, 0x3B, 0x41, 0x0D, 0xFF,
+            0x00, 0x03, 0x1D, 0x03, 0x18, 0x03,
+        ])),
+        (0x0400, bytes([0x13, 0x14, 0x0A, 0xFF])),
+    ]
+    # fmt: on
+    assert program.image()[:3] == bytes([0xA2, 0x03, 0xCA])
+    assert len(program.image()) == 0x104
+
+
+def test_evaluate():
+    symbols = {"A1": 0x1234}
+    assert evaluate("A1 + 2 * 3", symbols, 0) == 0x123A
+    assert evaluate(">A1", symbols, 0) == 0x12
+    assert evaluate("<(A1 + 1)", symbols, 0) == 0x35
+    assert evaluate("* - 2", symbols, 0x0300) == 0x02FE
+    assert evaluate("-1", symbols, 0) == -1
+
+
+@pytest.mark.parametrize(
+    "source, message",
+    [
+        ("LDA missing", "Line 1: Undefined symbol missing"),
+        ("NOP\nFOO", "Line 2: Unknown instruction FOO"),
+        ("loop: NOP\n.byte 0\nloop: NOP", "Line 3: Symbol loop already defined"),
+        ("STA #1", "does not support # addressing"),
+        ("LDA #$100", "does not fit in a byte"),
+        (".byte 256", "does not fit in 1 byte"),
+        ("BNE far\n.org $1000\nfar: RTS", "out of range"),
+        ("LDA (1", "Missing )"),
+    ],
+)
+def test_errors(source, message):
+    with pytest.raises(ValueError, match=message.replace("(", r"\(").replace(")", r"\)")):
+        assemble(source)
+
+
+def test_cache():
+    source = "LDA #1\nRTS\n"
+    assert assemble(source) is assemble(source)
+    assert assemble(source, org=0x0200) is not assemble(source)
+    size = len(assembler._cache)
+    assemble(source + "; changed\n")
+    assert len(assembler._cache) == size + 1
+
+
+def test_load_and_run():
+    program = assemble(
+        """
+        .org $0200
+        LDX #0
+copy:   LDA text,X
+        BEQ done
+        STA $0300,X
+        INX
+        BNE copy
+done:   JMP done
+text:   .byte "6502", 0
+"""
+    )
+    ram = bytearray(0x10000)
+    program.load(ram)
+    cpu = CPU(Bus(RAM(ram)))
+    cpu.PC = program.start
+    result = cpu.run_until(pc=program.symbols["done"], instructions=1000)
+    assert result.reason == StopReason.PC
+    assert ram[0x0300:0x0304] == b"6502"
+
+
+def test_example_programs():
+    with open("asm/test2.s") as f:
+        program = assemble(f.read())
+    assert program.segments == [(0, bytes([0xA9, 0x01, 0xAA, 0xCA, 0xCA]))]
@@ -0,0 +1,20 @@
+import pytest
+from src.benchmark import engines, run, workloads
+
+
+@pytest.mark.parametrize("engine", list(engines))
+@pytest.mark.parametrize("name", list(workloads))
+def test_benchmark_workload(name, engine):
+    result = run(name, engine, 1)
+    assert result.workload == name
+    assert result.engine == engine
+    assert result.instructions > 0
+    assert result.cycles > result.instructions
+    assert result.wall_time > 0
+    assert result.peak_rss_kb > 0
+
+
+@pytest.mark.parametrize("name", list(workloads))
+def test_benchmark_engines_agree(name):
+    results = [run(name, engine, 2) for engine in engines]
+    assert len({(r.instructions, r.cycles) for r in results}) == 1
@@ -1,7 +1,17 @@
+import io
+import sys
+
 import pytest
+from src import model
 from src.model import CPU, Bus, Memory
 
 
+@pytest.fixture(autouse=True, params=["Memory", "RAM"])
+def memory_backend(request, monkeypatch):
+    # Run every test against both the printing and the quiet memory backend
+    monkeypatch.setattr(sys.modules[__name__], "Memory", getattr(model, request.param))
+
+
 def test_registers():
     cpu = CPU()
 
@@ -2429,3 +2439,164 @@ def test_BRK_RTI():
     cpu.step()  # STA $0201
     assert mem[0x0201] == 0x34, "Memory at $0201 should be set to $34"
 
+
+
+def test_TracedRAM():
+    trace = model.ListTrace()
+    memory = model.TracedRAM([0xA9, 0x01, 0x85, 0x04, 0x00], trace)
+    cpu = CPU(Bus(memory))
+
+    cpu.step(2)
+    assert trace.entries == [
+        ("R", 0x0000, 0xA9),
+        ("R", 0x0001, 0x01),
+        ("R", 0x0002, 0x85),
+        ("R", 0x0003, 0x04),
+        ("W", 0x0004, 0x01),
+    ]
+
+
+def test_FileTrace(tmp_path):
+    path = tmp_path / "trace.txt"
+    trace = model.FileTrace(open(path, "w"), buffer_size=2)
+    memory = model.TracedRAM([0xA9, 0x01, 0x85, 0x04, 0x00], trace)
+    cpu = CPU(Bus(memory))
+
+    cpu.step(2)
+    trace.close()
+    assert path.read_text().splitlines() == [
+        "R 0x0000: a9",
+        "R 0x0001: 1",
+        "R 0x0002: 85",
+        "R 0x0003: 4",
+        "W 0x0004: 1",
+    ]
+
+
+def test_cycles():
+    program = [
+        0xA2, 0x01,        # LDX #$01     2 cycles
+        0xBD, 0x00, 0x02,  # LDA $0200,X  4 cycles
+        0xBD, 0xFF, 0x02,  # LDA $02FF,X  5 cycles, page crossed
+        0x9D, 0xFF, 0x02,  # STA $02FF,X  5 cycles, no penalty for writes
+        0xF0, 0x00,        # BEQ +0       2 cycles, not taken
+        0xD0, 0x00,        # BNE +0       3 cycles, taken
+        0x00,              # BRK          7 cycles
+    ]
+    mem = Memory(program + [0x01] * (0x10000 - len(program)))
+    cpu = CPU(Bus(mem))
+
+    expected = [2, 6, 11, 16, 18, 21, 28]
+    for total in expected:
+        cpu.step()
+        assert cpu.cycles == total
+
+
+def test_cycles_branch_page_crossing():
+    mem = Memory([0xEA] * 0x100 + [0x18, 0x90, 0x7F] + [0xEA] * 0x100)
+    cpu = CPU(Bus(mem))
+    cpu.PC = 0x0100
+
+    cpu.step()  # CLC
+    cpu.step()  # BCC +127 from $0103 -> $0182, same page
+    assert cpu.PC == 0x0182
+    assert cpu.cycles == 5
+
+    mem.data[0x0183] = 0x90  # BCC -128 from $0185 -> $0105, same page
+    mem.data[0x0184] = 0x80
+    cpu.PC = 0x0183
+    cpu.step()
+    assert cpu.PC == 0x0105
+    assert cpu.cycles == 8
+
+    mem.data[0x0105] = 0x90  # BCC -128 from $0107 -> $0087, page crossed
+    mem.data[0x0106] = 0x80
+    cpu.step()
+    assert cpu.PC == 0x0087
+    assert cpu.cycles == 12
+
+
+def test_snapshot_restore(tmp_path):
+    program = [
+        0xA9, 0x12,        # LDA #$12
+        0x8D, 0x00, 0x02,  # STA $0200
+        0x38,              # SEC
+        0xE8,              # INX
+    ]
+    memory = Memory(program + [0x00] * (0x400 - len(program)))
+    cpu = CPU(Bus(memory))
+    snap = cpu.snapshot()
+
+    cpu.step(4)
+    assert cpu.A == 0x12
+    assert memory.data[0x0200] == 0x12
+    changed = cpu.snapshot()
+
+    data = memory.data
+    cpu.restore(snap)
+    assert memory.data is data
+    assert (cpu.A, cpu.X, cpu.c, cpu.PC, cpu.cycles) == (0, 0, 0, 0, 0)
+    assert memory.data[0x0200] == 0x00
+
+    path = tmp_path / "machine.snap"
+    model.save_snapshot(path, changed)
+    cpu.restore(model.load_snapshot(path))
+    assert (cpu.A, cpu.X, cpu.c, cpu.PC, cpu.cycles) == (0x12, 1, 1, 7, 10)
+    assert memory.data[0x0200] == 0x12
+    assert cpu.snapshot() == changed
+
+    with pytest.raises(ValueError):
+        cpu.restore(changed[:-1])
+
+
+def test_flight_recorder():
+    program = [
+        0xA2, 0x03,        # LDX #$03
+        0xCA,              # DEX
+        0xD0, 0xFD,        # BNE $0002
+        0x02,              # unknown opcode
+    ]
+    cpu = CPU(Bus(Memory(program)))
+    output = io.StringIO()
+    cpu.recorder = model.FlightRecorder(size=4, file=output)
+
+    with pytest.raises(NotImplementedError):
+        cpu.step(10)
+
+    recorder = cpu.recorder
+    assert recorder.count == 8
+    assert [entry[0] for entry in recorder.entries()] == [0x0003, 0x0002, 0x0003, 0x0005]
+    pc, a, x, y, s, p = recorder.entries()[-1]
+    assert (pc, x, s, p) == (0x0005, 0x00, 0xFF, 0x02)
+
+    lines = output.getvalue().splitlines()
+    assert lines[0] == "Last 4 of 8 instructions:"
+    assert lines[1] == "0003  D0 FD     BNE $0002     A:00 X:01 Y:00 S:FF P:00"
+    assert lines[2].startswith("0002  CA        DEX")
+    assert lines[4].startswith("0005  02        ???")
+    assert len(lines) == 5
+
+
+def test_flight_recorder_run_until():
+    cpu = CPU(Bus(Memory([0xEA, 0xEA, 0x02])))
+    output = io.StringIO()
+    cpu.recorder = model.FlightRecorder(file=output)
+
+    with pytest.raises(NotImplementedError):
+        cpu.run_until(instructions=10)
+    assert cpu.recorder.count == 3
+    assert output.getvalue().splitlines()[-1].startswith("0002  02        ???")
+
+
+def test_flight_recorder_outside_memory():
+    # Running off the end of a short memory must still dump the recorder
+    cpu = CPU(Bus(Memory([0xEA])))
+    output = io.StringIO()
+    cpu.recorder = model.FlightRecorder(file=output)
+
+    with pytest.raises(IndexError):
+        cpu.step(2)
+    lines = output.getvalue().splitlines()
+    assert lines[0] == "Last 2 of 2 instructions:"
+    assert lines[1].startswith("0000  EA        NOP")
+    assert lines[2].startswith("0001  ??        ???")
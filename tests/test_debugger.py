@@ -0,0 +1,110 @@
+import pytest
+from src.apple1 import KBDCR, AppleI
+from src.assembler import assemble
+from src.debugger import Debugger, format_hit, parse_breakpoint, parse_range
+from src.model import CPU, Access, Bus, Hit, RAM, StopReason
+
+SOURCE = """
+        .org $0200
+        LDX #5
+loop:   STX $10
+        LDA table,X
+        DEX
+        BNE loop
+done:   JMP done
+table:  .byte 0, 1, 2, 3, 4, 5
+"""
+
+
+def make_cpu():
+    program = assemble(SOURCE)
+    ram = bytearray(0x10000)
+    program.load(ram)
+    cpu = CPU(Bus(RAM(ram)))
+    cpu.PC = program.start
+    return cpu, program.symbols
+
+
+def test_nothing_set():
+    # Without breakpoints the run is CPU.run_until() and the bus is untouched
+    cpu, symbols = make_cpu()
+    expected = make_cpu()[0].run_until(pc=symbols["done"])
+    debugger = Debugger(cpu)
+    pages = list(cpu.bus.read_pages), list(cpu.bus.write_pages)
+    assert debugger.run_until(pc=symbols["done"]) == expected
+    assert (cpu.bus.read_pages, cpu.bus.write_pages) == pages
+
+
+def test_breakpoint():
+    cpu, symbols = make_cpu()
+    debugger = Debugger(cpu)
+    loop = symbols["loop"]
+    debugger.break_at(loop)
+    result = debugger.run_until(pc=symbols["done"])
+    assert result.reason == StopReason.BREAKPOINT
+    assert result.hit == Hit(Access.EXECUTE, loop, None, loop)
+    assert (cpu.PC, cpu.X, result.instructions) == (loop, 5, 1)
+    # Resuming steps over the breakpoint it stopped at
+    result = debugger.run_until(pc=symbols["done"])
+    assert (result.reason, cpu.X, result.instructions) == (StopReason.BREAKPOINT, 4, 4)
+    debugger.clear(loop)
+    assert debugger.run_until(pc=symbols["done"]).reason == StopReason.PC
+
+
+def test_conditional_breakpoint():
+    cpu, symbols = make_cpu()
+    debugger = Debugger(cpu)
+    debugger.break_at(symbols["loop"], "X == 2 and mem[0x10] == 3")
+    result = debugger.run_until(pc=symbols["done"])
+    assert result.reason == StopReason.BREAKPOINT
+    assert cpu.X == 2
+    # Without a condition it stops every time again
+    debugger.break_at(symbols["loop"])
+    assert debugger.step(10).reason == StopReason.BREAKPOINT
+    assert cpu.X == 1
+    with pytest.raises(ValueError, match="Invalid condition"):
+        debugger.break_at(0x0200, "X ==")
+
+
+def test_watchpoints():
+    cpu, symbols = make_cpu()
+    debugger = Debugger(cpu)
+    table = symbols["table"]
+    debugger.watch(0x10)
+    debugger.watch(table + 3, table + 4, read=True, write=False)
+    result = debugger.run_until(pc=symbols["done"])
+    assert result.reason == StopReason.WATCHPOINT
+    # Stops after the instruction that wrote
+    assert result.hit == Hit(Access.WRITE, 0x10, 5, symbols["loop"])
+    assert cpu.PC == symbols["loop"] + 2
+    debugger.unwatch(0x10)
+    result = debugger.run_until(pc=symbols["done"])
+    assert result.hit == Hit(Access.READ, table + 4, 4, symbols["loop"] + 2)
+    assert "Read of $04 at $" in format_hit(result.hit)
+    debugger.unwatch(0, 0xFFFF)
+    assert debugger.watches == {}
+    assert cpu.bus.read_pages == [None] * 0x100
+    assert debugger.run_until(pc=symbols["done"]).reason == StopReason.PC
+    assert cpu.bus.ram[0x10] == 1
+
+
+def test_watch_device_page():
+    # Accesses still reach the device behind the watch
+    output = []
+    machine = AppleI(output.append)
+    debugger = Debugger(machine.cpu)
+    debugger.watch(KBDCR, read=True, write=False)
+    machine.cpu.run_until(instructions=1000)
+    machine.pia.send_key(ord("A"))
+    result = debugger.run_until(instructions=1000)
+    assert result.reason == StopReason.WATCHPOINT
+    assert result.hit.value == 0x80
+    debugger.run_until(instructions=1000)
+    assert "".join(output).endswith("\\\nA")
+
+
+def test_parse():
+    assert parse_breakpoint("0203") == (0x0203, None)
+    assert parse_breakpoint("ff29:A == 0x8D") == (0xFF29, "A == 0x8D")
+    assert parse_range("10") == (0x10, 0x10)
+    assert parse_range("0200-02ff") == (0x0200, 0x02FF)
@@ -0,0 +1,155 @@
+import io
+import random
+
+import pytest
+from src import disassembler
+from src.apple1 import WOZMON, AppleI
+from src.disassembler import (
+    ca65_chunks,
+    disassemble,
+    disassemble_code,
+    follow,
+    hex_chunks,
+    loaded_mask,
+    open_chunks,
+    starts_python,
+    sweep,
+    vectors,
+)
+from src.translate import Translator
+
+# fmt: off
+PROGRAM = bytes([
+    0xA2, 0x03,        # LDX #$03
+    0xCA,              # DEX
+    0xD0, 0xFD,        # BNE $0002
+    0x4C, 0x00, 0x02,  # JMP $0200
+    0x02,              # unknown opcode
+    0xAD, 0x11,        # LDA abs, cut short
+])
+# fmt: on
+
+
+def test_disassemble():
+    lines = list(disassemble([PROGRAM], 0x0200))
+    assert lines == [
+        "0200  A2 03     LDX #$03\n",
+        "0202  CA        DEX\n",
+        "0203  D0 FD     BNE $0202\n",
+        "0205  4C 00 02  JMP $0200\n",
+        "0208  02        ???\n",
+        "0209  AD 11     ???\n",
+    ]
+
+
+def test_disassemble_python():
+    text = "".join(disassemble([PROGRAM[:3], PROGRAM[8:]], python=True))
+    assert text.splitlines(keepends=True) == [
+        "0XA2, 0X03,         # LDX, IMM\n",
+        "0XCA,               # DEX, IMPL\n",
+        "0X02,               # ???\n",
+        "0XAD,               # ???\n",
+        "0X11,               # ???\n",
+    ]
+
+
+def test_sweep_across_chunks():
+    # Instructions cut by a chunk boundary are carried over to the next chunk
+    chunks = [PROGRAM[n : n + 2] for n in range(0, len(PROGRAM), 2)]
+    assert list(sweep(chunks, 0x0200)) == list(sweep([PROGRAM], 0x0200))
+
+
+@pytest.mark.skipif(disassembler.np is None, reason="NumPy not installed")
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 100, 0x10000])
+def test_starts_numpy(size):
+    rng = random.Random(size)
+    data = bytes(rng.randrange(256) for _ in range(size))
+    assert disassembler.starts_numpy(data) == starts_python(data)
+
+
+def test_hex_chunks():
+    lines = [b"0xA2, 0x03, 0xCA\n", b"D0,FD,\n", b"\n"]
+    assert b"".join(hex_chunks(lines)) == PROGRAM[:5]
+
+
+def test_ca65_chunks():
+    listing = [
+        b"ca65 V2.19 - Git 8f9a37b\n",
+        b"Main file   : test.s\n",
+        b"\n",
+        b'000000r 1                       .segment "CODE"\n',
+        b"000000r 1  A2 03                ldx     #$03\n",
+        b"000002r 1  CA               loop:   dex\n",
+        b"000003r 1  20 rr rr                 jsr     print\n",
+        b"000006r 1  01 02 03 04              .byte   1, 2, 3, 4, 5\n",
+        b"00000Ar 1  05\n",
+    ]
+    assert b"".join(ca65_chunks(listing)) == bytes(
+        [0xA2, 0x03, 0xCA, 0x20, 0x00, 0x00, 1, 2, 3, 4, 5]
+    )
+
+
+def test_open_chunks():
+    text = io.BytesIO(b"0xA2, 0x03,\n0xCA\n")
+    assert b"".join(open_chunks(text)) == PROGRAM[:3]
+    binary = io.BytesIO(PROGRAM)
+    assert b"".join(open_chunks(binary)) == PROGRAM
+    # A binary that happens to look like hex text can be forced
+    assert b"".join(open_chunks(io.BytesIO(b"CA"), kind="bin")) == b"CA"
+
+
+def woz_memory():
+    memory = bytearray(0x10000)
+    memory[0xFF00:] = WOZMON
+    return memory, loaded_mask([(0xFF00, 0x10000)])
+
+
+def test_follow_wozmon():
+    memory, loaded = woz_memory()
+    assert vectors(memory) == [0xFF00, 0x0F00, 0x0000]
+    code_map = follow(memory, vectors(memory), loaded)
+    # The NMI and IRQ vectors point outside the ROM
+    assert code_map.entries == [0xFF00]
+    assert code_map.calls == {0xFFDC, 0xFFE5, 0xFFEF}
+    assert 0xFF29 in code_map and 0xFF2A not in code_map
+    # Everything but the bytes before and in the vector table is code
+    assert sum(code_map.code) == 0xF8
+    assert code_map.symbols()["sub_FFEF"] == 0xFFEF
+    assert code_map.symbols()["entry_FF00"] == 0xFF00
+
+    lines = list(disassemble_code(memory, code_map, 0xFF00, 0x10000))
+    assert lines[0] == "FF00  D8        CLD\n"
+    assert lines[-2] == "FFF7  60        RTS\n"
+    assert lines[-1] == "FFF8            .byte $00, $00, $00, $0F, $00, $FF, $00, $00\n"
+
+
+def test_follow_data_after_jump():
+    # fmt: off
+    program = bytes([
+        0xA2, 0x03,        # LDX #$03
+        0x20, 0x08, 0x02,  # JSR $0208
+        0x4C, 0x00, 0x02,  # JMP $0200
+        0xCA,              # DEX
+        0xD0, 0x01,        # BNE $020C
+        0x60,              # RTS
+        0x60,              # RTS
+        0xFF, 0x41,        # data
+    ])
+    # fmt: on
+    memory = bytearray(0x10000)
+    memory[0x0200 : 0x0200 + len(program)] = program
+    loaded = loaded_mask([(0x0200, 0x0200 + len(program))])
+    code_map = follow(memory, [0x0200], loaded)
+    assert code_map.instructions() == [0x0200, 0x0202, 0x0205, 0x0208, 0x0209, 0x020B, 0x020C]
+    assert code_map.blocks() == [0x0200, 0x0205, 0x0208, 0x020B, 0x020C]
+    lines = list(disassemble_code(memory, code_map, 0x0200, 0x0200 + len(program)))
+    assert lines[-1] == "020D            .byte $FF, $41\n"
+
+
+def test_translator_prepare():
+    memory, loaded = woz_memory()
+    code_map = follow(memory, [0xFF00], loaded)
+    machine = AppleI(lambda text: None)
+    translator = Translator(machine.cpu)
+    translator.prepare(code_map)
+    assert sorted(translator.blocks) == code_map.blocks()
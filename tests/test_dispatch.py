@@ -0,0 +1,127 @@
+import random
+
+import pytest
+from src.dispatch import dispatch_table
+from src.model import CPU, Bus, Memory, RunResult, StopReason
+from tests.data import implemented_opcodes, state
+
+
+def make_cpu(image, registers):
+    cpu = CPU(Bus(Memory(bytearray(image))))
+    cpu.A, cpu.X, cpu.Y, cpu.S, cpu.P, cpu.PC = registers
+    return cpu
+
+
+def test_table_size():
+    assert len(dispatch_table) == 256
+
+
+@pytest.mark.parametrize("opcode", implemented_opcodes())
+def test_dispatch_matches_execute(opcode):
+    rng = random.Random(opcode)
+    for _ in range(20):
+        image = bytearray(rng.randbytes(0x10000))
+        pc = rng.randrange(0x10000)
+        image[pc] = opcode
+        registers = (
+            rng.randrange(256),
+            rng.randrange(256),
+            rng.randrange(256),
+            rng.randrange(256),
+            rng.randrange(256),
+            pc,
+        )
+
+        reference = make_cpu(image, registers)
+        reference.step()
+
+        table = make_cpu(image, registers)
+        table.dispatch()
+
+        assert state(table) == state(reference)
+
+
+def test_dispatch_unknown_opcode():
+    cpu = CPU(Bus(Memory([0x02])))
+
+    with pytest.raises(NotImplementedError):
+        cpu.dispatch()
+
+
+def test_dispatch_program():
+    program = [
+        0xA2, 0x05,        # LDX #$05
+        0xA9, 0x00,        # LDA #$00
+        0x18,              # CLC
+        0x69, 0x03,        # ADC #$03
+        0xCA,              # DEX
+        0xD0, 0xFA,        # BNE -6
+        0x8D, 0x00, 0x02,  # STA $0200
+    ]
+    memory = Memory(program + [0x00] * 0x200)
+    cpu = CPU(Bus(memory))
+
+    cpu.dispatch(3 + 4 * 5)
+    assert cpu.A == 15
+    assert cpu.X == 0
+    assert cpu.PC == 0x000D
+    assert memory[0x0200] == 15
+
+
+def test_run_cycles():
+    program = [
+        0xA9, 0x00,        # LDA #$00     2 cycles
+        0x69, 0x01,        # ADC #$01     2 cycles
+        0x4C, 0x02, 0x00,  # JMP $0002    3 cycles
+    ]
+    cpu = CPU(Bus(Memory(program)))
+
+    assert cpu.run_cycles(10) == 12
+    assert cpu.cycles == 12
+    assert cpu.A == 2
+
+    # Budget is relative to the current count, whole instructions only
+    assert cpu.run_cycles(1) == 2
+    assert cpu.cycles == 14
+
+
+def test_run_until():
+    program = [
+        0xA2, 0x05,        # LDX #$05
+        0xA9, 0x00,        # LDA #$00
+        0x18,              # CLC
+        0x69, 0x03,        # ADC #$03
+        0xCA,              # DEX
+        0xD0, 0xFA,        # BNE -6
+        0x8D, 0x00, 0x02,  # STA $0200
+    ]
+    memory = Memory(program + [0x00] * 0x200)
+    cpu = CPU(Bus(memory))
+
+    result = cpu.run_until(pc=0x000A)
+    assert result == RunResult(StopReason.PC, 22, 2 + 2 + 9 * 5 - 1, 0x000A)
+    assert cpu.A == 15
+
+    result = cpu.run_until(instructions=1)
+    assert result == RunResult(StopReason.INSTRUCTIONS, 1, 4, 0x000D)
+    assert memory[0x0200] == 15
+
+
+def test_run_until_predicate():
+    program = [
+        0xE8,              # INX
+        0x4C, 0x00, 0x00,  # JMP $0000
+    ]
+    cpu = CPU(Bus(Memory(program)))
+
+    result = cpu.run_until(predicate=lambda cpu: cpu.X == 3, cycles=1000)
+    assert result.reason == StopReason.PREDICATE
+    assert result.instructions == 5
+    assert result.pc == 0x0001
+
+    result = cpu.run_until(cycles=10, predicate=lambda cpu: cpu.X == 0)
+    assert result == RunResult(StopReason.CYCLES, 4, 10, 0x0001)
+
+    assert cpu.run_until(cycles=0).instructions == 0
+    with pytest.raises(ValueError):
+        cpu.run_until()
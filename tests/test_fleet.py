@@ -0,0 +1,58 @@
+import hashlib
+
+import pytest
+from src.fleet import Job, run_fleet, run_job
+
+# INX / JMP $0300
+LOOP = bytes([0xE8, 0x4C, 0x00, 0x03])
+
+
+def test_run_job():
+    result = run_job(Job("loop", LOOP, load=0x0300, instructions=7))
+    assert result.reason == "INSTRUCTIONS"
+    assert result.instructions == 7
+    assert result.cycles == 4 * 2 + 3 * 3
+    assert result.registers == (0, 4, 0, 0xFF, 0, 0x0301)
+    assert result.error is None
+
+
+def test_run_job_shared_rom():
+    # JSR $F000 into the ROM, which stores to its own page and returns
+    image = bytes([0x20, 0x00, 0xF0, 0xEA])
+    rom = bytes([0xA9, 0x42, 0x8D, 0x00, 0xF0, 0x60])  # LDA #$42 / STA $F000 / RTS
+    result = run_job(Job("rom", image, pc=0x0003), rom, 0xF000)
+    assert result.reason == "PC"
+    assert result.registers[0] == 0x42
+
+    # The ROM write was ignored, only the return address landed on the stack
+    ram = bytearray(0x10000)
+    ram[0 : len(image)] = image
+    ram[0xF000 : 0xF000 + len(rom)] = rom
+    ram[0x01FE:0x0200] = [0x03, 0x00]
+    assert result.digest == hashlib.sha256(ram).hexdigest()
+
+
+def test_run_job_error():
+    result = run_job(Job("bad", bytes([0xEA, 0x02]), instructions=10))
+    assert result.reason is None
+    assert "NotImplementedError" in result.error
+    assert result.instructions is None and result.cycles is None
+    assert result.registers[5] == 0x0002
+
+
+def test_run_fleet():
+    rom = bytes([0x60])
+    jobs = [
+        Job(f"job{n}", LOOP, load=0x0300, instructions=n + 1) for n in range(8)
+    ]
+    results = list(run_fleet(jobs, rom, 0xFF00, workers=2))
+    assert sorted(r.name for r in results) == sorted(job.name for job in jobs)
+    for result in results:
+        assert result == run_job(
+            jobs[int(result.name[3:])], rom, 0xFF00
+        )._replace(wall_time=result.wall_time)
+
+
+def test_run_fleet_requires_budget():
+    with pytest.raises(ValueError):
+        list(run_fleet([Job("forever", LOOP)]))
@@ -0,0 +1,49 @@
+from src.apple1 import DSP, KBDCR, WOZMON_SYMBOLS, AppleI
+from src.assembler import assemble
+from src.idle import polled_register
+from src.model import CPU, Bus, MemoryDevice, RAM
+
+
+def test_wozmon_loops():
+    machine = AppleI(lambda text: None)
+    cpu = machine.cpu
+    nextchar = WOZMON_SYMBOLS["NEXTCHAR"]
+    # LDA KBDCR / BPL NEXTCHAR, with the PC on either instruction
+    for pc in (nextchar, nextchar + 3):
+        cpu.PC = pc
+        assert polled_register(cpu) == KBDCR
+    # BIT DSP / BMI ECHO waits for the display
+    cpu.PC = WOZMON_SYMBOLS["ECHO"]
+    assert polled_register(cpu) == DSP
+    for pc in (WOZMON_SYMBOLS["RESET"], nextchar + 5, nextchar - 1):
+        cpu.PC = pc
+        assert polled_register(cpu) is None
+
+
+def test_other_loops():
+    program = assemble(
+        """
+        .org $0200
+ram:    LDA $0300
+        BEQ ram
+mapped: LDX $C000
+        BNE mapped
+dev:    LDA $D000
+        CMP #1      ; not a load followed by a branch
+        BNE dev
+poll:   LDY $D000
+        BNE poll
+"""
+    )
+    ram = bytearray(0x10000)
+    program.load(ram)
+    bus = Bus(RAM(ram))
+    bus.map_device(0xC000, 0xC0FF, MemoryDevice(bytearray(0x100)))
+    machine = AppleI(lambda text: None)
+    bus.map_device(0xD000, 0xD0FF, machine.pia)
+    cpu = CPU(bus)
+    for name in ("ram", "mapped", "dev"):
+        cpu.PC = program.symbols[name]
+        assert polled_register(cpu) is None
+    cpu.PC = program.symbols["poll"]
+    assert polled_register(cpu) == 0xD000
@@ -0,0 +1,38 @@
+import pytest
+from src.instructions import Access, decode_standard, i, m, opcodes
+
+
+def test_opcodes():
+    assert len(opcodes) == 256
+    assert len([entry for entry in opcodes if entry]) == 151
+
+    for opcode, entry in enumerate(opcodes):
+        if entry:
+            assert entry.opcode == opcode
+            assert decode_standard(opcode) == (entry.instruction, entry.mode)
+        else:
+            with pytest.raises(NotImplementedError):
+                decode_standard(opcode)
+
+
+def test_opcode_records():
+    assert opcodes[0x45][:3] == (0x45, i.EOR, m.ZPG)
+    assert opcodes[0x44] is None
+    assert opcodes[0x60].mode == m.IMPL
+    assert opcodes[0x60].length == 1
+
+    lda = opcodes[0xBD]  # LDA abs,X
+    assert lda.length == 3
+    assert lda.cycles == 4
+    assert lda.page_penalty == 1
+    assert lda.access == Access.READ
+    assert lda.flags == "NZ"
+
+    sta = opcodes[0x9D]  # STA abs,X
+    assert sta.cycles == 5
+    assert sta.page_penalty == 0
+    assert sta.access == Access.WRITE
+    assert sta.flags == ""
+
+    assert opcodes[0xFE].access == Access.RMW  # INC abs,X
+    assert opcodes[0x0A].access == Access.NONE  # ASL A
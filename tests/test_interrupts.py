@@ -0,0 +1,96 @@
+from src.assembler import assemble
+from src.model import CPU, NMI, Bus, RAM
+from src.translate import Translator
+
+SOURCE = """
+        .org $0200
+main:   CLI
+wait:   JMP wait        ; sleep until an interrupt
+irq:    INC $10
+        RTI
+nmi:    INC $11
+        RTI
+        .org $FFFA
+        .word nmi, main, irq
+"""
+
+
+def make_cpu():
+    program = assemble(SOURCE)
+    ram = bytearray(0x10000)
+    program.load(ram)
+    cpu = CPU(Bus(RAM(ram)))
+    cpu.reset()
+    return cpu, program.symbols
+
+
+def test_no_interrupt():
+    cpu, symbols = make_cpu()
+    cpu.run_until(instructions=100)
+    assert cpu.PC == symbols["wait"]
+    assert cpu.bus.ram[0x10] == 0
+
+
+def test_irq_level_triggered():
+    cpu, symbols = make_cpu()
+    cpu.dispatch(2)
+    cpu.assert_irq()
+    cpu.dispatch()
+    # INC $10 ran with I set and the return address on the stack
+    assert cpu.bus.ram[0x10] == 1
+    assert cpu.i == 1
+    assert cpu.S == 0xFC
+    assert cpu.bus.ram[0x01FE] == symbols["wait"] & 0xFF
+    assert cpu.bus.ram[0x01FD] & 0x10 == 0  # B clear
+    # RTI restores I = 0 and the line is still low, so it is taken again
+    cpu.dispatch(2)
+    assert cpu.bus.ram[0x10] == 2
+    cpu.release_irq()
+    cpu.dispatch(10)
+    assert cpu.bus.ram[0x10] == 2
+    assert cpu.PC == symbols["wait"] and cpu.S == 0xFF
+
+
+def test_irq_masked():
+    cpu, symbols = make_cpu()
+    cpu.i = 1
+    cpu.PC = symbols["wait"]
+    cpu.assert_irq()
+    cpu.step(5)
+    assert cpu.bus.ram[0x10] == 0
+    # Taken as soon as the flag is cleared
+    cpu.i = 0
+    cpu.step(1)
+    assert cpu.bus.ram[0x10] == 1
+
+
+def test_irq_lines():
+    cpu, symbols = make_cpu()
+    cpu.assert_irq(1)
+    cpu.assert_irq(2)
+    cpu.release_irq(1)
+    assert cpu.pending == 2
+    cpu.release_irq(2)
+    assert cpu.pending == 0
+
+
+def test_nmi_edge_triggered():
+    cpu, symbols = make_cpu()
+    cpu.i = 1
+    cpu.PC = symbols["wait"]
+    cpu.trigger_nmi()
+    result = cpu.run_until(instructions=20)
+    assert cpu.bus.ram[0x11] == 1
+    assert cpu.pending & NMI == 0
+    # Entering the handler, INC, RTI and 18 more JMPs
+    assert result.cycles == 7 + 5 + 6 + 18 * 3
+
+
+def test_translator_interrupts():
+    cpu, symbols = make_cpu()
+    translator = Translator(cpu)
+    translator.run(10)
+    cpu.trigger_nmi()
+    translator.run(10)
+    assert cpu.bus.ram[0x11] == 1
+    assert cpu.PC == symbols["wait"]
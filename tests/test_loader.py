@@ -0,0 +1,70 @@
+import pytest
+from src.loader import (
+    MEMORY_SIZE,
+    Segment,
+    leaves,
+    load_image,
+    load_segments,
+    parse_segment,
+    program_range,
+)
+from src.model import CPU, Bus, RAM, StopReason
+
+
+def test_parse_segment():
+    assert parse_segment("0200") == Segment(0x0200)
+    assert parse_segment("ff00:100") == Segment(0xFF00, 0x100)
+    assert parse_segment("ff00:100:80") == Segment(0xFF00, 0x100, 0x80)
+    with pytest.raises(ValueError):
+        parse_segment("1:2:3:4")
+
+
+def test_load_image(tmp_path):
+    path = tmp_path / "image.bin"
+    path.write_bytes(bytes([0xA9, 0x01, 0xAA]))
+
+    ram, ranges = load_image(path, 0x0200)
+    assert len(ram) == MEMORY_SIZE
+    assert ranges == [(0x0200, 0x0203)]
+    assert ram[0x0200:0x0203] == bytes([0xA9, 0x01, 0xAA])
+    assert ram.count(0) == MEMORY_SIZE - 3
+
+
+def test_load_segments(tmp_path):
+    path = tmp_path / "image.bin"
+    path.write_bytes(bytes(range(16)))
+    ram = bytearray(MEMORY_SIZE)
+
+    ranges = load_segments(
+        path, ram, [Segment(0x0300, 0, 4), Segment(0xFFF8, 8), Segment(0x1000, 20)]
+    )
+    assert ranges == [(0x0300, 0x0304), (0xFFF8, 0x10000), (0x1000, 0x1000)]
+    assert ram[0x0300:0x0304] == bytes([0, 1, 2, 3])
+    assert ram[0xFFF8:] == bytes(range(8, 16))
+
+    # Segments larger than the rest of the file stop at its end
+    ranges = load_segments(path, ram, [Segment(0x2000, 12, 0x100)])
+    assert ranges == [(0x2000, 0x2004)]
+
+    with pytest.raises(ValueError):
+        load_segments(path, ram, [Segment(0xFFFC)])
+
+
+def test_program_range():
+    ranges = [(0x0200, 0x0210), (0xFF00, 0x10000)]
+    assert program_range(ranges, 0xFF10) == (0xFF00, 0x10000)
+    assert program_range(ranges, 0x0200) == (0x0200, 0x0210)
+    assert program_range(ranges, 0x1000) == (0x0200, 0x0210)
+
+
+def test_leaves(tmp_path):
+    # LDA #$01 / BPL +16 branches past the end of the image
+    path = tmp_path / "image.bin"
+    path.write_bytes(bytes([0xA9, 0x01, 0x10, 0x10]))
+    ram, ranges = load_image(path)
+    cpu = CPU(Bus(RAM(ram)))
+
+    result = cpu.run_until(predicate=leaves(*program_range(ranges, 0)), instructions=100)
+    assert result.reason == StopReason.PREDICATE
+    assert result.instructions == 2
+    assert cpu.PC == 0x0014
@@ -0,0 +1,114 @@
+import pytest
+from src.apple1 import AppleI, WOZMON_SYMBOLS
+from src.model import CPU, Bus, RAM, StopReason
+from src.profiler import Profiler, load_symbols
+
+PROGRAM = [
+    0xA2, 0x00,        # $0200 LDX #$00
+    0x20, 0x0A, 0x02,  # $0202 JSR $020A
+    0xCA,              # $0205 DEX
+    0xD0, 0xFA,        # $0206 BNE $0202
+    0xF0, 0xFE,        # $0208 BEQ $0208
+    0xA0, 0x04,        # $020A LDY #$04
+    0x88,              # $020C DEY
+    0xD0, 0xFD,        # $020D BNE $020C
+    0x60,              # $020F RTS
+]
+
+SYMBOLS = {"main": 0x0200, "done": 0x0208, "delay": 0x020A}
+
+
+def make_cpu():
+    ram = bytearray(0x10000)
+    ram[0x0200 : 0x0200 + len(PROGRAM)] = bytes(PROGRAM)
+    cpu = CPU(Bus(RAM(ram)))
+    cpu.PC = 0x0200
+    return cpu
+
+
+def test_profiler_run_matches_run_until():
+    reference = make_cpu()
+    expected = reference.run_until(pc=0x0208)
+
+    cpu = make_cpu()
+    profiler = Profiler(cpu, interval=7)
+    result = profiler.run(pc=0x0208)
+    assert result == expected
+    assert cpu.cycles == reference.cycles
+    assert sum(profiler.samples.values()) == expected.instructions // 7
+
+
+def test_profiler_budgets():
+    cpu = make_cpu()
+    profiler = Profiler(cpu, interval=10)
+    result = profiler.run(instructions=25)
+    assert result.reason == StopReason.INSTRUCTIONS
+    assert result.instructions == 25
+    assert sum(profiler.samples.values()) == 2
+
+    # The countdown carries over between runs
+    profiler.run(instructions=5)
+    assert sum(profiler.samples.values()) == 3
+
+    result = profiler.run(cycles=100)
+    assert result.reason == StopReason.CYCLES
+    assert result.cycles >= 100
+
+    with pytest.raises(ValueError):
+        profiler.run()
+
+
+def test_profiler_report_and_folded():
+    cpu = make_cpu()
+    profiler = Profiler(cpu, interval=3, symbols=SYMBOLS, range_size=0x10)
+    profiler.run(pc=0x0208)
+
+    functions = profiler.functions()
+    assert functions["delay"] > functions["main"]
+    assert set(profiler.ranges()) == {0x0200}
+
+    report = profiler.report()
+    assert "Addresses" in report
+    assert "0200-020F" in report
+    assert "delay" in report
+
+    # Samples inside the subroutine unwind to the JSR target
+    folded = profiler.folded().splitlines()
+    assert any(line.startswith("delay;delay ") for line in folded)
+    assert all(line.split()[0].count(";") <= 1 for line in folded)
+
+
+def test_profiler_symbol():
+    profiler = Profiler(make_cpu(), symbols=SYMBOLS)
+    assert profiler.symbol(0x0100) == "$0100"
+    assert profiler.symbol(0x0200) == "main"
+    assert profiler.symbol(0x020C) == "delay+2"
+    assert profiler.symbol(0x020C, offset=False) == "delay"
+
+
+def test_load_symbols(tmp_path):
+    path = tmp_path / "labels"
+    path.write_text("al 000200 .main\nal 00020A .delay\nDONE = $0208\n; comment\n")
+    assert load_symbols(path) == {"main": 0x0200, "delay": 0x020A, "DONE": 0x0208}
+
+
+def test_profile_wozmon():
+    machine = AppleI(output=lambda text: None)
+    for c in "FF00.FFFF\r":
+        machine.pia.send_key(ord(c))
+    profiler = Profiler(machine.cpu, interval=5, symbols=WOZMON_SYMBOLS)
+    profiler.run(predicate=lambda cpu: not machine.pia.keys and cpu.PC == 0xFF29)
+
+    # Printing the bytes dominates a block examine
+    top = [name for name, _ in profiler.functions().most_common(3)]
+    assert "ECHO" in top
+    assert any(line.startswith("PRBYTE;") for line in profiler.folded().splitlines())
+
+
+def test_profiler_predicate_at_sample():
+    # The predicate holds on the same instruction that ends a chunk
+    cpu = make_cpu()
+    profiler = Profiler(cpu, interval=1)
+    result = profiler.run(predicate=lambda cpu: cpu.PC == 0x0205)
+    assert result.reason == StopReason.PREDICATE
+    assert cpu.PC == 0x0205
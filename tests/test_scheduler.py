@@ -0,0 +1,120 @@
+import pytest
+from src.assembler import assemble
+from src.model import CPU, Bus, Device, RAM, StopReason
+from src.scheduler import Scheduler
+
+SOURCE = """
+        .org $0200
+main:   CLI
+wait:   JMP wait
+irq:    INC $10
+        LDA #0
+        STA $D000       ; acknowledge the timer
+        RTI
+        .org $FFFE
+        .word irq
+"""
+
+
+def make_cpu():
+    ram = bytearray(0x10000)
+    assemble(SOURCE).load(ram)
+    cpu = CPU(Bus(RAM(ram)))
+    cpu.PC = 0x0200
+    return cpu
+
+
+def test_events_in_order():
+    cpu = make_cpu()
+    scheduler = Scheduler(cpu)
+    fired = []
+    scheduler.at(100, lambda: fired.append(("b", cpu.cycles)))
+    scheduler.at(30, lambda: fired.append(("a", cpu.cycles)))
+    scheduler.at(100, lambda: fired.append(("c", cpu.cycles)))
+    result = scheduler.run_until(cycles=200)
+    assert result.reason == StopReason.CYCLES
+    assert [name for name, _ in fired] == ["a", "b", "c"]
+    # Each one runs after the instruction that reaches its cycle
+    assert 30 <= fired[0][1] < 33
+    assert 100 <= fired[1][1] < 103
+    assert 200 <= cpu.cycles < 203
+
+
+def test_every_and_cancel():
+    cpu = make_cpu()
+    scheduler = Scheduler(cpu)
+    ticks = []
+    event = scheduler.every(50, lambda: ticks.append(cpu.cycles))
+    scheduler.run_until(cycles=1000)
+    assert len(ticks) == 20
+    # Due every 50 cycles without drifting
+    assert all(50 * n <= tick < 50 * n + 3 for n, tick in enumerate(ticks, 1))
+    scheduler.cancel(event)
+    scheduler.run_until(cycles=1000)
+    assert len(ticks) == 20
+    assert scheduler.next_cycle() is None
+    with pytest.raises(ValueError):
+        scheduler.every(0, lambda: None)
+
+
+def test_stop_from_event():
+    cpu = make_cpu()
+    scheduler = Scheduler(cpu)
+    scheduler.after(500, scheduler.stop)
+    result = scheduler.run_until()
+    assert result.reason == StopReason.EVENT
+    assert 500 <= result.cycles < 503
+    with pytest.raises(ValueError):
+        scheduler.run_until()
+
+
+def test_same_result_as_cpu():
+    # Events in between do not change where the other conditions stop
+    for condition in ({"instructions": 37}, {"pc": 0x0201}, {"cycles": 301}):
+        plain = make_cpu()
+        expected = plain.run_until(**condition)
+        cpu = make_cpu()
+        scheduler = Scheduler(cpu)
+        scheduler.every(3, lambda: None)
+        assert scheduler.run_until(**condition) == expected
+    cpu = make_cpu()
+    scheduler = Scheduler(cpu)
+    scheduler.every(3, lambda: None)
+    result = scheduler.run_until(predicate=lambda cpu: cpu.cycles >= 30)
+    assert result.reason == StopReason.PREDICATE
+
+
+class TimerAck(Device):
+    # Writes acknowledge the timer interrupt
+    def __init__(self, cpu):
+        super().__init__()
+        self.cpu = cpu
+
+    def write(self, address, value):
+        self.cpu.release_irq()
+
+
+def test_timer_interrupt():
+    # A timer device raises IRQ every 1000 cycles, the guest sleeps in a loop
+    # and acknowledges it from the handler
+    cpu = make_cpu()
+    scheduler = Scheduler(cpu)
+    cpu.bus.map_device(0xD000, 0xD000, TimerAck(cpu))
+    scheduler.every(1000, cpu.assert_irq)
+    scheduler.run_until(cycles=10500)
+    assert cpu.bus.ram[0x10] == 10
+    assert cpu.pending == 0
+
+
+def test_clock_jump():
+    # Periods skipped by moving CPU.cycles forward fire once, on the same grid
+    cpu = make_cpu()
+    scheduler = Scheduler(cpu)
+    ticks = []
+    scheduler.every(100, lambda: ticks.append(cpu.cycles))
+    scheduler.after(150, lambda: setattr(cpu, "cycles", cpu.cycles + 1000))
+    scheduler.run_until(cycles=1500)
+    # Due at 200 when the clock reached 1150, then at 1200, 1300, ...
+    assert len(ticks) == 6
+    assert 1150 <= ticks[1] < 1200 <= ticks[2]
+    assert scheduler.next_cycle() == 1600
@@ -0,0 +1,70 @@
+import io
+import time
+
+import pytest
+from src.apple1 import AppleI, InputReader
+from src.session import (
+    END,
+    JUMP,
+    Event,
+    Session,
+    SessionRecorder,
+    decode_session,
+    encode_session,
+    replay,
+    save_session,
+    load_session,
+)
+
+
+class SlowInput(io.StringIO):
+    # Keys typed with pauses, so the monitor sleeps in between
+    def read(self, size=-1):
+        time.sleep(0.05)
+        return super().read(size)
+
+
+def record(text, paste=""):
+    output = []
+    machine = AppleI(output.append)
+    machine.recorder = SessionRecorder(machine.cpu)
+    machine.paste(paste)
+    machine.run(InputReader(SlowInput(text)).start())
+    return machine, "".join(output), machine.recorder.session()
+
+
+def test_replay():
+    machine, output, session = record("0300: A9 C1\n0300.0301\n", paste="FF00\n")
+    assert any(event.code == JUMP for event in session.events)
+    assert session.events[-1] == Event(machine.cpu.cycles, END)
+    replayed = []
+    copy = replay(decode_session(encode_session(session)), replayed.append)
+    assert "".join(replayed) == output
+    assert output.endswith("0300: A9 C1\n")
+    assert copy.cpu.snapshot() == machine.cpu.snapshot()
+
+
+def test_encoding(tmp_path):
+    machine = AppleI(lambda text: None)
+    session = Session(
+        machine.cpu.snapshot(),
+        [Event(5, 0x41), Event(5, 0x0D), Event(300, JUMP, 1 << 40), Event(1 << 40, END)],
+    )
+    data = encode_session(session)
+    assert len(data) < 1000
+    path = tmp_path / "session.woz"
+    save_session(path, session)
+    assert load_session(path) == session
+    with pytest.raises(ValueError, match="Not a session file"):
+        decode_session(b"6502SNAP" + data[8:])
+    path.write_bytes(data[:-3])
+    with pytest.raises(ValueError, match=str(path)):
+        load_session(path)
+
+
+def test_diverged():
+    machine = AppleI(lambda text: None)
+    # The monitor never runs an instruction ending on cycle 1
+    session = Session(machine.cpu.snapshot(), [Event(1, 0x41)])
+    with pytest.raises(ValueError, match="instead of 1"):
+        replay(session)
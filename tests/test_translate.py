@@ -0,0 +1,79 @@
+import random
+
+import pytest
+from src.model import CPU, Bus, RAM
+from src.translate import Translator
+from tests.data import implemented_opcodes, state
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_translate_matches_dispatch(seed):
+    # Random code that only contains implemented opcodes, so every byte decodes
+    rng = random.Random(seed)
+    implemented = implemented_opcodes()
+    image = bytes(rng.choice(implemented) for _ in range(0x10000))
+    pc = rng.randrange(0x10000)
+
+    reference = CPU(Bus(RAM(bytearray(image))))
+    reference.PC = pc
+    cpu = CPU(Bus(RAM(bytearray(image))))
+    cpu.PC = pc
+    translator = Translator(cpu)
+
+    for _ in range(200):
+        count = translator.step()
+        reference.dispatch(count)
+        assert state(cpu) == state(reference)
+
+
+def test_translate_block():
+    program = [
+        0xA2, 0x05,        # LDX #$05
+        0xA9, 0x00,        # LDA #$00
+        0x18,              # CLC
+        0x69, 0x03,        # ADC #$03
+        0xCA,              # DEX
+        0xD0, 0xFA,        # BNE -6
+        0x8D, 0x00, 0x02,  # STA $0200
+        0x4C, 0x0D, 0x00,  # JMP $000D
+    ]
+    memory = RAM(program + [0x00] * 0x200)
+    cpu = CPU(Bus(memory))
+    translator = Translator(cpu)
+
+    assert translator.run(25) == 25
+    assert cpu.A == 15
+    assert cpu.X == 0
+    assert cpu.PC == 0x000D
+    assert memory[0x0200] == 15
+    # Entry block, loop body and the tail
+    assert sorted(translator.blocks) == [0x0000, 0x0004, 0x000A, 0x000D]
+
+
+def test_translate_self_modifying_code():
+    program = [
+        0xA9, 0x42,        # LDA #$42
+        0x8D, 0x06, 0x00,  # STA $0006     patch the operand of the next LDX
+        0xA2, 0x00,        # LDX #$00
+        0x4C, 0x00, 0x00,  # JMP $0000
+    ]
+    cpu = CPU(Bus(RAM(program)))
+    translator = Translator(cpu)
+
+    assert translator.step() == 2
+    assert cpu.PC == 0x0005
+    assert 0x0000 not in translator.blocks
+
+    assert translator.step() == 2
+    assert cpu.X == 0x42
+    assert cpu.PC == 0x0000
+
+
+def test_translate_unknown_opcode():
+    cpu = CPU(Bus(RAM([0xEA, 0x02])))
+    translator = Translator(cpu)
+
+    translator.step()
+    assert cpu.PC == 0x0001
+    with pytest.raises(NotImplementedError):
+        translator.step()
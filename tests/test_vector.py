@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.model import CPU, Bus, RAM  # noqa: E402
+from src.vector import VectorCPU  # noqa: E402
+from tests.data import implemented_opcodes, state  # noqa: E402
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_vector_matches_dispatch(seed):
+    # Each machine gets its own random code and registers, so the machines are
+    # spread over many opcode groups
+    rng = random.Random(seed)
+    implemented = implemented_opcodes()
+    count = 8
+    vector = VectorCPU(count)
+    references = []
+    for k in range(count):
+        image = bytearray(rng.choice(implemented) for _ in range(0x10000))
+        registers = [rng.randrange(256) for _ in range(5)] + [rng.randrange(0x10000)]
+        reference = CPU(Bus(RAM(image)))
+        reference.A, reference.X, reference.Y, reference.S, reference.P, reference.PC = (
+            registers
+        )
+        references.append(reference)
+        vector.memory[k] = np.frombuffer(bytes(image), dtype=np.uint8)
+        vector.A[k], vector.X[k], vector.Y[k], vector.S[k] = registers[:4]
+        vector.set_status(k, registers[4])
+        vector.PC[k] = registers[5]
+
+    for _ in range(100):
+        vector.step()
+        for k, reference in enumerate(references):
+            reference.dispatch()
+            assert state(vector.cpu(k)) == state(reference)
+
+
+def test_vector_sweep():
+    # Multiply A by 3 for every possible A, then stop at $0010
+    program = [
+        0x85, 0x20,        # STA $20
+        0x0A,              # ASL A
+        0x90, 0x02,        # BCC +2
+        0xE6, 0x21,        # INC $21
+        0x18,              # CLC
+        0x65, 0x20,        # ADC $20
+        0x90, 0x02,        # BCC +2
+        0xE6, 0x21,        # INC $21
+        0x4C, 0x10, 0x00,  # JMP $0010
+    ]
+    vector = VectorCPU(256, program)
+    vector.A[:] = np.arange(256)
+
+    done = vector.run_until(0x0010, 100)
+    assert done.all()
+    product = vector.memory[:, 0x21].astype(int) << 8 | vector.A
+    assert (product == np.arange(256) * 3).all()
+    # Machines that took the branches used more cycles
+    assert vector.cycles.min() < vector.cycles.max()
+
+
+def test_vector_unknown_opcode():
+    vector = VectorCPU(2, [0xE8, 0x02, 0xE8, 0xE8, 0xE8])
+    vector.PC[1] = 2
+
+    vector.step(3)
+    assert vector.halted.tolist() == [True, False]
+    assert vector.PC.tolist() == [2, 5]
+    assert vector.X.tolist() == [1, 3]
+    assert vector.instructions.tolist() == [2, 3]
+
+
+def test_vector_from_cpu():
+    cpu = CPU(Bus(RAM([0xE8, 0x4C, 0x00, 0x00] + [0x00] * 0xFFFC)))
+    cpu.P = 0x81
+    vector = VectorCPU.from_cpu(cpu, 3)
+    vector.step(4)
+    cpu.dispatch(4)
+    for k in range(3):
+        assert state(vector.cpu(k)) == state(cpu)
@@ -4,93 +4,64 @@ import argparse
 import traceback
 import termios
 import sys
-import select
-import base64
 import logging
-from src.model import CPU, Bus
-
-# References:
-# https://zserge.com/posts/6502/
-# https://www.sbprojects.net/projects/apple1/wozmon.php
-
-WOZMON = base64.b64decode(
-    "2Figf4wS0KmnjRHQjRPQyd/wE8mb8APIEA+p3CDv/6mNIO//oAGIMPatEdAQ+60Q0JkAAiDv/8mN0NSg/6kAqgqFK8i5AALJjfDUya6Q9PDwybrw68nS8DuGKIYphCq5AAJJsMkKkAZpiMn6kBEKCgoKogQKJigmKcrQ+MjQ4MQq8JckK1AQpSiBJuYm0LXmJ0xE/2wkADArogK1J5UllSPK0PfQFKmNIO//pSUg3P+lJCDc/6m6IO//qaAg7/+hJCDc/4YrpSTFKKUl5SmwweYk0ALmJaUkKQcQyEhKSkpKIOX/aCkPCbDJupACaQYsEtAw+40S0GAAAAAPAP8AAA=="
-)
-
-
-class MemoryAppleI:
-    def __init__(self, data: bytearray):
-        self.data = data
-        self.keys: list[int] = []
-
-    def __setitem__(self, address, value):
-        logging.debug(f"W {address:#06x}: {self.data[address]:x}")
-
-        if address == 0xD012:  # Display
-            if value & 0x7F == 0x0D:  # '\r'
-                print("")
-            elif value & 0x7F == 0x5F:  # '_'
-                # '_' works as backspace
-                print("\b", end="", flush=True)
-            else:
-                print(chr(value & 0x7F), end="", flush=True)
-        else:
-            self.data[address] = value
-
-    def __getitem__(self, address):
-        logger.debug(f"R {address:#06x}: {self.data[address]:x}")
-
-        if address == 0xD010:  # KBD
-            return self.keys.pop(0) | 0x80 if len(self.keys) else 0x80
-        elif address == 0xD011:  # KBDCR
-            return 0x80 if len(self.keys) else 0
-        else:
-            return self.data[address]
-
-    def send_key(self, c):
-        logger.debug(f"SEND KEY {c} {chr(c)}")
-        self.keys.append(c)
-
-    def dump(self, start=0, end=None):
-        if end is None:
-            end = len(self.data)
-
-        for index in range(start, end, 16):
-            print(
-                f"{index:04x}\t{' '.join(f'{x:02x}' for x in self.data[index : index + 16])}"
-            )
+import time
+from src.apple1 import BATCH_CYCLES, AppleI, InputReader, print_output
+from src.session import SessionRecorder, load_session, replay, save_session
 
 
 def init():
-    mem = MemoryAppleI(
-        [0x00] * 0xFF00  # RAM
-        + list(WOZMON)
-    )
-
-    bus = Bus(mem)
-    cpu = CPU(bus)
-    cpu.reset()
+    machine = AppleI()
 
     print("Starting the Woz Monitor")
     print("Press q to quit")
+    text = None
+    if args.load:
+        with open(args.load) as f:
+            text = f.read()
+        if args.direct:
+            run = machine.load(text)
+            text = None if run is None else f"{run:04X} R\n"
+    if args.record:
+        # After the direct load, so the snapshot holds the program
+        machine.recorder = SessionRecorder(machine.cpu)
+    if text is not None:
+        machine.paste(text)
     old = termios.tcgetattr(sys.stdin)
     try:
         tc = termios.tcgetattr(sys.stdin)
         tc[3] = tc[3] & ~termios.ICANON & ~termios.ECHO
         termios.tcsetattr(sys.stdin, termios.TCSAFLUSH, tc)
-        while True:
-            cpu.step()
-            if select.select([sys.stdin], [], [], 0.000001) == ([sys.stdin], [], []):
-                c = sys.stdin.read(1)
-                if c == "q":
-                    print("Quitting")
-                    break
-                mem.send_key(13 if c == "\n" else ord(c))
+        reader = InputReader(sys.stdin).start()
+        if machine.run(reader, args.batch) == "q":
+            print("Quitting")
     except Exception as e:
         traceback.print_tb(e.__traceback__)
     finally:
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old)
+        if args.record:
+            save_session(args.record, machine.recorder.session())
+    report(machine)
+
 
+def replay_session():
+    # Headless, no terminal and no waiting for the keys
+    try:
+        session = load_session(args.replay)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    output = (lambda text: None) if args.quiet else print_output
+    start = time.perf_counter()
+    machine = replay(session, output)
+    elapsed = time.perf_counter() - start
+    print(f"\nReplayed {machine.cpu.cycles} cycles in {elapsed:.3f} s")
+    report(machine)
+
+
+def report(machine):
+    cpu = machine.cpu
+    mem = machine.memory
     print(cpu)
     mem.dump(cpu.PC, cpu.PC + 1)
     mem.dump(0x20, 0x2F)
@@ -116,10 +87,39 @@ parser.add_argument(
     default="WARNING",
     help="Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)",
 )
+parser.add_argument(
+    "--batch",
+    type=int,
+    default=BATCH_CYCLES,
+    help=f"Cycles to run between input checks (default {BATCH_CYCLES})",
+)
+parser.add_argument("--load", metavar="FILE", help="Type a Woz hex file into the monitor")
+parser.add_argument(
+    "--direct",
+    action="store_true",
+    help="With --load, store the bytes in memory without typing them",
+)
+parser.add_argument(
+    "--record", metavar="FILE", help="Record the keys of the session to a file"
+)
+parser.add_argument(
+    "--replay", metavar="FILE", help="Replay a recorded session without a terminal"
+)
+parser.add_argument(
+    "--quiet", action="store_true", help="With --replay, do not print the output"
+)
 args = parser.parse_args()
+if args.direct and not args.load:
+    parser.error("--direct needs --load")
+if args.replay and (args.record or args.load):
+    parser.error("--replay does not work with --record or --load")
+if args.quiet and not args.replay:
+    parser.error("--quiet needs --replay")
 logging.basicConfig(
     filename="wozmon.log", level=args.log.upper(), format="%(levelname)s: %(message)s"
 )
-logger = logging.getLogger()
 
-init()
+if args.replay:
+    replay_session()
+else:
+    init()